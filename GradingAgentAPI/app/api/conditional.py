@@ -0,0 +1,39 @@
+"""
+Conditional GET support for the read endpoints.
+
+Listings carry a weak ETag computed from one aggregate query, so a poll whose If-None-Match still
+matches is answered 304 with no body, without loading or serializing any rows. The ETag is weak because
+GZipMiddleware sends the same listing gzip-compressed or not, and a strong ETag must differ per encoding.
+Listings are returned as ORJSONResponse directly, so FastAPI does not validate and jsonable_encode them.
+"""
+
+from typing import Any
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/ prefixes are ignored, "*" matches anything."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+def _validators(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """Return a 304 response if the client's copy is current."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=_validators(etag))
+    return None
+
+
+def json_response(content: Any, etag: str) -> ORJSONResponse:
+    """The listing serialized with orjson, carrying its validators."""
+    return ORJSONResponse(content, headers=_validators(etag))
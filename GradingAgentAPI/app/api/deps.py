@@ -1,3 +1,6 @@
+import hmac
+from fastapi import Header, HTTPException
+from app.core.config import settings
 from app.db.session import SessionLocal
 
 def get_db():
@@ -6,3 +9,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    if not settings.ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def debug_profile(x_debug_profile: bool = Header(False), x_admin_token: str | None = Header(None)) -> bool:
+    """Whether the request asked to be profiled; only admins may ask."""
+    if x_debug_profile:
+        require_admin(x_admin_token)
+    return x_debug_profile
@@ -0,0 +1,35 @@
+"""
+Cancellation of work whose client has gone away.
+
+When the caller of POST /grade times out and closes the connection, FastAPI would otherwise keep cloning,
+calling Gemini and committing for a response nobody reads. The grade runs as a task next to a watcher that
+polls the connection and cancels the task once the client has disconnected.
+"""
+
+import asyncio
+from fastapi import HTTPException, Request
+from app.core.config import settings
+
+
+async def _watch(request: Request, task: asyncio.Task) -> None:
+    while not task.done():
+        if await request.is_disconnected():
+            task.cancel()
+            return
+        await asyncio.sleep(settings.DISCONNECT_POLL_SECONDS)
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await coro, cancelling it if the client disconnects first (answered with 499, which nobody reads)."""
+    task = asyncio.create_task(coro)
+    watcher = asyncio.create_task(_watch(request, task))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not task.cancelled() or asyncio.current_task().cancelling():
+            raise  # This request itself was cancelled, not just the grade
+        raise HTTPException(status_code=499, detail="Client closed the request")
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,72 @@
+"""
+Per-request database query accounting.
+
+The middleware gives each request a fresh counter in app.db.session.current_queries, which the engine's
+cursor events fill in (context variables follow the request into FastAPI's threadpool and asyncio.to_thread).
+When the response starts, the counts are added to per-route totals for GET /metrics and, with
+DB_DEBUG_HEADERS, returned as X-DB-Queries and X-DB-Time-Ms headers, so an N+1 regression shows up as
+a query count that grows with the data.
+"""
+
+import threading
+from app.core.config import settings
+from app.db import session as db_session
+
+_routes_lock = threading.Lock()
+_routes: dict[str, dict] = {}
+
+
+def _record(route: str, stats: dict) -> None:
+    with _routes_lock:
+        totals = _routes.setdefault(route, {"requests": 0, "queries": 0, "seconds": 0.0, "max_queries": 0})
+        totals["requests"] += 1
+        totals["queries"] += stats["queries"]
+        totals["seconds"] += stats["seconds"]
+        totals["max_queries"] = max(totals["max_queries"], stats["queries"])
+
+
+def route_stats() -> dict:
+    with _routes_lock:
+        return {
+            route: {
+                "requests": totals["requests"],
+                "queries": totals["queries"],
+                "avg_queries": round(totals["queries"] / totals["requests"], 2),
+                "max_queries": totals["max_queries"],
+                "db_time_ms": round(totals["seconds"] * 1000, 1),
+            }
+            for route, totals in sorted(_routes.items())
+        }
+
+
+def _route_name(scope) -> str:
+    """Method and route template, e.g. "GET /grades/{student_name}" (paths would hold student names)."""
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', None) or 'unmatched'}"
+
+
+class QueryMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # The router records the matched route in the scope before the endpoint runs any query
+        stats = {"queries": 0, "seconds": 0.0, "route": lambda: _route_name(scope)}
+        token = db_session.current_queries.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                _record(_route_name(scope), stats)
+                if settings.DB_DEBUG_HEADERS:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats["queries"]).encode()))
+                    headers.append((b"x-db-time-ms", f"{stats['seconds'] * 1000:.1f}".encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            db_session.current_queries.reset(token)
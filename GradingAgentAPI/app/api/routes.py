@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File
+from fastapi import APIRouter, Depends, UploadFile, File, Query, Header, Request, Response
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 from app.schemas.grading import GradingRequest, AssignmentCreate
 from app.schemas.grading_result import GradingResult as GradingResultSchema
-from app.services import grading_service
-from . import deps
-from typing import List
+from app.core.config import settings
+from app.services import grading_service, admission, deadline, llm_client, profiler, warmup
+from app.db import session as db_session
+from . import conditional, deps, disconnect, query_metrics
+from datetime import datetime
+from typing import List, Literal
 
 router = APIRouter()
 
@@ -12,9 +16,80 @@ router = APIRouter()
 def read_root():
     return {"message": "FastAPI is connected!"}
 
+@router.get("/ready")
+def readiness(response: Response):
+    report = warmup.status()
+    if report["status"] != "ready":
+        response.status_code = 503
+    return report
+
 @router.post("/grade")
-async def grade_assignment_endpoint(request: GradingRequest, db: Session = Depends(deps.get_db)):
-    return await grading_service.grade_assignment(request, db)
+async def grade_assignment_endpoint(
+    request: GradingRequest,
+    http_request: Request,
+    db: Session = Depends(deps.get_db),
+    x_ta_id: str | None = Header(None),
+    x_grade_deadline: float | None = Header(None, gt=0),
+    profile: bool = Depends(deps.debug_profile)
+):
+    # The deadline covers the wait for admission too; a caller that gives up sooner says so in X-Grade-Deadline
+    budget = min(x_grade_deadline or settings.GRADE_DEADLINE_SECONDS, settings.GRADE_DEADLINE_SECONDS)
+
+    async def grade():
+        async with deadline.scope(budget):
+            async with admission.grading_slot(admission.tenant_for(request.gemini_api_key, x_ta_id)):
+                if profile:
+                    label = f"{request.assignment_name}: {request.repo_link}"
+                    return await profiler.profiled(db, label, grading_service.grade_assignment(request, db))
+                return await grading_service.grade_assignment(request, db)
+
+    return await disconnect.cancel_on_disconnect(http_request, grade())
+
+@router.get("/admission")
+def get_admission_stats():
+    return admission.controller.stats()
+
+@router.get("/metrics")
+def get_metrics():
+    return {"db": db_session.query_totals(), "routes": query_metrics.route_stats()}
+
+@router.get("/llm/capacity")
+def get_llm_capacity():
+    return llm_client.capacity()
+
+@router.post("/jobs")
+async def enqueue_grading_job(
+    request: GradingRequest,
+    db: Session = Depends(deps.get_db),
+    profile: bool = Depends(deps.debug_profile)
+):
+    return await grading_service.enqueue_grading_job(request, db, profile)
+
+@router.get("/jobs/{job_id}")
+async def get_grading_job(job_id: int, db: Session = Depends(deps.get_db)):
+    return await grading_service.get_grading_job(job_id, db)
+
+@router.delete("/jobs/{job_id}")
+async def cancel_grading_job(job_id: int, db: Session = Depends(deps.get_db)):
+    return await grading_service.cancel_grading_job(job_id, db)
+
+@router.get("/debug/profiles", dependencies=[Depends(deps.require_admin)])
+def list_profiles(job_id: int | None = Query(None), db: Session = Depends(deps.get_db)):
+    return profiler.list_profiles(db, job_id)
+
+@router.get("/debug/profiles/{profile_id}", dependencies=[Depends(deps.require_admin)])
+def get_profile(
+    profile_id: int,
+    format: Literal["json", "folded", "svg"] = Query("json"),
+    db: Session = Depends(deps.get_db)
+):
+    record = profiler.get_profile(db, profile_id)
+    if format == "folded":
+        return PlainTextResponse(record.folded or "")
+    if format == "svg":
+        title = f"Profile {record.id}: {record.label} ({record.duration_ms} ms, {record.samples} samples)"
+        return Response(profiler.render_svg(record.folded or "", title), media_type="image/svg+xml")
+    return profiler.summary(record)
 
 @router.post("/assignments")
 async def create_assignment_endpoint(request: AssignmentCreate, db: Session = Depends(deps.get_db)):
@@ -28,10 +103,70 @@ async def upload_criteria(
 ):
     return await grading_service.save_criteria(assignment_name, criteria_file, db)
 
-@router.get("/grades", response_model=List[GradingResultSchema])
-async def get_grades(db: Session = Depends(deps.get_db)):
-    return await grading_service.get_all_grades(db)
+@router.post("/assignments/{assignment_name}/baseline")
+async def upload_baseline(
+    assignment_name: str,
+    baseline_file: UploadFile = File(...),
+    db: Session = Depends(deps.get_db)
+):
+    return await grading_service.save_baseline(assignment_name, baseline_file, db)
+
+@router.post("/assignments/{assignment_name}/reapply-regex")
+async def reapply_regex(assignment_name: str, db: Session = Depends(deps.get_db)):
+    return await grading_service.reapply_regex(assignment_name, db)
+
+@router.get("/assignments/{assignment_name}/similar")
+async def get_similar_submissions(
+    assignment_name: str,
+    threshold: float = Query(0.8, ge=0.0, le=1.0),
+    db: Session = Depends(deps.get_db)
+):
+    return await grading_service.get_similar_submissions(assignment_name, threshold, db)
+
+@router.get("/assignments/{assignment_name}/stats")
+async def get_assignment_stats(assignment_name: str, db: Session = Depends(deps.get_db)):
+    return await grading_service.get_assignment_stats(assignment_name, db)
+
+@router.get("/usage")
+async def get_usage(
+    assignment: str | None = Query(None),
+    since: datetime | None = Query(None),
+    db: Session = Depends(deps.get_db)
+):
+    return await grading_service.get_usage(assignment, since, db)
+
+# Listings are returned pre-serialized (see conditional.py); the schema only documents them
+GRADES_RESPONSES = {200: {"model": List[GradingResultSchema]}}
+
+@router.get("/grades", responses=GRADES_RESPONSES)
+async def get_grades(request: Request, db: Session = Depends(deps.get_db)):
+    etag = grading_service.grades_etag(db)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return conditional.json_response(await grading_service.get_all_grades(db), etag)
+
+@router.get("/grades/{student_name}", responses=GRADES_RESPONSES)
+async def get_student_grades(student_name: str, request: Request, db: Session = Depends(deps.get_db)):
+    etag = grading_service.grades_etag(db, student_name)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return conditional.json_response(await grading_service.get_grades_by_student(student_name, db), etag)
+
+@router.get("/grades/{student_name}/history", responses=GRADES_RESPONSES)
+async def get_student_grade_history(
+    student_name: str,
+    request: Request,
+    assignment_name: str | None = Query(None),
+    db: Session = Depends(deps.get_db)
+):
+    etag = grading_service.grades_etag(db, student_name, history=True, assignment_name=assignment_name)
+    unchanged = conditional.not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return conditional.json_response(await grading_service.get_grade_history(student_name, assignment_name, db), etag)
 
-@router.get("/grades/{student_name}", response_model=List[GradingResultSchema])
-async def get_student_grades(student_name: str, db: Session = Depends(deps.get_db)):
-    return await grading_service.get_grades_by_student(student_name, db)
+@router.get("/results/{result_id}/sources")
+async def get_result_sources(result_id: int, db: Session = Depends(deps.get_db)):
+    return await grading_service.get_result_sources(result_id, db)
@@ -13,6 +13,91 @@ class Settings(BaseSettings):
 
     DATABASE_URL: str | None = None
 
+    # Responses smaller than this are sent uncompressed
+    GZIP_MINIMUM_SIZE: int = 1000
+
+    # Sandboxed regex check workers and the time budget of one check on one file
+    REGEX_WORKERS: int = 4
+    REGEX_CHECK_TIMEOUT_SECONDS: float = 2.0
+
+    # Per-submission source collection limits
+    MAX_SOURCE_FILE_BYTES: int = 512 * 1024
+    MAX_SUBMISSION_BYTES: int = 4 * 1024 * 1024
+    MAX_SOURCE_FILES: int = 500
+    SOURCE_READ_WORKERS: int = 8
+
+    # Admission control for inline POST /grade requests
+    MAX_INFLIGHT_GRADES: int = 8
+    MAX_GRADE_QUEUE_DEPTH: int = 64
+    ADMISSION_WINDOW_SECONDS: float = 300
+    ADMISSION_DEFAULT_RETRY_AFTER: int = 30
+
+    # Adaptive (AIMD) Gemini concurrency per API key
+    LLM_INITIAL_CONCURRENCY: float = 2.0
+    LLM_MAX_CONCURRENCY: float = 32.0
+    LLM_LATENCY_TOLERANCE: float = 2.0  # Back off when latency exceeds this multiple of the baseline
+    LLM_MAX_RETRIES: int = 3
+    LLM_BACKOFF_SECONDS: float = 2.0
+
+    # Gemini model used for full rubric grading, and the cascade's screening tier: criteria with a
+    # "cascade" first ask the screening model to classify a truncated submission, escalating to the
+    # grading model only when the verdict is uncertain or below the confidence threshold
+    LLM_GRADE_MODEL: str = "gemini-1.5-flash"
+    LLM_SCREEN_MODEL: str = "gemini-1.5-flash-8b"
+    LLM_SCREEN_CONFIDENCE: float = 0.85
+    LLM_SCREEN_MAX_CHARS: int = 6000
+
+    # USD per million tokens of each model (prompts up to 128k tokens), for the cost in GET /usage.
+    # "prompt" is charged for uncached prompt tokens, "cached" for prompt tokens served from a cache
+    LLM_PRICES: dict[str, dict[str, float]] = {
+        "gemini-1.5-flash": {"prompt": 0.075, "cached": 0.01875, "output": 0.30},
+        "gemini-1.5-flash-8b": {"prompt": 0.0375, "cached": 0.01, "output": 0.15},
+        "gemini-1.5-pro": {"prompt": 1.25, "cached": 0.3125, "output": 5.00},
+    }
+
+    # Default Gemini output mode for criteria that do not set llm_output_mode ("text" or "json"),
+    # and the JSON mode's output budget and attempts at getting a valid response
+    LLM_OUTPUT_MODE: str = "text"
+    LLM_JSON_MAX_OUTPUT_TOKENS: int = 1024
+    LLM_JSON_MAX_ATTEMPTS: int = 2
+
+    # Grading workflow stage budgets: git clone (one retry after a timeout), and the whole Gemini
+    # evaluation, after which the grade falls back to regex deductions only
+    CLONE_TIMEOUT_SECONDS: int = 60
+    LLM_STAGE_TIMEOUT_SECONDS: float = 300
+
+    # Code sent to Gemini per prompt. Larger submissions are split into class and method chunks and the
+    # chunks most relevant to the rubric (or each rubric section) are picked with BM25, unless disabled
+    LLM_CODE_MAX_CHARS: int = 20000
+    CODE_RETRIEVAL: bool = True
+
+    # End-to-end grading deadlines; X-Grade-Deadline can only shorten GRADE_DEADLINE_SECONDS
+    GRADE_DEADLINE_SECONDS: float = 300
+    JOB_DEADLINE_SECONDS: float = 900
+    DISCONNECT_POLL_SECONDS: float = 1.0
+
+    # Statements slower than SLOW_QUERY_MS are logged (without parameters) and listed in GET /metrics;
+    # DB_DEBUG_HEADERS adds each response's query count and time as X-DB-Queries and X-DB-Time-Ms
+    SLOW_QUERY_MS: float = 200
+    DB_DEBUG_HEADERS: bool = False
+
+    # Admin-only debugging: X-Admin-Token must match ADMIN_TOKEN (admin endpoints are disabled when unset).
+    # Profiled grades sample every thread's stack each PROFILE_SAMPLE_INTERVAL_SECONDS and trace allocations
+    ADMIN_TOKEN: str | None = None
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.01
+    PROFILE_TRACEMALLOC_FRAMES: int = 1
+    PROFILE_TOP_ALLOCATIONS: int = 20
+
+    # Grading job queue (python -m app.worker). JOB_SECRET_KEY is a Fernet key, shared by the API and the
+    # workers, that encrypts queued jobs' credentials; POST /jobs is disabled when it is unset
+    JOB_SECRET_KEY: str | None = None
+    JOB_LEASE_SECONDS: int = 120
+    JOB_HEARTBEAT_SECONDS: int = 30
+    JOB_CANCEL_POLL_SECONDS: float = 5.0
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 3
+    WORKER_CONCURRENCY: int = 2
+
     @property
     def DATABASE_URL_USED(self) -> str:
         if self.DATABASE_URL:
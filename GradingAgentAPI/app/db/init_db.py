@@ -0,0 +1,25 @@
+"""
+Create the database schema.
+
+Run once before starting the API or workers (`python -m app.db.init_db`); the Docker images do this in
+their start command. Importing the app never touches the database.
+"""
+
+from sqlalchemy import text
+from app.db.models import Base
+from app.db.session import engine
+
+# Serializes concurrent schema creation when several containers start at once
+_SCHEMA_LOCK_KEY = 247_001
+
+
+def init_db(bind=engine) -> None:
+    with bind.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+        Base.metadata.create_all(bind=connection)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Database schema is up to date.")
@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, Text, ForeignKey, JSON, LargeBinary, DateTime, Boolean, Index, UniqueConstraint, text, true
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime, timezone
 
 Base = declarative_base()
 
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Assignment(Base):
     __tablename__ = "assignments"
 
@@ -11,6 +17,7 @@ class Assignment(Base):
     name = Column(String, unique=True, index=True)
 
     criteria = relationship("Criteria", back_populates="assignment", uselist=False)
+    baseline_files = relationship("BaselineFile", back_populates="assignment")
     grading_results = relationship("GradingResult", back_populates="assignment")
 
 class Criteria(Base):
@@ -20,16 +27,160 @@ class Criteria(Base):
     assignment_id = Column(Integer, ForeignKey("assignments.id"))
     natural_language_rubric = Column(Text)  # Natural language grading instructions for Gemini
     regex_checks = Column(JSON, nullable=True)  # Optional list of regex checks for automatic deductions
+    include_globs = Column(JSON, nullable=True)  # Source files to collect (defaults to *.java)
+    exclude_globs = Column(JSON, nullable=True)  # Files and folders to skip, e.g. build output
+    version = Column(Integer, default=1)  # Incremented on every upload
+    disabled_checks = Column(JSON, nullable=True)  # Patterns that exceeded their time budget in this version
+    llm_output_mode = Column(String, nullable=True)  # "text" (free-form feedback) or "json" (schema-constrained)
+    rubric_sections = Column(JSON, nullable=True)  # {"context", "sections": [{"name", "points", "description"}]} graded concurrently
+    cascade = Column(JSON, nullable=True)  # Screening-model cascade settings; null when every submission goes to the grading model
 
     assignment = relationship("Assignment", back_populates="criteria")
 
 class GradingResult(Base):
     __tablename__ = "grading_results"
+    __table_args__ = (
+        # At most one current result per student and assignment; older attempts are history
+        Index(
+            "uq_grading_results_latest", "assignment_id", "student_id", unique=True,
+            postgresql_where=text("is_latest"), sqlite_where=text("is_latest"),
+        ),
+        Index("ix_grading_results_assignment_created", "assignment_id", "created_at"),  # GET /usage?since=
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"))
     student_id = Column(String, index=True)
     grade = Column(Float)
     feedback = Column(Text)
+    llm_feedback = Column(Text, nullable=True)  # Raw Gemini feedback, kept so regex deductions can be re-applied
+    llm_deductions = Column(JSON, nullable=True)  # Legacy: Gemini deduction lines, superseded by the deductions table
+    llm_deduction_total = Column(Integer, nullable=True)
+    skipped_files = Column(JSON, nullable=True)  # Files left out by the source collector, with reasons
+    created_at = Column(DateTime, default=_utcnow)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)  # Part of the read endpoints' ETags
+    criteria_version = Column(Integer, nullable=True)  # Criteria version the result was graded with
+    llm_tiers = Column(JSON, nullable=True)  # Model calls made for this result: tier, model, latency, tokens, outcome
+    stage_timings = Column(JSON, nullable=True)  # Grading workflow stages: start, duration, attempts, outcome
+    # Gemini usage, summed over llm_tiers (see app.services.usage)
+    prompt_tokens = Column(Integer, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)  # Part of prompt_tokens served from a context cache
+    output_tokens = Column(Integer, nullable=True)
+    llm_model = Column(String, nullable=True)  # Model of the last call, the one that decided the grade
+    llm_latency_ms = Column(Integer, nullable=True)  # Time spent in Gemini calls, summed; null when none was made
+    llm_wall_ms = Column(Integer, nullable=True)  # Wall-clock time of the Gemini evaluation; concurrent calls overlap
+    llm_cost_usd = Column(Float, nullable=True)  # From the tokens and LLM_PRICES; null when a call's model has no price
+    llm_retries = Column(Integer, nullable=True)
+    is_latest = Column(Boolean, nullable=False, default=True, server_default=true())
 
     assignment = relationship("Assignment", back_populates="grading_results")
+    snapshot_files = relationship("SnapshotFile", back_populates="grading_result", cascade="all, delete-orphan", order_by="SnapshotFile.id")
+    deductions = relationship("Deduction", back_populates="grading_result", cascade="all, delete-orphan", order_by="Deduction.id")
+
+class Deduction(Base):
+    """One deduction of a grading result, from a regex check or from Gemini's feedback."""
+    __tablename__ = "deductions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    grading_result_id = Column(Integer, ForeignKey("grading_results.id", ondelete="CASCADE"), index=True, nullable=False)
+    source = Column(String(16), nullable=False)  # "regex" or "llm"
+    points = Column(Integer, nullable=False)
+    message = Column(Text, nullable=False)
+    file = Column(String, nullable=True)
+    line = Column(Integer, nullable=True)
+
+    grading_result = relationship("GradingResult", back_populates="deductions")
+
+class AssignmentStats(Base):
+    """Cached GET /assignments/{name}/stats payload, valid while its results fingerprint matches."""
+    __tablename__ = "assignment_stats"
+
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    computed_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
+
+class SourceBlob(Base):
+    __tablename__ = "source_blobs"
+
+    hash = Column(String(64), primary_key=True)  # sha256 of the raw file content
+    data = Column(LargeBinary)  # zlib-compressed file content
+    size = Column(Integer)  # Uncompressed size in bytes
+
+class SnapshotFile(Base):
+    __tablename__ = "snapshot_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    grading_result_id = Column(Integer, ForeignKey("grading_results.id"), index=True)
+    path = Column(String)
+    blob_hash = Column(String(64), ForeignKey("source_blobs.hash"), index=True)
+
+    grading_result = relationship("GradingResult", back_populates="snapshot_files")
+
+class SimilarityFingerprint(Base):
+    __tablename__ = "similarity_fingerprints"
+    __table_args__ = (UniqueConstraint("assignment_id", "student_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), index=True)
+    student_id = Column(String)
+    signature = Column(JSON)  # MinHash signature of the normalized token shingles
+
+    buckets = relationship("LshBucket", back_populates="fingerprint", cascade="all, delete-orphan")
+
+class LshBucket(Base):
+    __tablename__ = "lsh_buckets"
+    __table_args__ = (Index("ix_lsh_buckets_lookup", "assignment_id", "band", "bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"))
+    band = Column(Integer)
+    bucket = Column(String(16))
+    fingerprint_id = Column(Integer, ForeignKey("similarity_fingerprints.id"), index=True)
+
+    fingerprint = relationship("SimilarityFingerprint", back_populates="buckets")
+
+class BaselineFile(Base):
+    __tablename__ = "baseline_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), index=True)
+    path = Column(String)  # Relative to the assignment folder
+    blob_hash = Column(String(64), ForeignKey("source_blobs.hash"))
+
+    assignment = relationship("Assignment", back_populates="baseline_files")
+
+class GradingJob(Base):
+    __tablename__ = "grading_jobs"
+    __table_args__ = (Index("ix_grading_jobs_claim", "status", "lease_expires_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, default="queued")  # queued, running, completed, failed, cancelled
+    payload = Column(JSON)  # GradingRequest fields other than the credentials
+    secrets = Column(Text, nullable=True)  # Credentials encrypted with JOB_SECRET_KEY; cleared once the job finishes
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    worker_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # A running job whose lease has expired can be reclaimed
+    heartbeat_at = Column(DateTime, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime)
+    finished_at = Column(DateTime, nullable=True)
+    profile = Column(Boolean, default=False)  # Profile each attempt (X-Debug-Profile); see the profiles table
+
+
+class Profile(Base):
+    __tablename__ = "profiles"
+
+    id = Column(Integer, primary_key=True, index=True)
+    label = Column(String)  # Assignment and repository that were graded
+    job_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(DateTime, default=_utcnow)
+    duration_ms = Column(Integer)
+    sample_interval_ms = Column(Float)
+    samples = Column(Integer)
+    folded = Column(Text)  # Folded stacks, "outer;inner;leaf count" per line
+    peak_memory_bytes = Column(Integer)  # tracemalloc peak while the grade ran
+    top_allocations = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)  # Set when the profiled grade failed
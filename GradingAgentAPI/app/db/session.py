@@ -1,9 +1,80 @@
-from sqlalchemy import create_engine
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
 if settings.DATABASE_URL_USED.startswith("postgresql"):
     import psycopg2
 
+# {"queries", "seconds", "route": callable naming the route} of the current request, set by
+# app.api.query_metrics; None outside requests
+current_queries: ContextVar[dict | None] = ContextVar("current_queries", default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.$])-?\d+(?:\.\d+)?\b")
+_totals_lock = threading.Lock()
+_totals = {"queries": 0, "seconds": 0.0, "slow_queries": 0}
+_recent_slow = deque(maxlen=50)
+
+
+def redact(statement: str) -> str:
+    """A statement safe to log: bound parameters are never included, and inline literals are masked."""
+    statement = _STRING_LITERAL.sub("'?'", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return " ".join(statement.split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    stats = current_queries.get()
+    if stats is not None:
+        stats["queries"] += 1
+        stats["seconds"] += elapsed
+    entry = None
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        entry = {
+            "duration_ms": round(elapsed * 1000, 1),
+            "route": stats["route"]() if stats is not None else None,
+            "statement": redact(statement),
+            "executemany": executemany,
+        }
+    with _totals_lock:
+        _totals["queries"] += 1
+        _totals["seconds"] += elapsed
+        if entry is not None:
+            _totals["slow_queries"] += 1
+            _recent_slow.append(entry)
+    if entry is not None:
+        print(f"Slow query ({entry['duration_ms']} ms, {entry['route'] or 'no request'}): {entry['statement']}")
+
+
+def instrument(engine) -> None:
+    """Count and time every statement the engine runs, and log statements over SLOW_QUERY_MS."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def query_totals() -> dict:
+    """Process-wide query counts and time since startup, with the most recent slow queries."""
+    with _totals_lock:
+        return {
+            "queries": _totals["queries"],
+            "time_ms": round(_totals["seconds"] * 1000, 1),
+            "slow_queries": _totals["slow_queries"],
+            "slow_query_ms": settings.SLOW_QUERY_MS,
+            "recent_slow": list(_recent_slow),
+        }
+
+
 engine = create_engine(str(settings.DATABASE_URL_USED), pool_pre_ping=True)
+instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
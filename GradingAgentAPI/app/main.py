@@ -1,15 +1,24 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api import routes
+from app.api.query_metrics import QueryMetricsMiddleware
 from app.core.config import settings
-from app.db.session import engine
-from app.db.models import Base
+from app.services import warmup
 
-# This will create the tables
-Base.metadata.create_all(bind=engine)
+# Tables are created by `python -m app.db.init_db`, not at import time
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 ENV = os.getenv("ENV", "development")
 
@@ -20,5 +29,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
+app.add_middleware(QueryMetricsMiddleware)
 
 app.include_router(routes.router)
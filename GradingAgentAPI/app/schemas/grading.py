@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from typing import Literal, Optional
 
 class GradingRequest(BaseModel):
     assignment_name: str
@@ -15,6 +15,25 @@ class RegexCheck(BaseModel):
     deduction: int
     message: str
 
+class RubricSection(BaseModel):
+    name: str
+    points: int
+    description: str = ""
+
+class CascadeSettings(BaseModel):
+    # Strict: a quoted threshold or character limit is an upload error, not something to coerce
+    model_config = ConfigDict(extra="forbid", strict=True)
+
+    screen_model: Optional[str] = Field(None, min_length=1)
+    grade_model: Optional[str] = Field(None, min_length=1)
+    confidence_threshold: Optional[float] = Field(None, gt=0, le=1)
+    screen_max_chars: Optional[int] = Field(None, gt=0)
+
 class CriteriaUpload(BaseModel):
     natural_language_rubric: str
     regex_checks: Optional[list[RegexCheck]] = []
+    include_globs: Optional[list[str]] = None
+    exclude_globs: Optional[list[str]] = None
+    rubric_sections: Optional[list[RubricSection]] = None  # Parsed from "Name (N points)" lines when omitted
+    llm_output_mode: Optional[Literal["text", "json"]] = None
+    cascade: Optional[bool | CascadeSettings] = None  # true uses the LLM_SCREEN_* and LLM_GRADE_MODEL defaults
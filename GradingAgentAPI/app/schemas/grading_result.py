@@ -1,10 +1,15 @@
+from datetime import datetime
 from pydantic import BaseModel
 
 class GradingResult(BaseModel):
+    id: int | None = None
     assignment_name: str
     student_id: str
     grade: float
     feedback: str
+    created_at: datetime | None = None
+    criteria_version: int | None = None
+    is_latest: bool = True
 
     class Config:
         from_attributes = True
@@ -0,0 +1,46 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+
+# The same shape as LLMGradingOutput, in the OpenAPI subset Gemini accepts as a response_schema
+# (it rejects JSON Schema keywords such as minimum, so bounds are only checked by the Pydantic models)
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "deductions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "points": {"type": "integer"},
+                    "description": {"type": "string"},
+                },
+                "required": ["points", "description"],
+            },
+        },
+        "summary": {"type": "string"},
+    },
+    "required": ["deductions", "summary"],
+}
+
+SCREEN_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "format": "enum", "enum": ["full_marks", "no_attempt", "needs_review"]},
+        "confidence": {"type": "number"},
+        "reason": {"type": "string"},
+    },
+    "required": ["verdict", "confidence", "reason"],
+}
+
+class LLMDeduction(BaseModel):
+    points: int = Field(ge=0, le=100)
+    description: str = Field(min_length=1)
+
+class LLMGradingOutput(BaseModel):
+    deductions: list[LLMDeduction]
+    summary: str
+
+class ScreeningOutput(BaseModel):
+    verdict: Literal["full_marks", "no_attempt", "needs_review"]
+    confidence: float = Field(ge=0, le=1)
+    reason: str
@@ -0,0 +1,129 @@
+"""
+Admission control for inline grading requests.
+
+At most MAX_INFLIGHT_GRADES grades run at once; up to MAX_GRADE_QUEUE_DEPTH more wait for a slot, and
+anything beyond that is rejected with 429 and a Retry-After estimated from recent throughput. Waiting
+requests are queued per TA and slots are handed out round-robin across TAs, so one TA batch-grading a
+whole section cannot starve everyone else.
+"""
+
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from app.core.config import settings
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, max_queue: int, window_seconds: float = 300):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.window_seconds = window_seconds
+        self.inflight = 0
+        self.queued = 0
+        self._waiters: OrderedDict[str, deque] = OrderedDict()  # Tenants in round-robin order
+        self._completions = deque()
+
+    def throughput(self) -> float:
+        """Completed grades per second over the recent window."""
+        cutoff = time.monotonic() - self.window_seconds
+        while self._completions and self._completions[0] < cutoff:
+            self._completions.popleft()
+        if not self._completions:
+            return 0.0
+        elapsed = max(time.monotonic() - self._completions[0], 1.0)
+        return len(self._completions) / elapsed
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog (plus this request) should have drained."""
+        rate = self.throughput()
+        if rate <= 0:
+            return settings.ADMISSION_DEFAULT_RETRY_AFTER
+        return max(1, math.ceil((self.queued + self.inflight + 1 - self.max_inflight) / rate))
+
+    async def acquire(self, tenant: str) -> None:
+        if self.inflight < self.max_inflight and self.queued == 0:
+            self.inflight += 1
+            return
+        if self.queued >= self.max_queue:
+            raise HTTPException(
+                status_code=429,
+                detail="Grading service is at capacity. Please retry later.",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(completed=False)  # The slot was handed over as we were cancelled
+            else:
+                self._remove(tenant, waiter)
+            raise
+
+    def release(self, completed: bool = True) -> None:
+        if completed:
+            self._completions.append(time.monotonic())
+        waiter = self._next_waiter()
+        if waiter is None:
+            self.inflight -= 1
+        else:
+            waiter.set_result(None)  # The slot passes directly to the next waiter
+
+    def _next_waiter(self):
+        while self._waiters:
+            tenant, waiters = next(iter(self._waiters.items()))
+            waiter = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._waiters.move_to_end(tenant)
+            else:
+                del self._waiters[tenant]
+            if not waiter.done():
+                return waiter
+        return None
+
+    def _remove(self, tenant: str, waiter) -> None:
+        waiters = self._waiters.get(tenant)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self.queued -= 1
+            if not waiters:
+                del self._waiters[tenant]
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "throughput_per_minute": round(self.throughput() * 60, 2),
+            "queued_by_tenant": {tenant: len(w) for tenant, w in self._waiters.items()},
+        }
+
+
+controller = AdmissionController(
+    settings.MAX_INFLIGHT_GRADES, settings.MAX_GRADE_QUEUE_DEPTH, settings.ADMISSION_WINDOW_SECONDS
+)
+
+
+def tenant_for(gemini_api_key: str, ta_id: str | None = None) -> str:
+    """Fair-share key: an explicit TA id if given, otherwise the TA's own Gemini key (hashed)."""
+    if ta_id:
+        return ta_id
+    return "key-" + hashlib.sha256(gemini_api_key.encode("utf-8")).hexdigest()[:12]
+
+
+@asynccontextmanager
+async def grading_slot(tenant: str):
+    await controller.acquire(tenant)
+    try:
+        yield
+    finally:
+        controller.release()
@@ -0,0 +1,94 @@
+"""
+Instructor starter-code baselines.
+
+A baseline is the scaffolding handed out with an assignment. Submissions are compared against it so the
+LLM prompt only carries what the student wrote: unchanged starter files are omitted and modified ones are
+sent as unified diffs when that is shorter than the file.
+"""
+
+import difflib
+import io
+import os
+import zipfile
+from sqlalchemy.orm import Session
+from app.db import models
+from app.services import snapshots
+
+
+def read_baseline_archive(data: bytes, assignment_name: str) -> list:
+    """
+    Extract the .java files of a starter-code zip as {"path", "data", "content"} dicts.
+    A leading folder named after the assignment is stripped so paths line up with the submission folder.
+    """
+    files = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.endswith(".java") or name.startswith("__MACOSX/"):
+                continue
+            parts = name.split("/")
+            if len(parts) > 1 and parts[0] == assignment_name:
+                parts = parts[1:]
+            data = archive.read(info)
+            files.append({"path": os.path.join(*parts), "data": data, "content": snapshots.decode(data)})
+    return files
+
+
+def save_baseline(db: Session, assignment_id: int, files: list) -> None:
+    """Replace an assignment's baseline with the given files. Does not commit."""
+    db.query(models.BaselineFile).filter(models.BaselineFile.assignment_id == assignment_id).delete()
+    hashes = snapshots.store_blobs(db, [f.get("data", f["content"]) for f in files])
+    db.add_all([
+        models.BaselineFile(assignment_id=assignment_id, path=f["path"], blob_hash=digest)
+        for f, digest in zip(files, hashes)
+    ])
+
+
+def load_baseline(db: Session, assignment_id: int) -> dict[str, str]:
+    """Return the assignment's baseline as {path: content} (empty if none was uploaded)."""
+    rows = db.query(models.BaselineFile).filter(models.BaselineFile.assignment_id == assignment_id).all()
+    blobs = snapshots.load_blobs(db, [r.blob_hash for r in rows])
+    return {r.path: snapshots.decompress(blobs[r.blob_hash]) for r in rows}
+
+
+def _match(path: str, baseline: dict, by_name: dict) -> str | None:
+    """Baseline content for a submission path, falling back to a unique file name match."""
+    if path in baseline:
+        return baseline[path]
+    candidates = by_name.get(os.path.basename(path), [])
+    return baseline[candidates[0]] if len(candidates) == 1 else None
+
+
+def strip_baseline(source_files: list, baseline: dict) -> tuple[list, list[str]]:
+    """
+    Reduce source files to the student's own work.
+    Returns (files for the prompt, paths of unchanged starter files that were omitted).
+    Prompt files carry a "diff" flag when their content is a unified diff against the starter file.
+    """
+    if not baseline:
+        return source_files, []
+
+    by_name = {}
+    for path in baseline:
+        by_name.setdefault(os.path.basename(path), []).append(path)
+
+    prompt_files = []
+    omitted = []
+    for file in source_files:
+        starter = _match(file["path"], baseline, by_name)
+        if starter is None:
+            prompt_files.append(file)
+        elif starter == file["content"]:
+            omitted.append(file["path"])
+        else:
+            diff = "".join(difflib.unified_diff(
+                starter.splitlines(keepends=True),
+                file["content"].splitlines(keepends=True),
+                fromfile=f"starter/{file['path']}",
+                tofile=f"student/{file['path']}",
+            ))
+            if len(diff) < len(file["content"]):
+                prompt_files.append({"path": file["path"], "content": diff, "diff": True})
+            else:
+                prompt_files.append(file)
+    return prompt_files, omitted
@@ -0,0 +1,46 @@
+"""
+End-to-end deadlines for grades.
+
+A grade runs inside deadline.scope(): the whole task is cancelled when its budget runs out, wherever it
+is (waiting for admission, cloning, calling Gemini), and the absolute deadline is kept in a context
+variable so blocking calls that cannot be cancelled from the event loop, such as Gemini HTTP requests in
+worker threads, can bound their own timeouts with remaining(). Context variables follow the grade into
+the workflow's stage tasks and asyncio.to_thread calls.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import HTTPException
+
+_deadline: ContextVar[float | None] = ContextVar("grade_deadline", default=None)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current grade's deadline, or None outside a deadline scope."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@asynccontextmanager
+async def scope(seconds: float):
+    """
+    Run the block under a deadline `seconds` from now (or the enclosing deadline, if that is sooner).
+    Raises HTTPException 504 when the deadline cancels the block.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    timeout = asyncio.timeout(max(0.0, deadline - time.monotonic()))
+    try:
+        async with timeout:
+            yield
+    except TimeoutError:
+        if not timeout.expired():
+            raise  # A timeout of something inside the block, not the deadline
+        raise HTTPException(status_code=504, detail="Grading deadline exceeded") from None
+    finally:
+        _deadline.reset(token)
@@ -1,15 +1,36 @@
 from fastapi import UploadFile, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from app.schemas.grading import GradingRequest, AssignmentCreate
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only
+from app.schemas.grading import GradingRequest, AssignmentCreate, CascadeSettings
 from app.db import models
-from app.schemas.grading_result import GradingResult as GradingResultSchema
+from app.schemas import llm_output
+from app.services import regex_checks as regex_service
+from app.services import regex_sandbox
+from app.services import snapshots
+from app.services import similarity
+from app.services import baseline as baseline_service
+from app.services import source_collector
+from app.services import job_queue
+from app.services import single_flight
+from app.services import stats
+from app.services import rubric
+from app.services import retrieval
+from app.services import workflow
+from app.services import llm_client
+from app.services import usage
+from app.core.config import settings
+import asyncio
+import hashlib
 import tempfile
+import zipfile
 import subprocess
 import os
+import shutil
 import json
 import re
-import docx
-import google.generativeai as genai
+from datetime import datetime, timezone
 
 
 async def create_assignment(request: AssignmentCreate, db: Session):
@@ -41,6 +62,7 @@ async def save_criteria(assignment_name: str, criteria_file: UploadFile, db: Ses
 
     # Read file content
     if file_extension == 'docx':
+        import docx  # Loaded on first use; most criteria are JSON
         try:
             doc = docx.Document(criteria_file.file)
             criteria_text = "\n".join([para.text for para in doc.paragraphs])
@@ -69,23 +91,136 @@ async def save_criteria(assignment_name: str, criteria_file: UploadFile, db: Ses
             "regex_checks": []
         }
 
-    # Save to database
+    regex_warnings = _validate_regex_checks(criteria_data.get("regex_checks") or [])
+    llm_output_mode = criteria_data.get("llm_output_mode")
+    if llm_output_mode not in (None, "text", "json"):
+        raise HTTPException(status_code=400, detail="llm_output_mode must be 'text' or 'json'")
+    rubric_sections = _rubric_sections(criteria_data)
+    cascade = _cascade_settings(criteria_data.get("cascade") or None)
+    include_globs = _globs(criteria_data, "include_globs")
+    exclude_globs = _globs(criteria_data, "exclude_globs")
+
+    # Save to database; a new upload starts a new criteria version with every check enabled
     criteria = db.query(models.Criteria).filter(models.Criteria.assignment_id == assignment.id).first()
     if criteria:
         criteria.natural_language_rubric = criteria_data["natural_language_rubric"]
         criteria.regex_checks = criteria_data.get("regex_checks", [])
+        criteria.include_globs = include_globs
+        criteria.exclude_globs = exclude_globs
+        criteria.llm_output_mode = llm_output_mode
+        criteria.cascade = cascade
+        criteria.rubric_sections = rubric_sections
+        criteria.version = (criteria.version or 1) + 1
+        criteria.disabled_checks = []
     else:
         criteria = models.Criteria(
             assignment_id=assignment.id,
             natural_language_rubric=criteria_data["natural_language_rubric"],
-            regex_checks=criteria_data.get("regex_checks", [])
+            regex_checks=criteria_data.get("regex_checks", []),
+            include_globs=include_globs,
+            exclude_globs=exclude_globs,
+            llm_output_mode=llm_output_mode,
+            cascade=cascade,
+            rubric_sections=rubric_sections,
         )
         db.add(criteria)
 
     db.commit()
+    if regex_warnings:
+        return {"message": f"Criteria for {assignment_name} saved.", "warnings": regex_warnings}
     return {"message": f"Criteria for {assignment_name} saved."}
 
 
+def _globs(criteria_data: dict, field: str) -> list[str] | None:
+    """An include/exclude glob list of uploaded criteria; a bare string would be matched character by character."""
+    globs = criteria_data.get(field)
+    if globs is None:
+        return None
+    if not isinstance(globs, list) or not all(isinstance(glob, str) and glob for glob in globs):
+        raise HTTPException(status_code=400, detail=f"{field} must be a list of non-empty glob strings")
+    return globs
+
+
+def _cascade_settings(cascade) -> dict | None:
+    """The cascade object of uploaded criteria, with unset fields left to the settings defaults."""
+    if cascade is None:
+        return None
+    if cascade is True:
+        return {}  # Enabled with the default models and threshold
+    if not isinstance(cascade, dict):
+        raise HTTPException(status_code=400, detail="cascade must be true or an object")
+    try:
+        return CascadeSettings.model_validate(cascade).model_dump(exclude_none=True)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        raise HTTPException(status_code=400, detail=f"Invalid cascade: {problems}")
+
+
+def _rubric_sections(criteria_data: dict) -> dict | None:
+    """
+    Split the rubric into independently graded sections: an explicit "rubric_sections" list in JSON
+    criteria (an empty list turns splitting off), otherwise point-weighted lines found in the rubric text.
+    """
+    rubric_text = criteria_data["natural_language_rubric"]
+    if "rubric_sections" in criteria_data:
+        sections, context = rubric.validate_sections(criteria_data["rubric_sections"]), rubric_text
+    else:
+        sections, context = rubric.parse_sections(rubric_text)
+    if len(sections) < 2:
+        return None
+    return {"context": context, "sections": sections}
+
+
+def _validate_regex_checks(regex_checks: list) -> list[str]:
+    """
+    Reject regex checks that do not compile or contain known catastrophic-backtracking constructs.
+    Returns warnings for patterns that may match differently over whole files than they did line by line.
+    """
+    warnings = []
+    for check in regex_checks:
+        pattern = check.get("pattern") if isinstance(check, dict) else None
+        if not pattern:
+            continue
+        try:
+            problem = regex_sandbox.find_catastrophic_construct(pattern)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regex pattern '{pattern}': {e}")
+        if problem:
+            raise HTTPException(status_code=400, detail=f"Unsafe regex pattern '{pattern}': {problem}")
+        warnings.extend(f"Regex pattern '{pattern}': {change}" for change in regex_sandbox.find_line_semantics_changes(pattern))
+    return warnings
+
+
+async def save_baseline(assignment_name: str, baseline_file: UploadFile, db: Session):
+    """
+    Save the instructor's starter code for an assignment.
+    Expected format: a .zip of the starter sources, or a single .java file.
+    """
+    assignment = db.query(models.Assignment).filter(models.Assignment.name == assignment_name).first()
+    if not assignment:
+        assignment = models.Assignment(name=assignment_name)
+        db.add(assignment)
+        db.commit()
+        db.refresh(assignment)
+
+    file_extension = baseline_file.filename.split('.')[-1]
+    if file_extension not in ['zip', 'java']:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only .zip and .java files are allowed.")
+
+    data = await baseline_file.read()
+    if file_extension == 'zip':
+        try:
+            files = baseline_service.read_baseline_archive(data, assignment_name)
+        except zipfile.BadZipFile as e:
+            raise HTTPException(status_code=400, detail=f"Invalid zip file: {e}")
+    else:
+        files = [{"path": os.path.basename(baseline_file.filename), "data": data, "content": snapshots.decode(data)}]
+
+    baseline_service.save_baseline(db, assignment.id, files)
+    db.commit()
+    return {"message": f"Baseline for {assignment_name} saved.", "files": len(files)}
+
+
 async def grade_assignment(request: GradingRequest, db: Session) -> dict:
     """
     Grade a student's assignment by:
@@ -95,78 +230,317 @@ async def grade_assignment(request: GradingRequest, db: Session) -> dict:
     4. Using Gemini API to evaluate code against natural language rubric
     """
     repo_url = str(request.repo_link)
-    authenticated_url = repo_url.replace("https://", f"https://oauth2:{request.token}@")
 
     # Get assignment and criteria
     assignment = db.query(models.Assignment).filter(models.Assignment.name == request.assignment_name).first()
     if not assignment or not assignment.criteria:
         raise HTTPException(status_code=404, detail=f"Grading criteria for '{request.assignment_name}' not found.")
 
+    # Duplicates of an in-flight grade (client retries, double-submits) share its result
+    key = (repo_url, request.assignment_name, assignment.criteria.version)
+    return await single_flight.grades.do(key, lambda: _grade_submission(request, assignment, db))
+
+
+async def _grade_submission(request: GradingRequest, assignment: models.Assignment, db: Session) -> dict:
+    repo_url = str(request.repo_link)
+
     # Extract student ID from repo URL (e.g., github.com/username/repo -> username)
     student_id = _extract_student_id(repo_url)
 
+    # Other API processes and workers coordinate through an advisory lock held until our commit;
+    # if a duplicate finished while we waited for it, answer with its result instead of grading again
+    seen = db.query(func.max(models.GradingResult.id)).filter(
+        models.GradingResult.assignment_id == assignment.id,
+        models.GradingResult.student_id == student_id,
+    ).scalar() or 0
+    lock_id = single_flight.lock_key(repo_url, assignment.name, assignment.criteria.version)
+    if await single_flight.advisory_xact_lock(db, lock_id):
+        duplicate = db.query(models.GradingResult).filter(
+            models.GradingResult.assignment_id == assignment.id,
+            models.GradingResult.student_id == student_id,
+            models.GradingResult.id > seen,
+        ).order_by(models.GradingResult.id.desc()).first()
+        if duplicate:
+            db.commit()
+            return _stored_grading_response(duplicate, request.assignment_name)
+
+    criteria = assignment.criteria
+    timings = []
     with tempfile.TemporaryDirectory() as temp_dir:
-        # Clone repository
         try:
-            subprocess.run(
-                ["git", "clone", authenticated_url, temp_dir],
-                check=True,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-        except subprocess.CalledProcessError as e:
-            raise HTTPException(status_code=400, detail=f"Failed to clone repository: {e.stderr}")
+            values = await GRADING_WORKFLOW.run({
+                "request": request,
+                "criteria": criteria,
+                "checkout": temp_dir,
+                "baseline": baseline_service.load_baseline(db, assignment.id),
+            }, timings)
         except subprocess.TimeoutExpired:
             raise HTTPException(status_code=408, detail="Repository clone timeout")
+        except workflow.StageTimeout as e:
+            raise HTTPException(status_code=504, detail=f"Grading timed out: {e}")
 
-        # Find assignment folder
-        assignment_path = os.path.join(temp_dir, request.assignment_name)
-        if not os.path.isdir(assignment_path):
-            raise HTTPException(status_code=404, detail=f"Assignment folder '{request.assignment_name}' not found in the repository.")
-
-        # Collect all Java files
-        source_files = []
-        for root, _, files in os.walk(assignment_path):
-            for file in files:
-                if file.endswith(".java"):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                            content = f.read()
-                        # Store relative path for cleaner output
-                        relative_path = os.path.relpath(file_path, assignment_path)
-                        source_files.append({"path": relative_path, "content": content})
-                    except Exception as e:
-                        print(f"Warning: Could not read {file_path}: {e}")
-
-        if not source_files:
-            raise HTTPException(status_code=404, detail=f"No Java files found in '{request.assignment_name}'.")
-
-        # Grade the assignment
-        grading_result = await _grade_with_gemini_and_regex(
-            source_files=source_files,
-            natural_language_rubric=assignment.criteria.natural_language_rubric,
-            regex_checks=assignment.criteria.regex_checks or [],
-            gemini_api_key=request.gemini_api_key
-        )
+    source_files = values["source_files"]
+    # Files the regex checks could not scan are listed with the skipped files, since their deductions are missing
+    skipped_files = values["skipped_files"] + values["regex"]["unscanned"]
+    grading_result = _combine_grade(values["regex"], values["llm"], skipped_files)
+    grading_result["stage_timings"] = timings
+    llm_wall_ms = next((t.get("duration_ms") for t in timings if t["stage"] == "llm"), None)
+    grading_result["usage"] = usage.result_usage(grading_result["llm_tiers"], llm_wall_ms)
 
-        # Save the grading result to database
-        new_grading_result = models.GradingResult(
-            assignment_id=assignment.id,
-            student_id=student_id,
-            grade=grading_result["grade"],
-            feedback=grading_result["feedback"]
-        )
-        db.add(new_grading_result)
-        db.commit()
+    # Save the grading result to database, with a snapshot of the graded sources
+    new_grading_result = models.GradingResult(
+        assignment_id=assignment.id,
+        student_id=student_id,
+        grade=grading_result["grade"],
+        feedback=grading_result["feedback"],
+        llm_feedback=grading_result["llm_feedback"],
+        llm_deduction_total=grading_result["llm_deduction_total"],
+        skipped_files=skipped_files,
+        criteria_version=criteria.version,
+        llm_tiers=grading_result["llm_tiers"],
+        stage_timings=timings,
+        **grading_result["usage"],
+        deductions=[models.Deduction(**record) for record in grading_result["deduction_records"]],
+    )
+    if grading_result["timed_out_checks"]:
+        criteria.disabled_checks = (criteria.disabled_checks or []) + grading_result["timed_out_checks"]
+    snapshots.store_snapshot(db, new_grading_result, source_files)
+    similarity.store_signature(db, assignment.id, student_id, values["signature"])
+    _store_latest(db, new_grading_result)
+    db.commit()
+
+    return {
+        "message": "Assignment grading complete.",
+        "student_id": student_id,
+        "assignment_name": request.assignment_name,
+        "grading_result": grading_result
+    }
+
+
+# Grading stages. Each takes its inputs by name and returns its outputs; GRADING_WORKFLOW (below) runs a
+# stage once its inputs exist, so regex checks, the Gemini evaluation and similarity fingerprinting overlap.
+# Stages run on the event loop and must not use the database session; it is read before the run
+# (baseline) and written after it.
+
+async def _clone_stage(request: GradingRequest, checkout: str) -> dict:
+    repo_url = str(request.repo_link)
+    authenticated_url = repo_url.replace("https://", f"https://oauth2:{request.token}@")
+    repo_dir = os.path.join(checkout, "repo")
+    shutil.rmtree(repo_dir, ignore_errors=True)  # Left over from a timed out attempt
+    process = await asyncio.create_subprocess_exec(
+        "git", "clone", authenticated_url, repo_dir,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), settings.CLONE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        await _kill(process)
+        raise subprocess.TimeoutExpired(["git", "clone"], settings.CLONE_TIMEOUT_SECONDS)
+    except asyncio.CancelledError:
+        # The client went away, the job was cancelled or the deadline passed: stop git too
+        await _kill(process)
+        raise
+    if process.returncode != 0:
+        detail = stderr.decode("utf-8", errors="replace")
+        if request.token:
+            detail = detail.replace(request.token, "***")
+        raise HTTPException(status_code=400, detail=f"Failed to clone repository: {detail}")
+
+    # Find assignment folder
+    assignment_path = os.path.join(repo_dir, request.assignment_name)
+    if not os.path.isdir(assignment_path):
+        raise HTTPException(status_code=404, detail=f"Assignment folder '{request.assignment_name}' not found in the repository.")
+    return {"assignment_path": assignment_path}
+
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def _collect_stage(request: GradingRequest, criteria: models.Criteria, assignment_path: str) -> dict:
+    # Collect source files within the per-submission limits
+    source_files, skipped_files = await asyncio.to_thread(
+        source_collector.collect_sources,
+        assignment_path,
+        include=criteria.include_globs,
+        exclude=criteria.exclude_globs,
+        max_file_bytes=settings.MAX_SOURCE_FILE_BYTES,
+        max_total_bytes=settings.MAX_SUBMISSION_BYTES,
+        max_files=settings.MAX_SOURCE_FILES,
+        workers=settings.SOURCE_READ_WORKERS,
+    )
+    if not source_files:
+        raise HTTPException(status_code=404, detail=f"No Java files found in '{request.assignment_name}'.")
+    return {"source_files": source_files, "skipped_files": skipped_files}
 
-        return {
-            "message": "Assignment grading complete.",
-            "student_id": student_id,
-            "assignment_name": request.assignment_name,
-            "grading_result": grading_result
-        }
+
+async def _baseline_stage(source_files: list, baseline: dict) -> dict:
+    # Only the student's own work goes to Gemini and the similarity index
+    student_files, omitted_files = await asyncio.to_thread(baseline_service.strip_baseline, source_files, baseline)
+    return {"student_files": student_files, "omitted_files": omitted_files}
+
+
+async def _regex_stage(criteria: models.Criteria, source_files: list) -> dict:
+    """Regex checks for automatic deductions, in the sandboxed worker pool."""
+    disabled_checks = criteria.disabled_checks or []
+    regex_checks = [c for c in criteria.regex_checks or [] if c.get("pattern") not in disabled_checks]
+    records, total, timed_out_checks, unscanned = await asyncio.to_thread(
+        regex_sandbox.apply_regex_checks, source_files, regex_checks
+    )
+    for pattern in timed_out_checks:
+        print(f"Regex pattern '{pattern}' exceeded its time budget and was disabled")
+    return {"regex": {"records": records, "total": total, "timed_out_checks": timed_out_checks, "unscanned": unscanned}}
+
+
+async def _context_stage(criteria: models.Criteria, student_files: list, omitted_files: list) -> dict:
+    code_contexts = await asyncio.to_thread(
+        _code_contexts, student_files, omitted_files, criteria.natural_language_rubric, criteria.rubric_sections
+    )
+    return {"code_contexts": code_contexts}
+
+
+async def _fingerprint_stage(source_files: list, omitted_files: list) -> dict:
+    """Similarity fingerprint of the submission without its unchanged starter files."""
+    own_files = [f for f in source_files if f["path"] not in omitted_files]
+    return {"signature": await asyncio.to_thread(similarity.submission_signature, own_files)}
+
+
+async def _llm_stage(request: GradingRequest, criteria: models.Criteria, code_contexts: tuple) -> dict:
+    code_context, section_contexts = code_contexts
+    feedback, records, total, tiers = await _evaluate_with_llm(
+        gemini_api_key=request.gemini_api_key,
+        natural_language_rubric=criteria.natural_language_rubric,
+        code_context=code_context,
+        section_contexts=section_contexts,
+        output_mode=criteria.llm_output_mode or settings.LLM_OUTPUT_MODE,
+        cascade=_cascade_config(criteria),
+        sections=criteria.rubric_sections,
+    )
+    return {"llm": {"feedback": feedback, "records": records, "total": total, "tiers": tiers}}
+
+
+def _llm_fallback(error: Exception) -> dict:
+    if isinstance(error, workflow.StageAbandoned):
+        return {"llm": {"feedback": "", "records": [], "total": 0, "tiers": []}}  # Replaced in _combine_grade
+    print(f"Gemini evaluation failed: {error}")
+    feedback = f"[Gemini API Error: {error}] Could not perform AI-assisted grading. Only regex checks were applied."
+    return {"llm": {"feedback": feedback, "records": [], "total": 0, "tiers": []}}
+
+
+def _fingerprint_fallback(error: Exception) -> dict:
+    print(f"Similarity fingerprinting failed, the submission is not indexed: {error}")
+    return {"signature": None}
+
+
+GRADING_WORKFLOW = workflow.Workflow([
+    workflow.Stage(
+        "clone", _clone_stage, inputs=("request", "checkout"), outputs=("assignment_path",),
+        retries=1, retry_on=(subprocess.TimeoutExpired,),
+    ),
+    workflow.Stage(
+        "collect", _collect_stage, inputs=("request", "criteria", "assignment_path"), outputs=("source_files", "skipped_files")
+    ),
+    workflow.Stage(
+        "baseline", _baseline_stage, inputs=("source_files", "baseline"), outputs=("student_files", "omitted_files")
+    ),
+    workflow.Stage("regex", _regex_stage, inputs=("criteria", "source_files"), outputs=("regex",)),
+    workflow.Stage(
+        "context", _context_stage, inputs=("criteria", "student_files", "omitted_files"), outputs=("code_contexts",)
+    ),
+    workflow.Stage(
+        "fingerprint", _fingerprint_stage, inputs=("source_files", "omitted_files"), outputs=("signature",),
+        fallback=_fingerprint_fallback,
+    ),
+    # Starts alongside the regex checks; abandoned if they already take the grade to zero
+    workflow.Stage(
+        "llm", _llm_stage, inputs=("request", "criteria", "code_contexts"), outputs=("llm",),
+        timeout=settings.LLM_STAGE_TIMEOUT_SECONDS, fallback=_llm_fallback,
+        abandon_if=("regex", lambda regex: regex["total"] >= 100),
+    ),
+])
+
+
+def _store_latest(db: Session, result: models.GradingResult, attempts: int = 3) -> None:
+    """
+    Add result as the student's latest for its assignment and demote the previous latest, in one savepoint.
+    The partial unique index on is_latest rejects a concurrent insert for the same student; the loser
+    retries, now seeing (and demoting) the winner's row.
+    """
+    for attempt in range(attempts):
+        try:
+            with db.begin_nested():
+                db.query(models.GradingResult).filter(
+                    models.GradingResult.assignment_id == result.assignment_id,
+                    models.GradingResult.student_id == result.student_id,
+                    models.GradingResult.is_latest.is_(True),
+                ).update({"is_latest": False}, synchronize_session="fetch")
+                result.is_latest = True
+                db.add(result)
+            return
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def _stored_grading_response(result: models.GradingResult, assignment_name: str) -> dict:
+    """Rebuild the grade response from a stored result, for a duplicate answered by another process."""
+    records = [_deduction_record(d) for d in result.deductions]
+    llm_records = [r for r in records if r["source"] == "llm"]
+    return {
+        "message": "Assignment grading complete.",
+        "student_id": result.student_id,
+        "assignment_name": assignment_name,
+        "grading_result": {
+            "grade": result.grade,
+            "feedback": result.feedback,
+            "deductions": [regex_service.format_deduction(r) for r in records],
+            "deduction_records": records,
+            "llm_feedback": result.llm_feedback,
+            "llm_deductions": [regex_service.format_deduction(r) for r in llm_records],
+            "llm_deduction_total": result.llm_deduction_total or 0,
+            "llm_tiers": result.llm_tiers or [],
+            "timed_out_checks": [],
+            "stage_timings": result.stage_timings or [],
+            "usage": {column: getattr(result, column) for column in usage.COLUMNS},
+        },
+    }
+
+
+def _deduction_record(deduction: models.Deduction) -> dict:
+    return {
+        "source": deduction.source,
+        "points": deduction.points,
+        "message": deduction.message,
+        "file": deduction.file,
+        "line": deduction.line,
+    }
+
+
+async def enqueue_grading_job(request: GradingRequest, db: Session, profile: bool = False) -> dict:
+    """Queue a grading request for the worker pool (python -m app.worker)."""
+    job = job_queue.enqueue(db, request.model_dump(mode="json"), profile=profile)
+    return {"job_id": job.id, "status": job.status}
+
+
+async def get_grading_job(job_id: int, db: Session) -> dict:
+    job = db.query(models.GradingJob).filter(models.GradingJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job_queue.job_status(job)
+
+
+async def cancel_grading_job(job_id: int, db: Session) -> dict:
+    """Cancel a queued or running job; a running job's worker stops grading at its next cancellation check."""
+    job = db.query(models.GradingJob).filter(models.GradingJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    if job.status in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {job.status}.")
+    job_queue.cancel(db, job)
+    return job_queue.job_status(job)
 
 
 def _extract_student_id(repo_url: str) -> str:
@@ -181,61 +555,88 @@ def _extract_student_id(repo_url: str) -> str:
         return "unknown_student"
 
 
-async def _grade_with_gemini_and_regex(
-    source_files: list,
+async def _evaluate_with_llm(
+    gemini_api_key: str,
     natural_language_rubric: str,
-    regex_checks: list,
-    gemini_api_key: str
-) -> dict:
+    code_context: str,
+    section_contexts: list[str] | None,
+    output_mode: str = "text",
+    cascade: dict | None = None,
+    sections: dict | None = None
+) -> tuple[str, list[dict], int, list]:
     """
-    Grade using both regex checks and Gemini API analysis.
-    Returns: {"grade": int, "feedback": str, "deductions": list}
+    Gemini evaluation of design pattern use and code quality against the rubric. With a cascade, a screening model classifies
+    the submission first and the grading model only runs when the screen is not confident. A rubric split
+    into sections is evaluated one concurrent call per section, each with its own code context.
+    Returns (feedback, deduction records, deduction total, tiers: a record of every model call).
     """
-    deductions = []
-    total_deduction = 0
-
-    # Step 1: Apply regex checks for automatic deductions
-    for file in source_files:
-        file_path = file["path"]
-        content = file["content"]
-        lines = content.splitlines()
-
-        for check in regex_checks:
-            pattern = check.get("pattern")
-            deduction = check.get("deduction")
-            message = check.get("message")
-
-            if not all([pattern, deduction, message]):
-                continue
-
-            for i, line in enumerate(lines, 1):
-                try:
-                    if re.search(pattern, line):
-                        total_deduction += deduction
-                        deduction_entry = f"[-{deduction} points] {message} (in {file_path}:{i})"
-                        deductions.append(deduction_entry)
-                        break  # Only deduct once per file per pattern
-                except re.error as e:
-                    print(f"Invalid regex pattern '{pattern}': {e}")
-
-    # Step 2: Use Gemini API for design pattern and code quality evaluation
+    tiers = []
+    grade_model = (cascade or {}).get("grade_model") or settings.LLM_GRADE_MODEL
     try:
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        screened = None
+        if cascade:
+            screened = await _screen_submission(gemini_api_key, natural_language_rubric, code_context, cascade, tiers)
 
-        # Prepare code context for Gemini
-        code_context = _prepare_code_for_gemini(source_files)
+        if screened is not None:
+            feedback, records, total = screened
+        elif sections:
+            feedback, records, total = await _grade_sections(
+                gemini_api_key, sections, section_contexts, grade_model, output_mode, tiers
+            )
+        elif output_mode == "json":
+            feedback, records, total = await _grade_with_gemini_json(
+                gemini_api_key, natural_language_rubric, code_context, grade_model, tiers
+            )
+        else:
+            feedback, records, total = await _grade_with_gemini_text(
+                gemini_api_key, natural_language_rubric, code_context, grade_model, tiers
+            )
+    except Exception as e:
+        # If Gemini fails, log and continue with regex-only grading
+        print(f"Gemini API error: {e}")
+        feedback = f"[Gemini API Error: {str(e)}] Could not perform AI-assisted grading. Only regex checks were applied."
+        records, total = [], 0
+    return feedback, records, total, tiers
 
-        # Create the grading prompt
-        prompt = f"""You are a university teaching assistant grading a Java programming assignment.
+
+def _combine_grade(regex: dict, llm: dict, skipped_files: list | None = None) -> dict:
+    """
+    Final grade from the regex and Gemini stages. Gemini's evaluation is discarded when regex deductions
+    already reach 100 (the llm stage is abandoned then, unless it finished first); its calls stay in the tiers.
+    Returns: {"grade": int, "feedback": str, "deductions": list, "deduction_records": list, "llm_tiers": list, ...llm parts kept for re-grading}
+    """
+    if regex["total"] >= 100:
+        feedback = "Automatic deductions already reach 100 points; AI-assisted grading was skipped."
+        skipped = {"tier": "regex", "outcome": "skipped_llm", "regex_deduction_total": regex["total"]}
+        llm = {"feedback": feedback, "records": [], "total": 0, "tiers": llm["tiers"] + [skipped]}
+    records = regex["records"] + llm["records"]
+    final_grade = max(0, 100 - regex["total"] - llm["total"])
+    deductions = [regex_service.format_deduction(r) for r in records]
+
+    return {
+        "grade": final_grade,
+        "feedback": _format_feedback(final_grade, deductions, llm["feedback"], skipped_files),
+        "deductions": deductions,
+        "deduction_records": records,
+        "llm_feedback": llm["feedback"],
+        "llm_deductions": [regex_service.format_deduction(r) for r in llm["records"]],
+        "llm_deduction_total": llm["total"],
+        "llm_tiers": llm["tiers"],
+        "timed_out_checks": regex["timed_out_checks"],
+    }
+
+
+async def _grade_with_gemini_text(
+    gemini_api_key: str, natural_language_rubric: str, code_context: str, model_name: str, tiers: list
+) -> tuple[str, list[dict], int]:
+    """Free-form grading: Gemini writes prose feedback and deduction lines are parsed out of it."""
+    # Create the grading prompt: the rubric and instructions are the same for every student, the code comes last
+    prefix = f"""You are a university teaching assistant grading a Java programming assignment.
 Your task is to evaluate the student's code based on the following grading rubric and provide detailed feedback.
 
 GRADING RUBRIC:
 {natural_language_rubric}
 
-STUDENT'S CODE:
-{code_context}
-
 INSTRUCTIONS:
 1. Evaluate the code against the rubric criteria
 2. Focus on design patterns, code structure, architecture, and best practices
@@ -245,26 +646,209 @@ INSTRUCTIONS:
 6. Start your response directly with deductions and feedback
 7. Format each deduction as: [-X points] Description of issue
 
+"""
+    suffix = f"""STUDENT'S CODE:
+{code_context}
+
 Provide your grading feedback now:"""
 
-        # Call Gemini API
-        response = model.generate_content(prompt)
-        gemini_feedback = response.text.strip()
+    # Call Gemini API under the TA key's adaptive concurrency limit
+    response, meta = await llm_client.generate(gemini_api_key, model_name, prefix + suffix)
+    tiers.append(_tier_record("grade", model_name, response, meta))
+    gemini_feedback = response.text.strip()
+
+    # Parse Gemini's response for additional deductions
+    gemini_deductions, gemini_deduction_total = _parse_gemini_deductions(gemini_feedback)
+    return gemini_feedback, gemini_deductions, gemini_deduction_total
 
-        # Parse Gemini's response for additional deductions
-        gemini_deductions, gemini_deduction_total = _parse_gemini_deductions(gemini_feedback)
-        deductions.extend(gemini_deductions)
-        total_deduction += gemini_deduction_total
 
+async def _grade_sections(
+    gemini_api_key: str, sections: dict, code_contexts: list[str], model_name: str, output_mode: str, tiers: list
+) -> tuple[str, list[dict], int]:
+    """
+    Evaluate each rubric section with its own concurrent Gemini call (and its own code context, see
+    _code_contexts), so a grade takes about as long as its slowest section. Each section's deductions are
+    capped at its points; a failed section adds none.
+    """
+    grade = _grade_with_gemini_json if output_mode == "json" else _grade_with_gemini_text
+
+    async def grade_section(section, code_context):
+        section_tiers = []
+        try:
+            feedback, records, _ = await grade(
+                gemini_api_key, rubric.section_rubric(section, sections["context"]), code_context, model_name, section_tiers
+            )
+        except Exception as e:
+            print(f"Gemini API error in section '{section['name']}': {e}")
+            feedback, records = f"[Gemini API Error: {e}] This section was not evaluated.", []
+        for tier in section_tiers:
+            tier["section"] = section["name"]
+        return feedback, rubric.cap_deductions(records, section), section_tiers
+
+    outcomes = await asyncio.gather(*(
+        grade_section(section, code_context) for section, code_context in zip(sections["sections"], code_contexts)
+    ))
+
+    feedback_parts, records = [], []
+    for section, (feedback, section_records, section_tiers) in zip(sections["sections"], outcomes):
+        feedback_parts.append(f"## {section['name']} ({section['points']} points)\n{feedback}")
+        records.extend(section_records)
+        tiers.extend(section_tiers)
+    return "\n\n".join(feedback_parts), records, sum(r["points"] for r in records)
+
+
+async def _grade_with_gemini_json(
+    gemini_api_key: str, natural_language_rubric: str, code_context: str, model_name: str, tiers: list
+) -> tuple[str, list[dict], int]:
+    """
+    Ask Gemini for schema-constrained JSON (deductions plus a short summary) instead of free-form prose.
+    Responses that are not valid JSON or fail validation are retried up to LLM_JSON_MAX_ATTEMPTS times.
+    Returns (summary, deduction records, total).
+    """
+    prefix = f"""You are a university teaching assistant grading a Java programming assignment.
+Evaluate the student's code against the grading rubric, focusing on design patterns, code structure,
+architecture, and best practices.
+
+GRADING RUBRIC:
+{natural_language_rubric}
+
+Respond with JSON only:
+- "deductions": one entry per distinct issue, with "points" (a positive integer) and a one-sentence "description". List each issue exactly once.
+- "summary": at most three sentences of overall feedback. Do not repeat the deductions.
+
+"""
+    suffix = f"""STUDENT'S CODE:
+{code_context}"""
+
+    generation_config = {
+        "response_mime_type": "application/json",
+        "response_schema": llm_output.RESPONSE_SCHEMA,
+        "max_output_tokens": settings.LLM_JSON_MAX_OUTPUT_TOKENS,
+    }
+    for attempt in range(1, settings.LLM_JSON_MAX_ATTEMPTS + 1):
+        response, meta = await llm_client.generate(
+            gemini_api_key, model_name, prefix + suffix, generation_config=generation_config
+        )
+        tiers.append(_tier_record("grade", model_name, response, meta, attempt=attempt))
+        try:
+            output = llm_output.LLMGradingOutput.model_validate_json(response.text)
+            break
+        except ValidationError as e:
+            if attempt == settings.LLM_JSON_MAX_ATTEMPTS:
+                raise ValueError(f"Malformed JSON grading output after {attempt} attempts: {e}")
+            print(f"Malformed JSON grading output (attempt {attempt}), retrying: {e}")
+
+    records = []
+    seen = set()
+    for deduction in output.deductions:
+        key = (deduction.points, deduction.description.strip().lower())
+        if key in seen:
+            continue  # The schema asks for each issue once; drop exact repeats anyway
+        seen.add(key)
+        records.append({
+            "source": "llm", "points": deduction.points, "message": deduction.description.strip(), "file": None, "line": None
+        })
+    return output.summary.strip(), records, sum(r["points"] for r in records)
+
+
+async def _screen_submission(
+    gemini_api_key: str, natural_language_rubric: str, code_context: str, cascade: dict, tiers: list
+) -> tuple[str, list[dict], int] | None:
+    """
+    First tier of the cascade: a cheap model sees a truncated prompt and classifies the submission.
+    Returns (feedback, deduction records, total) when it is confident the submission earns full marks or
+    makes no real attempt, or None to escalate to the grading model (also when the screen itself fails).
+    Full marks are never accepted from a truncated excerpt: the screen has not seen the rest of the code.
+    """
+    model_name = cascade["screen_model"]
+    threshold = cascade["confidence_threshold"]
+    excerpt = code_context[:cascade["screen_max_chars"]]
+    truncated = len(code_context) > len(excerpt)
+    prefix = f"""You are screening a Java programming assignment before full grading.
+
+GRADING RUBRIC:
+{natural_language_rubric}
+
+Classify the submission as JSON:
+- "verdict": "full_marks" if it clearly satisfies every rubric item, "no_attempt" if it is empty or does not
+  attempt the assignment, otherwise "needs_review".
+- "confidence": your confidence in the verdict, from 0 to 1.
+- "reason": one sentence.
+
+"""
+    suffix = f"""STUDENT'S CODE (possibly truncated):
+{excerpt}"""
+
+    generation_config = {
+        "response_mime_type": "application/json",
+        "response_schema": llm_output.SCREEN_RESPONSE_SCHEMA,
+        "max_output_tokens": 256,
+    }
+    try:
+        response, meta = await llm_client.generate(
+            gemini_api_key, model_name, prefix + suffix, generation_config=generation_config
+        )
+        screen = llm_output.ScreeningOutput.model_validate_json(response.text)
+        decided = screen.verdict != "needs_review" and screen.confidence >= threshold
     except Exception as e:
-        # If Gemini fails, log and continue with regex-only grading
-        print(f"Gemini API error: {e}")
-        gemini_feedback = f"[Gemini API Error: {str(e)}] Could not perform AI-assisted grading. Only regex checks were applied."
+        print(f"Screening failed, escalating: {e}")
+        tiers.append({"tier": "screen", "model": model_name, "outcome": "error", "error": str(e), "threshold": threshold})
+        return None
+
+    if screen.verdict == "full_marks" and truncated:
+        decided = False
+    tiers.append(_tier_record(
+        "screen", model_name, response, meta,
+        verdict=screen.verdict,
+        confidence=screen.confidence,
+        threshold=threshold,
+        truncated=truncated,
+        outcome="accepted" if decided else "escalated",
+    ))
+    if not decided:
+        return None
+    if screen.verdict == "full_marks":
+        return screen.reason, [], 0
+    record = {"source": "llm", "points": 100, "message": f"No attempt at the assignment: {screen.reason}", "file": None, "line": None}
+    return screen.reason, [record], 100
+
+
+def _cascade_config(criteria: models.Criteria) -> dict | None:
+    """Effective cascade settings of a criteria, or None when the cascade is off."""
+    if not criteria.cascade:
+        return None
+    return {
+        "screen_model": criteria.cascade.get("screen_model") or settings.LLM_SCREEN_MODEL,
+        "grade_model": criteria.cascade.get("grade_model") or settings.LLM_GRADE_MODEL,
+        "confidence_threshold": criteria.cascade.get("confidence_threshold", settings.LLM_SCREEN_CONFIDENCE),
+        "screen_max_chars": criteria.cascade.get("screen_max_chars", settings.LLM_SCREEN_MAX_CHARS),
+    }
+
+
+def _tier_record(tier: str, model_name: str, response, meta: dict, **extra) -> dict:
+    """Model, latency, retries and token usage of one Gemini call, stored with the result."""
+    usage = getattr(response, "usage_metadata", None)
 
-    # Calculate final grade
-    final_grade = max(0, 100 - total_deduction)
+    def tokens(field):
+        value = getattr(usage, field, None)
+        return value if isinstance(value, int) else None
 
-    # Format final feedback
+    return {
+        "tier": tier,
+        "model": model_name,
+        "latency_ms": round(meta["latency"] * 1000),
+        "retries": meta["retries"],
+        "prompt_tokens": tokens("prompt_token_count"),
+        "cached_tokens": tokens("cached_content_token_count"),
+        "output_tokens": tokens("candidates_token_count"),
+        **extra,
+    }
+
+
+def _format_feedback(
+    final_grade: float, deductions: list, gemini_feedback: str | None, skipped_files: list | None = None
+) -> str:
+    """Render the stored feedback text from the grade, deduction lines, Gemini's detailed feedback and skipped files."""
     feedback_parts = []
     feedback_parts.append(f"GRADE: {final_grade}/100\n")
     feedback_parts.append("=" * 50)
@@ -277,25 +861,70 @@ Provide your grading feedback now:"""
 
     feedback_parts.append("\n" + "=" * 50)
     feedback_parts.append("\nDETAILED FEEDBACK:")
-    feedback_parts.append(gemini_feedback if 'gemini_feedback' in locals() else "No detailed feedback available.")
+    feedback_parts.append(gemini_feedback or "No detailed feedback available.")
 
-    return {
-        "grade": final_grade,
-        "feedback": "\n".join(feedback_parts),
-        "deductions": deductions
-    }
+    if skipped_files:
+        feedback_parts.append("\n" + "=" * 50)
+        feedback_parts.append("\nSKIPPED FILES (not graded):")
+        for skipped in skipped_files:
+            feedback_parts.append(f"  {skipped['path']}: {skipped['reason']}")
+    return "\n".join(feedback_parts)
 
 
-def _prepare_code_for_gemini(source_files: list, max_chars: int = 20000) -> str:
+def _code_contexts(
+    prompt_files: list, omitted_files: list | None, natural_language_rubric: str, sections: dict | None
+) -> tuple[str, list[str] | None]:
+    """
+    Code context for the whole rubric and, for a sectioned rubric, for each section. One retrieval index is
+    shared by all of them, so the submission is chunked at most once.
+    """
+    index = retrieval.CodeIndex(prompt_files)
+    code_context = _prepare_code_for_gemini(
+        prompt_files, settings.LLM_CODE_MAX_CHARS, omitted_files, query=natural_language_rubric, index=index
+    )
+    if not sections:
+        return code_context, None
+    section_contexts = [
+        _prepare_code_for_gemini(
+            prompt_files, settings.LLM_CODE_MAX_CHARS, omitted_files,
+            query=f"{section['name']}\n{section['description']}", index=index
+        )
+        for section in sections["sections"]
+    ]
+    return code_context, section_contexts
+
+
+def _prepare_code_for_gemini(
+    source_files: list,
+    max_chars: int = 20000,
+    omitted_files: list | None = None,
+    query: str | None = None,
+    index: retrieval.CodeIndex | None = None
+) -> str:
     """
     Prepare source code for Gemini API with token limits.
-    Concatenates files with clear separators.
+    Concatenates files with clear separators. Files flagged as diffs are labelled as changes to starter code.
+    When the files do not fit and a query (rubric text) is given, the class and method chunks most relevant
+    to it are sent instead; only when nothing matches are files cut off in walk order.
     """
     code_parts = []
     total_chars = 0
 
+    if omitted_files:
+        note = "[Unchanged starter code omitted: " + ", ".join(omitted_files) + "]\n"
+        code_parts.append(note)
+        total_chars += len(note)
+
+    full_size = sum(len(_file_header(file)) + len(file["content"]) + 2 for file in source_files)
+    if query and settings.CODE_RETRIEVAL and total_chars + full_size > max_chars:
+        index = index or retrieval.CodeIndex(source_files)
+        excerpts = index.context(query, max_chars - total_chars)
+        if excerpts:
+            code_parts.append(excerpts)
+            return "\n".join(code_parts)
+
     for file in source_files:
-        file_header = f"\n{'='*60}\nFILE: {file['path']}\n{'='*60}\n"
+        file_header = _file_header(file)
         file_content = file['content']
 
         # Check if adding this file would exceed limit
@@ -310,9 +939,14 @@ def _prepare_code_for_gemini(source_files: list, max_chars: int = 20000) -> str:
     return "\n".join(code_parts)
 
 
-def _parse_gemini_deductions(gemini_response: str) -> tuple[list[str], int]:
+def _file_header(file: dict) -> str:
+    label = f"{file['path']} (diff against starter code)" if file.get("diff") else file['path']
+    return f"\n{'='*60}\nFILE: {label}\n{'='*60}\n"
+
+
+def _parse_gemini_deductions(gemini_response: str) -> tuple[list[dict], int]:
     """
-    Parse Gemini's response to extract deductions and calculate total.
+    Parse Gemini's response to extract deduction records and calculate total.
     Looks for patterns like "[-5 points]" or "-5 points:"
     """
     deductions = []
@@ -326,38 +960,216 @@ def _parse_gemini_deductions(gemini_response: str) -> tuple[list[str], int]:
         points = int(match.group(1))
         description = match.group(2).strip()
         total_deduction += points
-        deductions.append(f"[-{points} points] {description}")
+        deductions.append({"source": "llm", "points": points, "message": description, "file": None, "line": None})
 
     return deductions, total_deduction
 
 
-async def get_all_grades(db: Session):
-    results = db.query(models.GradingResult).options(joinedload(models.GradingResult.assignment)).all()
-    response = []
+async def reapply_regex(assignment_name: str, db: Session) -> dict:
+    """
+    Re-run the assignment's current regex checks over every stored source snapshot.
+    Only regex-derived deductions are recomputed; stored Gemini deductions and feedback are reused,
+    so no repository is re-cloned and no LLM call is made. Results graded without Gemini because regex
+    deductions reached 100 are left alone when they no longer do, and listed as needing a re-grade.
+    """
+    assignment = db.query(models.Assignment).filter(models.Assignment.name == assignment_name).first()
+    if not assignment or not assignment.criteria:
+        raise HTTPException(status_code=404, detail=f"Grading criteria for '{assignment_name}' not found.")
+
+    results = db.query(models.GradingResult).filter(
+        models.GradingResult.assignment_id == assignment.id,
+        models.GradingResult.is_latest.is_(True),  # Earlier attempts stay as they were graded
+    ).options(
+        selectinload(models.GradingResult.snapshot_files), selectinload(models.GradingResult.deductions)
+    ).all()
+
+    snapshotted = [r for r in results if r.snapshot_files]
+    skipped = [r.student_id for r in results if not r.snapshot_files]
+
+    # Identical files (shared starter code, resubmissions) are stored once and scanned once
+    blobs = snapshots.load_blobs(db, [f.blob_hash for r in snapshotted for f in r.snapshot_files])
+    criteria = assignment.criteria
+    regex_checks = [
+        c for c in criteria.regex_checks or [] if c.get("pattern") not in (criteria.disabled_checks or [])
+    ]
+    compiled_checks = regex_service.compile_checks(regex_checks)
+
+    blob_hits, timed_out, blob_errors = await asyncio.to_thread(
+        regex_sandbox.get_sandbox().run,
+        regex_checks,
+        [(blob_hash, "zlib", data) for blob_hash, data in blobs.items()],
+        settings.REGEX_CHECK_TIMEOUT_SECONDS,
+    )
+    timed_out_checks = [compiled_checks[i][0].pattern.decode("utf-8") for i in timed_out]
+    if timed_out_checks:
+        criteria.disabled_checks = (criteria.disabled_checks or []) + timed_out_checks
+
+    # A result with a file that could not be scanned keeps its grade rather than losing its regex deductions
+    scan_errors = [
+        {"student_id": r.student_id, "path": f.path, "error": blob_errors[f.blob_hash]}
+        for r in snapshotted for f in r.snapshot_files if f.blob_hash in blob_errors
+    ]
+    unscannable = {error["student_id"] for error in scan_errors}
+    scanned = {
+        r.id: regex_service.deduction_records(
+            [(f.path, blob_hits.get(f.blob_hash, [])) for f in r.snapshot_files], compiled_checks
+        )
+        for r in snapshotted
+        if r.student_id not in unscannable
+    }
+
+    affected = []
+    needs_regrade = []
     for result in results:
-        response.append(
-            GradingResultSchema(
-                assignment_name=result.assignment.name,
-                student_id=result.student_id,
-                grade=result.grade,
-                feedback=result.feedback,
-            )
+        if result.id not in scanned:
+            continue
+        regex_records = scanned[result.id]
+        regex_total = sum(r["points"] for r in regex_records)
+        if regex_total < 100 and _llm_was_skipped(result):
+            needs_regrade.append(result.student_id)
+            continue
+        llm_records = [_deduction_record(d) for d in result.deductions if d.source == "llm"]
+        if not result.deductions and result.llm_deductions:
+            # Graded before deductions were stored as rows
+            llm_records, _ = _parse_gemini_deductions("\n".join(result.llm_deductions))
+        records = regex_records + llm_records
+        new_grade = max(0, 100 - (regex_total + (result.llm_deduction_total or 0)))
+        new_feedback = _format_feedback(
+            new_grade, [regex_service.format_deduction(r) for r in records], result.llm_feedback, result.skipped_files
         )
-    return response
+        if records != [_deduction_record(d) for d in result.deductions]:
+            result.deductions = [models.Deduction(**record) for record in records]
+        if new_feedback != result.feedback:
+            affected.append({"student_id": result.student_id, "old_grade": result.grade, "new_grade": new_grade})
+            result.grade = new_grade
+            result.feedback = new_feedback
+
+    db.commit()
+    return {
+        "message": f"Regex checks re-applied for {assignment_name}.",
+        "scanned": len(scanned),
+        "skipped": skipped,
+        "affected": affected,
+        "needs_regrade": needs_regrade,
+        "scan_errors": scan_errors,
+        "disabled_checks": timed_out_checks,
+    }
+
+
+def _llm_was_skipped(result: models.GradingResult) -> bool:
+    """Whether Gemini never evaluated the result because regex deductions already reached 100."""
+    return any(tier.get("outcome") == "skipped_llm" for tier in result.llm_tiers or [])
+
+
+async def get_similar_submissions(assignment_name: str, threshold: float, db: Session) -> dict:
+    """List candidate pairs of similar submissions from the assignment's LSH index."""
+    assignment = db.query(models.Assignment).filter(models.Assignment.name == assignment_name).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail=f"Assignment '{assignment_name}' not found.")
+    return {
+        "assignment_name": assignment_name,
+        "threshold": threshold,
+        "pairs": similarity.similar_pairs(db, assignment.id, threshold),
+    }
+
+
+def _grades_query(db: Session, student_name: str | None = None, history: bool = False, assignment_name: str | None = None):
+    query = db.query(models.GradingResult)
+    if student_name is not None:
+        query = query.filter(models.GradingResult.student_id == student_name)
+    if assignment_name is not None:
+        query = query.join(models.Assignment).filter(models.Assignment.name == assignment_name)
+    if not history:
+        query = query.filter(models.GradingResult.is_latest.is_(True))
+    return query
+
+
+def grades_etag(db: Session, student_name: str | None = None, history: bool = False, assignment_name: str | None = None) -> str:
+    """
+    Weak ETag for a grades listing, from one aggregate query: the newest result id, the row count
+    (deletions) and the newest update (re-applied regex checks change existing rows). It is weak because
+    the same listing is sent gzip-compressed or not.
+    """
+    newest_id, count, updated_at = _grades_query(db, student_name, history, assignment_name).with_entities(
+        func.max(models.GradingResult.id), func.count(models.GradingResult.id), func.max(models.GradingResult.updated_at)
+    ).one()
+    scope = f"{student_name or '*'}:{assignment_name or '*'}:{'history' if history else 'latest'}"
+    version = f"{scope}:{newest_id or 0}:{count}:{updated_at.isoformat() if updated_at else ''}"
+    return 'W/"' + hashlib.sha256(version.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _grade_rows(db: Session, student_name: str | None = None, history: bool = False, assignment_name: str | None = None) -> list:
+    results = _grades_query(db, student_name, history, assignment_name).options(
+        load_only(
+            models.GradingResult.id,
+            models.GradingResult.student_id,
+            models.GradingResult.grade,
+            models.GradingResult.feedback,
+            models.GradingResult.created_at,
+            models.GradingResult.criteria_version,
+            models.GradingResult.is_latest,
+        ),
+        joinedload(models.GradingResult.assignment).load_only(models.Assignment.name),
+    ).order_by(models.GradingResult.id.desc() if history else models.GradingResult.id).all()
+    # Plain dicts in the GradingResult schema's shape, serialized by orjson without a validation pass
+    return [
+        {
+            "id": result.id,
+            "assignment_name": result.assignment.name,
+            "student_id": result.student_id,
+            "grade": float(result.grade) if result.grade is not None else None,
+            "feedback": result.feedback,
+            "created_at": result.created_at,
+            "criteria_version": result.criteria_version,
+            "is_latest": result.is_latest,
+        }
+        for result in results
+    ]
+
+
+async def get_assignment_stats(assignment_name: str, db: Session) -> dict:
+    """Grade distribution and most common deductions of an assignment, aggregated in SQL."""
+    assignment = db.query(models.Assignment).filter(models.Assignment.name == assignment_name).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail=f"Assignment '{assignment_name}' not found.")
+    return {"assignment_name": assignment_name, **stats.assignment_stats(db, assignment.id)}
+
+
+async def get_usage(assignment_name: str | None, since: datetime | None, db: Session) -> dict:
+    """Gemini tokens, latency and retries per assignment, criteria version and model, aggregated in SQL."""
+    assignment_id = None
+    if assignment_name is not None:
+        assignment = db.query(models.Assignment).filter(models.Assignment.name == assignment_name).first()
+        if not assignment:
+            raise HTTPException(status_code=404, detail=f"Assignment '{assignment_name}' not found.")
+        assignment_id = assignment.id
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)  # created_at is naive UTC
+    return {"assignment_name": assignment_name, "since": since, **usage.report(db, assignment_id, since)}
+
+
+async def get_all_grades(db: Session):
+    """Current (latest) grade of every student on every assignment."""
+    return _grade_rows(db)
 
 
 async def get_grades_by_student(student_name: str, db: Session):
-    results = db.query(models.GradingResult).filter(
-        models.GradingResult.student_id == student_name
-    ).options(joinedload(models.GradingResult.assignment)).all()
-    response = []
-    for result in results:
-        response.append(
-            GradingResultSchema(
-                assignment_name=result.assignment.name,
-                student_id=result.student_id,
-                grade=result.grade,
-                feedback=result.feedback,
-            )
-        )
-    return response
+    """Current (latest) grade of a student on each assignment."""
+    return _grade_rows(db, student_name)
+
+
+async def get_grade_history(student_name: str, assignment_name: str | None, db: Session):
+    """Every grading attempt of a student, newest first, optionally for one assignment."""
+    return _grade_rows(db, student_name, history=True, assignment_name=assignment_name)
+
+
+async def get_result_sources(result_id: int, db: Session):
+    """Return the exact source files a grading result was based on (for audits and appeals)."""
+    result = db.query(models.GradingResult).filter(models.GradingResult.id == result_id).first()
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Grading result {result_id} not found.")
+    return {
+        "id": result.id,
+        "student_id": result.student_id,
+        "files": snapshots.load_snapshot(db, result.id),
+    }
@@ -0,0 +1,177 @@
+"""
+Grading job queue backed by the grading_jobs table.
+
+Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of worker containers can poll
+the same table without handing a job to two of them. A claimed job holds a lease that the worker renews
+with heartbeats; if a worker dies, its lease expires and another worker reclaims the job until
+max_attempts is reached.
+
+Credentials never sit in the payload: they are encrypted with JOB_SECRET_KEY (Fernet) into the job's
+secrets column, decrypted by the worker for each attempt and dropped once the job finishes.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+from cryptography.fernet import Fernet, InvalidToken
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+_SECRET_FIELDS = ("token", "gemini_api_key")
+
+
+def utcnow() -> datetime:
+    """Naive UTC timestamp, comparable across Postgres and SQLite."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _fernet() -> Fernet:
+    if not settings.JOB_SECRET_KEY:
+        raise HTTPException(status_code=503, detail="The job queue is disabled: JOB_SECRET_KEY is not set")
+    return Fernet(settings.JOB_SECRET_KEY)
+
+
+def enqueue(db: Session, payload: dict, profile: bool = False) -> models.GradingJob:
+    secrets = {k: payload[k] for k in _SECRET_FIELDS if k in payload}
+    job = models.GradingJob(
+        status="queued",
+        payload={k: v for k, v in payload.items() if k not in _SECRET_FIELDS},
+        secrets=_fernet().encrypt(json.dumps(secrets).encode("utf-8")).decode("ascii"),
+        profile=profile,
+        attempts=0,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        created_at=utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim(db: Session, worker_id: str, lease_seconds: int | None = None) -> models.GradingJob | None:
+    """
+    Claim the oldest queued job, or a running job whose lease has expired.
+    Rows locked by other workers are skipped rather than waited on.
+    """
+    lease = timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+    while True:
+        now = utcnow()
+        job = db.query(models.GradingJob).filter(
+            or_(
+                models.GradingJob.status == "queued",
+                and_(models.GradingJob.status == "running", models.GradingJob.lease_expires_at < now),
+            )
+        ).order_by(models.GradingJob.id).with_for_update(skip_locked=True).first()
+
+        if job is None:
+            db.commit()
+            return None
+
+        if job.attempts >= job.max_attempts:
+            _finish(job, "failed", error=f"Lease expired after {job.attempts} attempts")
+            db.commit()
+            continue
+
+        job.status = "running"
+        job.attempts += 1
+        job.worker_id = worker_id
+        job.heartbeat_at = now
+        job.lease_expires_at = now + lease
+        db.commit()
+        return job
+
+
+def request_payload(job: models.GradingJob) -> dict:
+    """The job's payload with its credentials decrypted, for one attempt; raises HTTPException if they cannot be."""
+    payload = dict(job.payload or {})
+    if job.secrets is None:
+        return payload  # Queued before credentials were encrypted, or already finished
+    try:
+        payload.update(json.loads(_fernet().decrypt(job.secrets.encode("ascii"))))
+    except InvalidToken:
+        raise HTTPException(status_code=500, detail="Job credentials cannot be decrypted with JOB_SECRET_KEY") from None
+    return payload
+
+
+def heartbeat(db: Session, job_id: int, worker_id: str, lease_seconds: int | None = None) -> bool:
+    """Extend a job's lease. Returns False if the worker no longer owns the job."""
+    now = utcnow()
+    updated = db.query(models.GradingJob).filter(
+        models.GradingJob.id == job_id,
+        models.GradingJob.worker_id == worker_id,
+        models.GradingJob.status == "running",
+    ).update({
+        "heartbeat_at": now,
+        "lease_expires_at": now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS),
+    })
+    db.commit()
+    return updated == 1
+
+
+def cancel(db: Session, job: models.GradingJob) -> None:
+    """
+    Cancel a job. A queued job will not be claimed; a running job's heartbeat no longer renews its lease
+    and its worker cancels the grade.
+    """
+    if job.status != "cancelled":
+        _finish(job, "cancelled", error="Cancelled by request")
+    db.commit()
+
+
+def is_cancelled(db: Session, job_id: int) -> bool:
+    status = db.query(models.GradingJob.status).filter(models.GradingJob.id == job_id).scalar()
+    db.commit()
+    return status == "cancelled"
+
+
+def _still_running(db: Session, job: models.GradingJob) -> bool:
+    """Re-read the job under a row lock; a job cancelled meanwhile must not be completed or re-queued."""
+    db.refresh(job, with_for_update=True)
+    return job.status == "running"
+
+
+def complete(db: Session, job: models.GradingJob, result: dict) -> None:
+    if _still_running(db, job):
+        _finish(job, "completed", result=result)
+    db.commit()
+
+
+def fail(db: Session, job: models.GradingJob, error: str, retry: bool) -> None:
+    """Record a failed attempt; the job is re-queued while it has attempts left and the error is retryable."""
+    if not _still_running(db, job):
+        db.commit()
+        return
+    if retry and job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.worker_id = None
+        job.lease_expires_at = None
+        job.error = error
+    else:
+        _finish(job, "failed", error=error)
+    db.commit()
+
+
+def _finish(job: models.GradingJob, status: str, result: dict | None = None, error: str | None = None) -> None:
+    job.status = status
+    job.result = result
+    job.error = error
+    job.lease_expires_at = None
+    job.finished_at = utcnow()
+    # Credentials are only needed while the job can still run
+    job.secrets = None
+    job.payload = {k: v for k, v in (job.payload or {}).items() if k not in _SECRET_FIELDS}
+
+
+def job_status(job: models.GradingJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "assignment_name": (job.payload or {}).get("assignment_name"),
+        "repo_link": (job.payload or {}).get("repo_link"),
+        "result": job.result,
+        "error": job.error,
+        "profile": bool(job.profile),
+    }
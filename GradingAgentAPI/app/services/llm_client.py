@@ -0,0 +1,209 @@
+"""
+Gemini calling layer with adaptive per-key concurrency.
+
+Each TA's API key gets its own limiter that adjusts the number of concurrent calls with
+additive-increase/multiplicative-decrease: every successful call within the latency tolerance adds
+1/limit (about +1 per round of calls), while a 429 halves the limit and latency growing well past the
+observed baseline trims it. Batch jobs therefore run at the highest rate each key sustains.
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from app.core.config import settings
+from app.services import deadline
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit for one API key."""
+
+    def __init__(self, key_id: str, initial: float, minimum: float = 1.0, maximum: float = 32.0):
+        self.key_id = key_id
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self.latency_ewma = None
+        self.baseline_latency = None
+        self.successes = 0
+        self.rate_limited = 0
+        self._last_decrease = 0.0
+        self._waiters = []
+
+    async def acquire(self) -> None:
+        while self.inflight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.inflight += 1
+
+    def release(self) -> None:
+        self.inflight -= 1
+        free = int(self.limit) - self.inflight
+        for waiter in list(self._waiters[:max(free, 0)]):
+            self._waiters.remove(waiter)
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def on_success(self, latency: float) -> None:
+        self.successes += 1
+        self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += 0.01 * (latency - self.baseline_latency)  # Let the baseline drift up slowly
+
+        if self.latency_ewma > settings.LLM_LATENCY_TOLERANCE * self.baseline_latency:
+            self._decrease(0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self) -> None:
+        self.rate_limited += 1
+        self._decrease(0.5)
+
+    def _decrease(self, factor: float) -> None:
+        # One decrease per round trip, so a burst of 429s from the same window counts once
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency_ewma or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+    def stats(self) -> dict:
+        return {
+            "key_id": self.key_id,
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "waiting": len(self._waiters),
+            "latency_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "baseline_latency_ms": round(self.baseline_latency * 1000) if self.baseline_latency is not None else None,
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+        }
+
+
+_limiters: dict[str, AIMDLimiter] = {}
+_clients = {}
+# google-generativeai releases whose GenerativeModel keeps its service client in ._client (see _bind_client)
+_SUPPORTED_SDK_VERSIONS = ("0.8.",)
+_lock = threading.Lock()
+
+
+def key_id(api_key: str) -> str:
+    """Stable, non-secret identifier of an API key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def get_limiter(api_key: str) -> AIMDLimiter:
+    kid = key_id(api_key)
+    with _lock:
+        if kid not in _limiters:
+            _limiters[kid] = AIMDLimiter(
+                kid, settings.LLM_INITIAL_CONCURRENCY, maximum=settings.LLM_MAX_CONCURRENCY
+            )
+        return _limiters[kid]
+
+
+def capacity() -> list[dict]:
+    """Current estimated capacity of every key seen by this process."""
+    with _lock:
+        return [limiter.stats() for limiter in _limiters.values()]
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    try:
+        from google.api_core import exceptions as google_exceptions
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            return True
+    except ImportError:
+        pass
+    return "429" in str(error)
+
+
+def client_for_key(api_key: str):
+    """
+    A generative service client bound to this key, built with the public google.ai.generativelanguage
+    API. genai.configure() is process-global, so configuring per call would let concurrent requests
+    from different TAs use each other's keys.
+    """
+    import google.ai.generativelanguage as glm
+    from google.api_core import client_options, gapic_v1
+
+    kid = key_id(api_key)
+    with _lock:
+        if kid not in _clients:
+            _clients[kid] = glm.GenerativeServiceClient(
+                client_options=client_options.ClientOptions(api_key=api_key),
+                client_info=gapic_v1.client_info.ClientInfo(user_agent="grading-agent-api"),
+            )
+        return _clients[kid]
+
+
+def _bind_client(model, client) -> None:
+    """
+    Make a GenerativeModel call through a per-key client. The SDK has no public way to do this, so this
+    is the one place that sets its private ._client, and only on the SDK versions it was checked against
+    (google-generativeai is pinned in requirements.txt).
+    """
+    import google.generativeai as genai
+
+    version = getattr(genai, "__version__", "")
+    if not version.startswith(_SUPPORTED_SDK_VERSIONS) or not hasattr(model, "_client"):
+        raise RuntimeError(
+            f"google-generativeai {version or 'unknown'} is not supported for per-key clients; "
+            f"install a {'/'.join(v + 'x' for v in _SUPPORTED_SDK_VERSIONS)} release"
+        )
+    model._client = client
+
+
+def _model_for_key(api_key: str, model_name: str, **model_kwargs):
+    """Build a model bound to this key's own client."""
+    import google.generativeai as genai
+
+    model = genai.GenerativeModel(model_name, **model_kwargs)
+    _bind_client(model, client_for_key(api_key))
+    return model
+
+
+async def generate(api_key: str, model_name: str, prompt, model_kwargs: dict | None = None, **call_kwargs):
+    """
+    Call Gemini under the key's adaptive limit, retrying 429s with backoff.
+    Inside a grade's deadline scope, each HTTP request times out at the deadline, since the worker thread
+    making it cannot be cancelled.
+    Returns (response, {"latency": seconds of the successful call, "retries": number of retries}).
+    """
+    limiter = get_limiter(api_key)
+    model = _model_for_key(api_key, model_name, **(model_kwargs or {}))
+    retries = 0
+    while True:
+        await limiter.acquire()
+        # The slot is released however the attempt ends, including cancellation by a stage timeout,
+        # deadline or disconnect; a leaked slot would block every later call with this key
+        try:
+            left = deadline.remaining()
+            if left is not None:
+                if left <= 0:
+                    raise asyncio.TimeoutError("Grading deadline reached before the Gemini call")
+                call_kwargs["request_options"] = {**call_kwargs.get("request_options", {}), "timeout": left}
+            start = time.monotonic()
+            try:
+                response = await asyncio.to_thread(model.generate_content, prompt, **call_kwargs)
+            except Exception as e:
+                if not _is_rate_limited(e) or retries >= settings.LLM_MAX_RETRIES:
+                    raise
+                limiter.on_rate_limited()
+                retries += 1
+            else:
+                latency = time.monotonic() - start
+                limiter.on_success(latency)
+                return response, {"latency": latency, "retries": retries}
+        finally:
+            limiter.release()
+        await asyncio.sleep(settings.LLM_BACKOFF_SECONDS * (2 ** (retries - 1)) * (0.5 + random.random()))
@@ -0,0 +1,235 @@
+"""
+Opt-in profiling of individual grades.
+
+An admin can ask for one grade (POST /grade or POST /jobs with X-Debug-Profile) to be profiled. A sampling
+thread records the stack of every thread each PROFILE_SAMPLE_INTERVAL_SECONDS from sys._current_frames(),
+which costs nothing in the profiled code itself and so can run against production traffic, and tracemalloc
+records the peak traced memory and the lines holding the most memory at the end. Stacks are kept in the
+folded format ("outer;inner;leaf count") that flamegraph tools read, and render_svg() draws them as an
+SVG flamegraph.
+
+Samples cover the whole process: other grades running at the same time, and the event loop waiting on
+I/O, show up in the profile too. Each stack is rooted at its thread's name to tell them apart.
+"""
+
+import html
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+_SAMPLER_THREAD_NAME = "grade-profiler"
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+class Sampler(threading.Thread):
+    """Samples every other thread's stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, interval: float):
+        super().__init__(name=_SAMPLER_THREAD_NAME, daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                self.stacks[_fold(names.get(ident, f"thread-{ident}"), frame)] += 1
+            self.samples += 1
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        if marker in filename:
+            return filename.rsplit(marker, 1)[1]
+    try:
+        return os.path.relpath(filename)
+    except ValueError:
+        return filename
+
+
+def _fold(thread_name: str, frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ","))
+        frame = frame.f_back
+    names.append(thread_name.replace(";", ","))
+    return ";".join(reversed(names))
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+            _started_tracing = True
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing() -> dict:
+    """Peak memory and the lines holding the most memory, then stop tracing if no other profile needs it."""
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+    top = [
+        {
+            "location": f"{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:settings.PROFILE_TOP_ALLOCATIONS]
+    ]
+    return {"current_bytes": current, "peak_bytes": peak, "top_allocations": top}
+
+
+@asynccontextmanager
+async def profile(db: Session, label: str, job_id: int | None = None):
+    """
+    Profile the block and store the result, including when the block fails (a grade that times out is
+    the one worth looking at). Yields a dict whose "id" is set to the stored profile's id.
+    """
+    holder = {"id": None}
+    sampler = Sampler(settings.PROFILE_SAMPLE_INTERVAL_SECONDS)
+    _start_tracing()
+    sampler.start()
+    started = time.monotonic()
+    error = None
+    try:
+        yield holder
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        duration = time.monotonic() - started
+        sampler.stopped.set()
+        sampler.join()
+        memory = _stop_tracing()
+        if error is not None:
+            db.rollback()
+        record = models.Profile(
+            label=label,
+            job_id=job_id,
+            duration_ms=round(duration * 1000),
+            sample_interval_ms=settings.PROFILE_SAMPLE_INTERVAL_SECONDS * 1000,
+            samples=sampler.samples,
+            folded="\n".join(f"{stack} {count}" for stack, count in sampler.stacks.most_common()),
+            peak_memory_bytes=memory["peak_bytes"],
+            top_allocations=memory["top_allocations"],
+            error=error,
+        )
+        db.add(record)
+        db.commit()
+        holder["id"] = record.id
+
+
+async def profiled(db: Session, label: str, coro, job_id: int | None = None) -> dict:
+    """Await a grade under profile(); its result gains the profile's id as "profile_id"."""
+    async with profile(db, label, job_id) as record:
+        result = await coro
+    return {**result, "profile_id": record["id"]}
+
+
+def summary(record: models.Profile) -> dict:
+    return {
+        "id": record.id,
+        "label": record.label,
+        "job_id": record.job_id,
+        "created_at": record.created_at,
+        "duration_ms": record.duration_ms,
+        "sample_interval_ms": record.sample_interval_ms,
+        "samples": record.samples,
+        "peak_memory_bytes": record.peak_memory_bytes,
+        "top_allocations": record.top_allocations,
+        "error": record.error,
+        "hottest_stacks": (record.folded or "").splitlines()[:10],
+    }
+
+
+def _parse_folded(folded: str) -> dict:
+    """Folded stacks as a tree of {"name", "value", "children": {name: node}}."""
+    root = {"name": "all", "value": 0, "children": {}}
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack or not count.isdigit():
+            continue
+        node = root
+        node["value"] += int(count)
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"name": name, "value": 0, "children": {}})
+            node["value"] += int(count)
+    return root
+
+
+def render_svg(folded: str, title: str = "Grade profile", width: int = 1200, row_height: int = 16) -> str:
+    """A static SVG flamegraph (roots at the bottom, hover a frame for its sample count)."""
+    root = _parse_folded(folded)
+    rows = []  # (depth, x, width, node)
+
+    def layout(node, depth, x):
+        rows.append((depth, x, node["value"] / (root["value"] or 1) * width, node))
+        for child in sorted(node["children"].values(), key=lambda c: c["name"]):
+            layout(child, depth + 1, x)
+            x += child["value"] / (root["value"] or 1) * width
+
+    layout(root, 0, 0.0)
+    depth = max(d for d, _, _, _ in rows) + 1
+    height = depth * row_height + 30
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="14">{html.escape(title)}</text>',
+    ]
+    for level, x, w, node in rows:
+        if w < 0.5:
+            continue
+        y = height - (level + 1) * row_height
+        hue = 20 + zlib.crc32(node["name"].split(" (")[0].encode("utf-8")) % 40
+        label = f'{node["name"]}: {node["value"]} samples ({node["value"] / (root["value"] or 1):.1%})'
+        parts.append(
+            f'<g><title>{html.escape(label)}</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},90%,60%)"/>'
+        )
+        chars = int(w / 7)
+        if chars >= 3:
+            text = node["name"] if len(node["name"]) <= chars else node["name"][:chars - 2] + ".."
+            parts.append(f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{html.escape(text)}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def list_profiles(db: Session, job_id: int | None = None, limit: int = 50) -> list[dict]:
+    query = db.query(models.Profile)
+    if job_id is not None:
+        query = query.filter(models.Profile.job_id == job_id)
+    return [summary(record) for record in query.order_by(models.Profile.id.desc()).limit(limit)]
+
+
+def get_profile(db: Session, profile_id: int) -> models.Profile:
+    record = db.get(models.Profile, profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found.")
+    return record
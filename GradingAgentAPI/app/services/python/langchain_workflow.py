@@ -1,153 +0,0 @@
-"""
-LangChain Workflow
-
-Template for implementing LangChain-based workflows including:
-- LLM chains
-- Memory management
-- Tool integration
-- Prompt templates
-"""
-
-from typing import Dict, Any, List, Optional
-from .workflow_manager import BaseWorkflow
-import logging
-
-# LangChain imports (commented out until dependencies are added)
-# from langchain.llms import OpenAI
-# from langchain.chains import LLMChain
-# from langchain.prompts import PromptTemplate
-# from langchain.memory import ConversationBufferMemory
-# from langchain.tools import Tool
-# from langchain.agents import initialize_agent, AgentType
-
-
-class LangChainWorkflow(BaseWorkflow):
-    """LangChain-based workflow implementation"""
-    
-    def __init__(self, config: Dict[str, Any]):
-        super().__init__(config)
-        self.llm = None
-        self.memory = None
-        self.tools = []
-        self.chains = {}
-        self._initialize_components()
-    
-    def _initialize_components(self):
-        """Initialize LangChain components based on config"""
-        try:
-            # Initialize LLM
-            # self.llm = OpenAI(
-            #     temperature=self.config.get("temperature", 0.7),
-            #     api_key=self.config.get("openai_api_key")
-            # )
-            
-            # Initialize memory
-            # self.memory = ConversationBufferMemory(
-            #     memory_key="chat_history",
-            #     return_messages=True
-            # )
-            
-            # Initialize tools
-            self._setup_tools()
-            
-            # Initialize chains
-            self._setup_chains()
-            
-            self.logger.info("LangChain components initialized successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to initialize LangChain components: {e}")
-            raise
-    
-    def _setup_tools(self):
-        """Setup LangChain tools"""
-        # Example tool setup
-        # search_tool = Tool(
-        #     name="Search",
-        #     func=self._search_function,
-        #     description="Useful for searching information"
-        # )
-        # self.tools.append(search_tool)
-        pass
-    
-    def _setup_chains(self):
-        """Setup LangChain chains"""
-        # Example chain setup
-        # prompt_template = PromptTemplate(
-        #     input_variables=["question"],
-        #     template="Answer the following question: {question}"
-        # )
-        # 
-        # self.chains["qa"] = LLMChain(
-        #     llm=self.llm,
-        #     prompt=prompt_template,
-        #     memory=self.memory
-        # )
-        pass
-    
-    def _search_function(self, query: str) -> str:
-        """Example search function for tools"""
-        # Implement actual search logic
-        return f"Search results for: {query}"
-    
-    def validate_input(self, input_data: Dict[str, Any]) -> bool:
-        """Validate input data for LangChain workflow"""
-        required_fields = ["question", "context"]
-        
-        for field in required_fields:
-            if field not in input_data:
-                self.logger.error(f"Missing required field: {field}")
-                return False
-        
-        if not isinstance(input_data["question"], str):
-            self.logger.error("Question must be a string")
-            return False
-        
-        return True
-    
-    async def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute LangChain workflow"""
-        try:
-            question = input_data["question"]
-            context = input_data.get("context", "")
-            
-            # Example execution
-            # result = await self.chains["qa"].arun(
-            #     question=question,
-            #     context=context
-            # )
-            
-            # For now, return a placeholder response
-            result = f"LangChain processed: {question}"
-            
-            return {
-                "result": result,
-                "workflow_type": "langchain",
-                "status": "success"
-            }
-            
-        except Exception as e:
-            self.logger.error(f"Error executing LangChain workflow: {e}")
-            return {
-                "error": str(e),
-                "workflow_type": "langchain", 
-                "status": "error"
-            }
-    
-    def add_tool(self, tool_name: str, tool_func, description: str):
-        """Add a custom tool to the workflow"""
-        # tool = Tool(
-        #     name=tool_name,
-        #     func=tool_func,
-        #     description=description
-        # )
-        # self.tools.append(tool)
-        self.logger.info(f"Added tool: {tool_name}")
-    
-    def get_memory_contents(self) -> Dict[str, Any]:
-        """Get current memory contents"""
-        if self.memory:
-            return {
-                "chat_history": self.memory.chat_memory.messages
-            }
-        return {"chat_history": []} 
\ No newline at end of file
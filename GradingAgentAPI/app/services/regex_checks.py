@@ -0,0 +1,83 @@
+"""
+Regex checks for automatic deductions.
+
+Patterns are compiled once as bytes patterns in MULTILINE mode and run over whole file buffers, so files
+on disk can be memory-mapped instead of decoded and split into lines. Line numbers are only computed for
+the matches, from the newline count before each match offset. The checks run in the worker processes of
+regex_sandbox, which call scan_buffer.
+"""
+
+import re
+
+# Newlines are counted in slices of this size so line numbering never copies a whole file
+_COUNT_CHUNK = 64 * 1024
+
+
+def compile_checks(regex_checks: list) -> list[tuple]:
+    """
+    Compile a criteria's regex checks once.
+    Returns a list of (compiled_bytes_pattern, deduction, message), skipping incomplete or invalid checks.
+    """
+    compiled = []
+    for check in regex_checks:
+        pattern = check.get("pattern")
+        deduction = check.get("deduction")
+        message = check.get("message")
+
+        if not all([pattern, deduction, message]):
+            continue
+
+        try:
+            compiled.append((re.compile(pattern.encode("utf-8"), re.MULTILINE), deduction, message))
+        except re.error as e:
+            print(f"Invalid regex pattern '{pattern}': {e}")
+    return compiled
+
+
+def _line_numbers(buffer, offsets: list[int]) -> dict[int, int]:
+    """Map byte offsets to 1-based line numbers with a single forward pass over the buffer."""
+    lines = {}
+    line = 1
+    position = 0
+    for offset in sorted(set(offsets)):
+        while position < offset:
+            end = min(offset, position + _COUNT_CHUNK)
+            line += buffer[position:end].count(b"\n")
+            position = end
+        lines[offset] = line
+    return lines
+
+
+def scan_buffer(buffer, compiled_checks: list) -> list[tuple[int, int]]:
+    """
+    Find the first match of each check in one file's bytes (bytes or mmap).
+    Returns (check_index, line_number) pairs in check order.
+    """
+    matches = []
+    for index, (pattern, _, _) in enumerate(compiled_checks):
+        match = pattern.search(buffer)
+        if match:
+            matches.append((index, match.start()))  # Only deduct once per file per pattern
+
+    if not matches:
+        return []
+    lines = _line_numbers(buffer, [offset for _, offset in matches])
+    return [(index, lines[offset]) for index, offset in matches]
+
+
+def format_deduction(record: dict) -> str:
+    """Render a deduction record as the line shown in feedback."""
+    line = f"[-{record['points']} points] {record['message']}"
+    if record.get("file"):
+        line += f" (in {record['file']}:{record['line']})"
+    return line
+
+
+def deduction_records(file_hits: list, compiled_checks: list) -> list[dict]:
+    """Turn per-file (path, hits) pairs into structured deduction records."""
+    records = []
+    for file_path, hits in file_hits:
+        for index, line in hits:
+            _, deduction, message = compiled_checks[index]
+            records.append({"source": "regex", "points": deduction, "message": message, "file": file_path, "line": line})
+    return records
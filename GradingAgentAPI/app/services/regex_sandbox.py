@@ -0,0 +1,455 @@
+"""
+Isolated execution of TA-authored regex checks.
+
+Python's backtracking `re` engine cannot be interrupted from another thread, so checks run in a pool of
+worker processes. Each check gets a time budget per file; a worker that exceeds it is killed and
+replaced, and the check is reported as timed out so it can be disabled for that criteria version.
+A static check rejects the best-known catastrophic constructs when criteria are uploaded.
+"""
+
+import logging
+import mmap
+import multiprocessing
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.services import regex_checks
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+# Workers are started from threads (warm-up, asyncio.to_thread), and a forked child of a multithreaded
+# process can inherit a lock some other thread was holding; forkserver (spawn where it is unavailable)
+# starts them from a clean single-threaded process
+_ctx = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def find_catastrophic_construct(pattern: str) -> str | None:
+    """
+    Statically detect constructs that cause exponential backtracking.
+    Returns a description of the problem, or None if none was found.
+    Flags nested unbounded quantifiers such as (a+)+ and ambiguous alternation under a quantifier
+    such as (a|a)* or (a|ab)*. A quantifier nested in an unbounded one is fine when every iteration of the
+    outer one must match a literal the inner one cannot, as the "." in (?:\\w+\\.)* or the "," in
+    (?:\\s*,\\s*\\w+)*, since the iterations can then only split the text one way.
+    """
+    parsed = sre_parse.parse(pattern)
+    ignore_case = bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+    return _walk(parsed, inside_unbounded=False, ignore_case=ignore_case)
+
+
+def _is_unbounded(av) -> bool:
+    return av[1] == sre_constants.MAXREPEAT
+
+
+def _first_token(subpattern):
+    for op, av in subpattern:
+        if op == sre_constants.SUBPATTERN:
+            return _first_token(av[3])
+        return (op, repr(av))
+    return None
+
+
+def _children(op, av):
+    if op in _REPEATS or op == sre_constants.POSSESSIVE_REPEAT:
+        return [av[2]]
+    if op == sre_constants.SUBPATTERN:
+        return [av[3]]
+    if op == sre_constants.BRANCH:
+        return av[1]
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if op == sre_constants.ATOMIC_GROUP:
+        return [av]
+    if op == sre_constants.GROUPREF_EXISTS:
+        return [p for p in av[1:] if p is not None]
+    return []
+
+
+# Characters considered when comparing what two tokens can match (ASCII covers Java source well enough)
+_ALPHABET = frozenset(range(128))
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: frozenset(c for c in _ALPHABET if chr(c).isdigit()),
+    sre_constants.CATEGORY_SPACE: frozenset(c for c in _ALPHABET if chr(c).isspace()),
+    sre_constants.CATEGORY_WORD: frozenset(c for c in _ALPHABET if chr(c).isalnum() or c == ord("_")),
+}
+_CATEGORIES[sre_constants.CATEGORY_NOT_DIGIT] = _ALPHABET - _CATEGORIES[sre_constants.CATEGORY_DIGIT]
+_CATEGORIES[sre_constants.CATEGORY_NOT_SPACE] = _ALPHABET - _CATEGORIES[sre_constants.CATEGORY_SPACE]
+_CATEGORIES[sre_constants.CATEGORY_NOT_WORD] = _ALPHABET - _CATEGORIES[sre_constants.CATEGORY_WORD]
+
+
+def _token_chars(op, av, ignore_case: bool) -> frozenset | None:
+    """Characters a single-character token can match, or None if op is not a single-character token."""
+    if op == sre_constants.LITERAL:
+        chars = frozenset([av])
+    elif op == sre_constants.NOT_LITERAL:
+        chars = _ALPHABET - {av}
+    elif op == sre_constants.ANY:
+        chars = _ALPHABET
+    elif op == sre_constants.IN:
+        chars, negate = set(), False
+        for item_op, item_av in av:
+            if item_op == sre_constants.NEGATE:
+                negate = True
+            elif item_op == sre_constants.LITERAL:
+                chars.add(item_av)
+            elif item_op == sre_constants.RANGE:
+                chars.update(range(item_av[0], min(item_av[1], 127) + 1))
+            elif item_op == sre_constants.CATEGORY:
+                chars.update(_CATEGORIES.get(item_av, _ALPHABET))
+            else:
+                chars.update(_ALPHABET)
+        chars = frozenset(_ALPHABET - chars if negate else chars)
+    else:
+        return None
+    if ignore_case:
+        chars = chars | {ord(chr(c).swapcase()) for c in chars if chr(c).swapcase().isascii()}
+    return frozenset(chars)
+
+
+def _all_chars(subpattern, ignore_case: bool) -> frozenset:
+    """Every character any token in the subpattern can match (everything, for tokens not understood)."""
+    chars = set()
+    for op, av in subpattern:
+        token = _token_chars(op, av, ignore_case)
+        if token is not None:
+            chars |= token
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue  # Zero-width
+        elif _children(op, av):
+            for child in _children(op, av):
+                chars |= _all_chars(child, ignore_case)
+        else:
+            return _ALPHABET
+    return frozenset(chars)
+
+
+def _variable_repeat_chars(subpattern, ignore_case: bool) -> frozenset:
+    """Characters matched inside variable-length quantifiers anywhere in the subpattern."""
+    chars = set()
+    for op, av in subpattern:
+        if op in _REPEATS and av[0] != av[1]:
+            chars |= _all_chars(av[2], ignore_case)
+        else:
+            for child in _children(op, av):
+                chars |= _variable_repeat_chars(child, ignore_case)
+    return frozenset(chars)
+
+
+def _mandatory_tokens(subpattern, ignore_case: bool):
+    """Single-character tokens every match of the subpattern must pass through."""
+    for op, av in subpattern:
+        token = _token_chars(op, av, ignore_case)
+        if token is not None:
+            yield token
+        elif op == sre_constants.SUBPATTERN:
+            yield from _mandatory_tokens(av[3], ignore_case)
+        elif op in _REPEATS and av[0] >= 1:
+            yield from _mandatory_tokens(av[2], ignore_case)
+
+
+def _separated(body, ignore_case: bool) -> bool:
+    """Whether each iteration of an unbounded quantifier over body must match a literal its inner quantifiers cannot."""
+    inner = _variable_repeat_chars(body, ignore_case)
+    if not inner:
+        return False
+    return any(not (token & inner) for token in _mandatory_tokens(body, ignore_case))
+
+
+def _walk(subpattern, inside_unbounded: bool, ignore_case: bool = False) -> str | None:
+    for op, av in subpattern:
+        if op in _REPEATS:
+            variable = av[0] != av[1]
+            if inside_unbounded and variable:
+                return "nested quantifiers (e.g. (a+)+) can backtrack exponentially"
+            if _is_unbounded(av) and _separated(av[2], ignore_case):
+                problem = _walk(av[2], False, ignore_case)
+            else:
+                problem = _walk(av[2], inside_unbounded or _is_unbounded(av), ignore_case)
+        elif op == sre_constants.POSSESSIVE_REPEAT or op == sre_constants.ATOMIC_GROUP:
+            problem = None  # Possessive and atomic constructs never backtrack into themselves
+        elif op == sre_constants.BRANCH and inside_unbounded:
+            firsts = [_first_token(alternative) for alternative in av[1]]
+            if None in firsts or len(set(firsts)) != len(firsts):
+                return "overlapping alternatives under a quantifier (e.g. (a|ab)*) can backtrack exponentially"
+            problem = None
+            for alternative in av[1]:
+                problem = problem or _walk(alternative, inside_unbounded, ignore_case)
+        else:
+            problem = None
+            for child in _children(op, av):
+                problem = problem or _walk(child, inside_unbounded, ignore_case)
+        if problem:
+            return problem
+    return None
+
+
+def find_line_semantics_changes(pattern: str) -> list[str]:
+    """
+    Describe how a pattern may match differently now that checks run as bytes over whole files instead of
+    as text over one line at a time. Returns an empty list when it matches the same lines as before.
+    \\w, \\d and \\b are also ASCII-only as bytes, which only matters for non-ASCII source and is not flagged.
+    """
+    parsed = sre_parse.parse(pattern)
+    dotall = bool(parsed.state.flags & sre_constants.SRE_FLAG_DOTALL)
+    non_ascii, newline = _semantics_walk(parsed, dotall)
+    changes = []
+    if non_ascii:
+        changes.append("non-ASCII characters are matched as UTF-8 bytes, so a class or quantifier over them sees single bytes")
+    if newline:
+        changes.append("it can match a line break (through \\s, \\W, \\D, [^...], \\n or DOTALL), so a match may now span lines")
+    return changes
+
+
+# Categories whose characters include the newline
+_NEWLINE_CATEGORIES = (sre_constants.CATEGORY_SPACE, sre_constants.CATEGORY_NOT_WORD, sre_constants.CATEGORY_NOT_DIGIT)
+
+
+def _semantics_walk(subpattern, dotall: bool) -> tuple[bool, bool]:
+    """Whether the subpattern contains non-ASCII characters, and whether it can match a newline."""
+    non_ascii = newline = False
+    for op, av in subpattern:
+        if op == sre_constants.LITERAL:
+            non_ascii |= av > 127
+            newline |= av == ord("\n")
+        elif op == sre_constants.NOT_LITERAL:
+            non_ascii |= av > 127
+            newline |= av != ord("\n")
+        elif op == sre_constants.ANY:
+            newline |= dotall
+        elif op == sre_constants.IN:
+            negate = has_newline = False
+            for item_op, item_av in av:
+                if item_op == sre_constants.NEGATE:
+                    negate = True
+                elif item_op == sre_constants.LITERAL:
+                    non_ascii |= item_av > 127
+                    has_newline |= item_av == ord("\n")
+                elif item_op == sre_constants.RANGE:
+                    non_ascii |= item_av[1] > 127
+                    has_newline |= item_av[0] <= ord("\n") <= item_av[1]
+                elif item_op == sre_constants.CATEGORY:
+                    has_newline |= item_av in _NEWLINE_CATEGORIES
+            newline |= has_newline != negate
+        elif op == sre_constants.SUBPATTERN:
+            add_flags, del_flags = av[1], av[2]
+            inner = (dotall or bool(add_flags & sre_constants.SRE_FLAG_DOTALL)) and not del_flags & sre_constants.SRE_FLAG_DOTALL
+            child_non_ascii, child_newline = _semantics_walk(av[3], inner)
+            non_ascii, newline = non_ascii or child_non_ascii, newline or child_newline
+        else:
+            for child in _children(op, av):
+                child_non_ascii, child_newline = _semantics_walk(child, dotall)
+                non_ascii, newline = non_ascii or child_non_ascii, newline or child_newline
+    return non_ascii, newline
+
+
+def _load(kind: str, payload):
+    """The bytes to scan, and the open file behind them (None unless memory-mapped)."""
+    if kind == "path":
+        handle = open(payload, "rb")
+        try:
+            return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ), handle
+        except ValueError:
+            handle.close()
+            return b"", None  # Empty files cannot be mapped
+    if kind == "zlib":
+        return zlib.decompress(payload), None
+    return payload, None
+
+
+def _worker_main(conn):
+    """
+    Worker process loop: load one file at a time and report each check's first match line. A file that
+    cannot be read or a check that raises is answered with an error reply, (index, None, message), so
+    the parent does not mistake it for a timeout.
+    """
+    compiled = []
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == "checks":
+            compiled = regex_checks.compile_checks(message[1])
+            continue
+
+        _, kind, payload, indices = message
+        try:
+            buffer, handle = _load(kind, payload)
+        except Exception as e:
+            for index in indices:
+                conn.send((index, None, f"{type(e).__name__}: {e}"))
+            continue
+
+        try:
+            for index in indices:
+                try:
+                    hits = regex_checks.scan_buffer(buffer, [compiled[index]])  # One check per reply
+                except Exception as e:
+                    conn.send((index, None, f"{type(e).__name__}: {e}"))
+                    continue
+                conn.send((index, hits[0][1] if hits else None))
+        finally:
+            if handle:
+                buffer.close()
+                handle.close()
+
+
+class _SandboxWorker:
+    """One worker process and the pipe used to drive it."""
+
+    def __init__(self):
+        self._start()
+
+    def _start(self):
+        self.conn, child_conn = _ctx.Pipe()
+        self.process = _ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.checks = None
+
+    def restart(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self._start()
+
+    def scan(self, checks: list, kind: str, payload, indices: list, budget: float, disabled: set) -> tuple[list, list, list]:
+        """
+        Scan one file with the given check indices.
+        Returns (hits, timed_out, errors) where hits are (index, line) pairs in check order and errors are
+        (index, message) pairs for checks that could not run on this file.
+        """
+        hits = []
+        timed_out = []
+        errors = []
+        pending = [i for i in indices if i not in disabled]
+        while pending:
+            if self.checks != checks:
+                self.conn.send(("checks", checks))
+                self.checks = checks
+            self.conn.send(("scan", kind, payload, pending))
+
+            for position, index in enumerate(pending):
+                try:
+                    ready = self.conn.poll(budget)
+                    reply = self.conn.recv() if ready else None
+                except (EOFError, OSError):
+                    reply = None
+                if reply is None:
+                    timed_out.append(index)
+                    self.restart()
+                    pending = [i for i in pending[position + 1:] if i not in disabled]
+                    break
+                if len(reply) == 3:
+                    errors.append((index, reply[2]))
+                elif reply[1] is not None:
+                    hits.append(reply)
+            else:
+                pending = []
+        return hits, timed_out, errors
+
+
+class RegexSandbox:
+    """Pool of regex worker processes shared by all requests in this process."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> _SandboxWorker:
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                return _SandboxWorker()
+        return self._idle.get()
+
+    def prestart(self, count: int = 1) -> None:
+        """Start idle workers ahead of the first scan, so it does not pay for process start-up."""
+        for _ in range(count):
+            with self._lock:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            self._idle.put(_SandboxWorker())
+
+    def run(self, checks: list, items: list, budget: float) -> tuple[dict, list, dict]:
+        """
+        Run checks over items of (key, kind, payload) where kind is "path" (memory-mapped), "bytes" or
+        "zlib" (a compressed snapshot blob). A check that times out is skipped for the remaining items.
+        An item that cannot be read (a missing file, a corrupt blob) is reported in errors and does not
+        disable any check.
+        Returns ({key: [(check_index, line), ...]}, sorted timed-out check indices, {key: error message}).
+        """
+        indices = list(range(len(regex_checks.compile_checks(checks))))
+        disabled = set()
+        results = {}
+        errors = {}
+
+        def scan(item):
+            key, kind, payload = item
+            worker = self._acquire()
+            try:
+                hits, timed_out, failed = worker.scan(checks, kind, payload, indices, budget, disabled)
+            finally:
+                self._idle.put(worker)
+            disabled.update(timed_out)
+            results[key] = hits
+            if failed:
+                errors[key] = failed[0][1]
+
+        if indices and items:
+            with ThreadPoolExecutor(max_workers=min(self.size, len(items))) as threads:
+                list(threads.map(scan, items))
+
+        # A check that timed out anywhere is dropped everywhere, so every submission is graded alike
+        results = {key: [hit for hit in hits if hit[0] not in disabled] for key, hits in results.items()}
+        return results, sorted(disabled), errors
+
+
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_sandbox() -> RegexSandbox:
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is None:
+            _sandbox = RegexSandbox(settings.REGEX_WORKERS)
+    return _sandbox
+
+
+def apply_regex_checks(source_files: list, checks: list) -> tuple[list[dict], int, list[str], list[dict]]:
+    """
+    Run a criteria's regex checks over collected source files in the sandbox. Files collected from disk
+    ("abs_path") are memory-mapped by the worker; others are scanned from their content. Deducts at most
+    once per file per check, at the line of the first match.
+    Returns (deduction records, total_deduction, patterns that exceeded REGEX_CHECK_TIMEOUT_SECONDS,
+    {"path", "reason"} of every file the checks could not scan, whose deductions are therefore missing).
+    """
+    compiled = regex_checks.compile_checks(checks)
+    items = [
+        (i, "path", f["abs_path"]) if f.get("abs_path") else (i, "bytes", f.get("data") or f["content"].encode("utf-8"))
+        for i, f in enumerate(source_files)
+    ]
+    results, timed_out, errors = get_sandbox().run(checks, items, settings.REGEX_CHECK_TIMEOUT_SECONDS)
+    unscanned = []
+    for i, error in sorted(errors.items()):
+        logger.warning("Regex checks could not scan %s: %s", source_files[i]["path"], error)
+        unscanned.append({"path": source_files[i]["path"], "reason": f"regex checks not applied: {error}"})
+    file_hits = [(f["path"], results.get(i, [])) for i, f in enumerate(source_files)]
+    records = regex_checks.deduction_records(file_hits, compiled)
+    timed_out_patterns = [compiled[i][0].pattern.decode("utf-8") for i in timed_out]
+    return records, sum(r["points"] for r in records), timed_out_patterns, unscanned
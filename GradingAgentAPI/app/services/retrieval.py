@@ -0,0 +1,267 @@
+"""
+Retrieval of the code most relevant to a rubric.
+
+When a submission does not fit the prompt budget, sending files in walk order until the budget runs out
+leaves out whatever happens to come last. Instead, Java sources are split into chunks (one per method,
+plus one per class holding its declaration and fields; other files are split into line windows), the
+chunks are indexed with BM25, and the best matches for the rubric's (or a rubric section's) wording are
+sent. Everything is in memory and built once per submission; no embedding service is involved.
+"""
+
+import math
+import re
+from collections import Counter
+
+WINDOW_LINES = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_LEXER = re.compile(
+    r'(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<string>"""(?:\\.|[^\\])*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')'
+    r'|(?P<open>\{)|(?P<close>\})|(?P<semi>;)',
+    re.DOTALL,
+)
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_TYPE_HEADER = re.compile(r'\b(?:class|interface|enum|record)\s+(?P<name>[A-Za-z_$][\w$]*)')
+_METHOD_HEADER = re.compile(
+    r'(?P<name>[A-Za-z_$][\w$]*)\s*\([^()]*(?:\([^()]*\)[^()]*)*\)\s*(?:throws\s+[\w$.,\s<>]+)?$'
+)
+_ANONYMOUS_CLASS = re.compile(r'\bnew\s+[\w$.<>\[\]]*\s*\(')
+_CONTROL_KEYWORDS = frozenset({"if", "for", "while", "switch", "catch", "synchronized", "try", "do", "else"})
+
+_WORD = re.compile(r'[A-Za-z]+|\d+')
+_SUBWORD = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+_STOPWORDS = frozenset("""
+    a an and are as at be by for from has have in is it its of on or that the their them this to was
+    were will with should must each any all not no can may using use used student students code points
+""".split())
+# Rubrics ask about comments and documentation, which the comment syntax itself does not spell out
+_MARKER_TOKENS = (
+    ("/**", ("javadoc", "documentation", "document", "comment")),
+    ("//", ("comment",)),
+    ("/*", ("comment",)),
+)
+
+
+def _stem(token: str) -> str:
+    """Fold plurals so "cases" matches "case" and "strategies" matches "strategy"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased words with camelCase and snake_case identifiers split into their parts."""
+    tokens = []
+    for word in _WORD.findall(text):
+        parts = _SUBWORD.findall(word)
+        if len(parts) > 1:
+            tokens.append(word.lower())
+        tokens.extend(part.lower() for part in parts)
+    return [_stem(t) for t in tokens if len(t) > 1 and t not in _STOPWORDS]
+
+
+def _document_tokens(text: str) -> list[str]:
+    tokens = tokenize(text)
+    for marker, extra in _MARKER_TOKENS:
+        if marker in text:
+            tokens.extend(extra)
+    return tokens
+
+
+def _line_number(source: str, offset: int) -> int:
+    return source.count("\n", 0, offset) + 1
+
+
+def _chunk(path: str, name: str, source: str, start: int, end: int, text: str | None = None) -> dict:
+    return {
+        "path": path,
+        "name": name,
+        "start_line": _line_number(source, start),
+        "end_line": _line_number(source, end),
+        "text": source[start:end] if text is None else text,
+    }
+
+
+def chunk_java(path: str, source: str) -> list[dict] | None:
+    """
+    Split a Java file into one chunk per method (with its Javadoc and annotations) and one per class,
+    interface, enum or record holding the type's declaration and fields with its methods cut out.
+    Returns None when the braces do not balance, so the caller can fall back to line windows.
+    """
+    blocks = []  # Closed type and method blocks: {"kind", "name", "start", "end", "parent"}
+    stack = []
+    boundary = 0  # End of the last ';', '{' or '}' outside comments and strings
+    for match in _LEXER.finditer(source):
+        kind = match.lastgroup
+        if kind in ("comment", "string"):
+            continue
+        if kind == "open":
+            gap = source[boundary:match.start()]
+            header = _COMMENT.sub(" ", gap).strip()
+            parent = stack[-1] if stack else None
+            in_type = parent is None or parent["kind"] == "type"
+            block = {"kind": "block", "name": None, "parent": parent}
+            type_match = _TYPE_HEADER.search(header)
+            method_match = _METHOD_HEADER.search(header)
+            if in_type and type_match and not _ANONYMOUS_CLASS.search(header):
+                block["kind"] = "type"
+                block["name"] = type_match.group("name") if parent is None else f"{parent['name']}.{type_match.group('name')}"
+            elif (
+                parent is not None and parent["kind"] == "type" and method_match
+                and method_match.group("name") not in _CONTROL_KEYWORDS and not _ANONYMOUS_CLASS.search(header)
+            ):
+                block["kind"] = "method"
+                block["name"] = f"{parent['name']}.{method_match.group('name')}"
+            # The block starts at its header, including any Javadoc, annotations and indentation
+            start = boundary + len(gap) - len(gap.lstrip())
+            line_start = source.rfind("\n", 0, start) + 1
+            block["start"] = line_start if not source[line_start:start].strip() else start
+            stack.append(block)
+        elif kind == "close":
+            if not stack:
+                return None
+            block = stack.pop()
+            block["end"] = match.end()
+            if block["kind"] in ("type", "method"):
+                blocks.append(block)
+        boundary = match.end()
+    if stack:
+        return None
+
+    chunks = []
+    for block in sorted(blocks, key=lambda b: b["start"]):
+        if block["kind"] == "method":
+            chunks.append(_chunk(path, block["name"], source, block["start"], block["end"]))
+            continue
+        # A type's own chunk is its text minus the methods and nested types, which have chunks of their own
+        members = sorted((b["start"], b["end"]) for b in blocks if b["parent"] is block)
+        pieces, position = [], block["start"]
+        for start, end in members:
+            pieces.append(source[position:start])
+            position = end
+        pieces.append(source[position:block["end"]])
+        text = re.sub(r"\n(?:[ \t]*\n)+", "\n", "".join(pieces))
+        chunks.append(_chunk(path, block["name"], source, block["start"], block["end"], text))
+    return chunks
+
+
+def chunk_lines(path: str, source: str, window: int = WINDOW_LINES) -> list[dict]:
+    """Split a file into windows of lines, for diffs, non-Java files and Java that does not parse."""
+    lines = source.splitlines(keepends=True)
+    chunks = []
+    for first in range(0, len(lines), window):
+        last = min(first + window, len(lines))
+        chunks.append({
+            "path": path,
+            "name": f"lines {first + 1}-{last}",
+            "start_line": first + 1,
+            "end_line": last,
+            "text": "".join(lines[first:last]),
+        })
+    return chunks
+
+
+def chunk_file(file: dict) -> list[dict]:
+    chunks = None
+    if file["path"].endswith(".java") and not file.get("diff"):
+        chunks = chunk_java(file["path"], file["content"])
+    if not chunks:
+        chunks = chunk_lines(file["path"], file["content"])
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over tokenized documents."""
+
+    def __init__(self, documents: list[list[str]], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        self.doc_freqs = Counter(term for freqs in self.term_freqs for term in freqs)
+
+    def idf(self, term: str) -> float:
+        n = len(self.term_freqs)
+        df = self.doc_freqs.get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: list[str]) -> list[float]:
+        terms = [(term, self.idf(term)) for term in set(query) if term in self.doc_freqs]
+        scores = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            scores.append(sum(
+                idf * freqs[term] * (self.k1 + 1) / (freqs[term] + norm)
+                for term, idf in terms if term in freqs
+            ))
+        return scores
+
+
+class CodeIndex:
+    """
+    Chunks and BM25 index of one submission, built on first use and shared by every query against it
+    (the whole rubric, then each rubric section).
+    """
+
+    def __init__(self, source_files: list):
+        self.source_files = source_files
+        self._chunks = None
+        self._bm25 = None
+
+    @property
+    def chunks(self) -> list[dict]:
+        if self._chunks is None:
+            self._chunks = [chunk for file in self.source_files for chunk in chunk_file(file)]
+            self._bm25 = BM25Index([_document_tokens(f"{c['path']} {c['name']}\n{c['text']}") for c in self._chunks])
+        return self._chunks
+
+    def select(self, query: str, max_chars: int) -> list[dict]:
+        """
+        The highest-scoring chunks for the query that fit in max_chars once rendered, in source order.
+        Chunks that share no term with the query are never selected.
+        """
+        chunks = self.chunks
+        scores = self._bm25.scores(tokenize(query))
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        chosen, paths, used = [], set(), 0
+        for i in ranked:
+            size = len(_excerpt_header(chunks[i])) + len(chunks[i]["text"]) + 2
+            if chunks[i]["path"] not in paths:
+                size += len(_file_header(chunks[i]["path"])) + 1
+            if used + size > max_chars:
+                continue
+            chosen.append(i)
+            paths.add(chunks[i]["path"])
+            used += size
+        return [chunks[i] for i in sorted(chosen)]
+
+    def context(self, query: str, max_chars: int) -> str | None:
+        """Render the chunks selected for the query as prompt context, or None when nothing matched."""
+        footer = "\n[... {} other code excerpts omitted as less relevant to this rubric ...]"
+        selected = self.select(query, max_chars - len(footer) - 8)
+        if not selected:
+            return None
+        parts, current_path = [], None
+        for chunk in selected:
+            if chunk["path"] != current_path:
+                current_path = chunk["path"]
+                parts.append(_file_header(current_path))
+            parts.append(_excerpt_header(chunk))
+            parts.append(chunk["text"])
+        omitted = len(self.chunks) - len(selected)
+        if omitted:
+            parts.append(footer.format(omitted))
+        return "\n".join(parts)
+
+
+def _excerpt_header(chunk: dict) -> str:
+    return f"// --- {chunk['name']} (lines {chunk['start_line']}-{chunk['end_line']}) ---"
+
+
+def _file_header(path: str) -> str:
+    return f"\n{'='*60}\nFILE: {path} (relevant excerpts)\n{'='*60}\n"
@@ -0,0 +1,107 @@
+"""
+Rubric sections.
+
+Most rubrics are a list of independent, point-weighted sections ("Edge Cases (20 points): ..."). Splitting
+them at upload time lets each section be evaluated by its own concurrent Gemini call, with the section's
+points as a cap on its deductions. Sections come from an explicit "rubric_sections" list in JSON criteria,
+or are recognized heuristically in the rubric text.
+"""
+
+import re
+from fastapi import HTTPException
+
+# "- Edge Cases (20 points): description", "2. Code Quality (15 pts) - description", "Style (5 points)"
+_SECTION_LINE = re.compile(
+    r"^\s*(?:[-*•]|\d+[.)])?\s*(?P<name>[A-Za-z][^()\n:]*?)\s*\(\s*(?P<points>\d+)\s*(?:points?|pts?)\s*\)\s*[:\-–]?\s*(?P<description>.*)$",
+    re.IGNORECASE,
+)
+# "Total: 100 points", "- Total (100 points)", "Grand total (100 pts)": a sum, never a section
+_TOTAL_LINE = re.compile(r"^\s*(?:[-*•]|\d+[.)])?\s*(?:grand\s+)?total\b", re.IGNORECASE)
+
+
+def parse_sections(rubric_text: str) -> tuple[list[dict], str]:
+    """
+    Find point-weighted section lines in a free-text rubric.
+    Returns (sections, context): sections as {"name", "points", "description"} (lines following a section
+    line are part of its description until a blank line), and the remaining text, which is shared context
+    for every section. Fewer than two sections are not worth splitting, so ([], rubric_text) is returned.
+    """
+    sections = []
+    context = []
+    current = None
+    for line in rubric_text.splitlines():
+        if _TOTAL_LINE.match(line):
+            current = None
+            continue
+        match = _SECTION_LINE.match(line)
+        if match:
+            current = {
+                "name": match.group("name").strip(),
+                "points": int(match.group("points")),
+                "description": match.group("description").strip(),
+            }
+            sections.append(current)
+        elif current is not None and line.strip():
+            current["description"] = (current["description"] + "\n" + line.strip()).strip()
+        else:
+            current = None
+            context.append(line)
+
+    if len(sections) < 2:
+        return [], rubric_text
+    return sections, re.sub(r"\n{3,}", "\n\n", "\n".join(context)).strip()
+
+
+def validate_sections(sections) -> list[dict]:
+    """Validate an explicit "rubric_sections" list from JSON criteria."""
+    if not isinstance(sections, list):
+        raise HTTPException(status_code=400, detail="rubric_sections must be a list")
+    validated = []
+    for section in sections:
+        if (
+            not isinstance(section, dict)
+            or not isinstance(section.get("name"), str)
+            or not section["name"].strip()
+            or not isinstance(section.get("points"), int)
+            or section["points"] <= 0
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="Each rubric section needs a non-empty 'name' and positive integer 'points'",
+            )
+        validated.append({
+            "name": section["name"].strip(),
+            "points": section["points"],
+            "description": str(section.get("description") or ""),
+        })
+    return validated
+
+
+def section_rubric(section: dict, context: str) -> str:
+    """The rubric text sent for one section."""
+    parts = []
+    if context:
+        parts.append(f"Assignment context:\n{context}\n")
+    parts.append(f"Evaluate ONLY this rubric section: {section['name']} ({section['points']} points)")
+    if section["description"]:
+        parts.append(section["description"])
+    parts.append(
+        f"Ignore every other aspect of the code. Total deductions for this section cannot exceed {section['points']} points."
+    )
+    return "\n".join(parts)
+
+
+def cap_deductions(records: list[dict], section: dict) -> list[dict]:
+    """Bound a section's deductions by its points, trimming the deduction that crosses the cap."""
+    remaining = section["points"]
+    capped = []
+    for record in records:
+        if remaining <= 0:
+            break
+        points = min(record["points"], remaining)
+        message = f"{section['name']}: {record['message']}"
+        if points < record["points"]:
+            message += f" (capped at the section's {section['points']} points)"
+        capped.append({**record, "points": points, "message": message})
+        remaining -= points
+    return capped
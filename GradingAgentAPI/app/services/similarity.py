@@ -0,0 +1,163 @@
+"""
+Near-duplicate detection for submissions.
+
+Each submission's Java sources are normalized into a token stream, split into k-gram shingles and
+summarized as a MinHash signature. Signatures are banded into a per-assignment LSH index stored in the
+database, so candidate pairs are found with an indexed join instead of comparing every pair.
+"""
+
+import hashlib
+import random
+import re
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+from app.db import models
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(247)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_TOKEN_RE = re.compile(
+    r'(?P<comment>//[^\n]*|/\*.*?\*/)'
+    r'|(?P<string>"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'
+    r'|(?P<number>\b\d[\w.]*)'
+    r'|(?P<word>[A-Za-z_$][\w$]*)'
+    r'|(?P<op>[^\s\w])',
+    re.DOTALL,
+)
+
+_JAVA_KEYWORDS = frozenset("""
+    abstract assert boolean break byte case catch char class const continue default do double else enum
+    extends final finally float for goto if implements import instanceof int interface long native new
+    package private protected public return short static strictfp super switch synchronized this throw
+    throws transient try void volatile while var record yield true false null
+""".split())
+
+
+def normalize_tokens(source: str) -> list[str]:
+    """
+    Tokenize Java source, dropping comments and replacing identifiers and literals with placeholders,
+    so renaming variables or rewording strings does not hide copied structure.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(source):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if kind == "string":
+            tokens.append("S")
+        elif kind == "number":
+            tokens.append("N")
+        elif kind == "word":
+            word = match.group()
+            tokens.append(word if word in _JAVA_KEYWORDS else "V")
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def shingle_hashes(source_files: list, k: int = SHINGLE_SIZE) -> set[int]:
+    """64-bit hashes of the k-token shingles of every file (shingles do not span files)."""
+    shingles = set()
+    for file in source_files:
+        tokens = normalize_tokens(file["content"])
+        for i in range(len(tokens) - k + 1):
+            digest = hashlib.blake2b(" ".join(tokens[i:i + k]).encode("utf-8"), digest_size=8).digest()
+            shingles.add(int.from_bytes(digest, "big"))
+    return shingles
+
+
+def minhash(shingles: set[int]) -> list[int]:
+    """MinHash signature of a shingle set under NUM_PERM universal hash permutations."""
+    return [min((a * x + b) % _MERSENNE_PRIME for x in shingles) for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    """Estimated Jaccard similarity of the two shingle sets."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def band_keys(signature: list[int]) -> list[str]:
+    """One bucket key per LSH band."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        keys.append(hashlib.blake2b(repr(rows).encode("ascii"), digest_size=8).hexdigest())
+    return keys
+
+
+def submission_signature(source_files: list) -> list[int] | None:
+    """MinHash signature of a submission, or None when it has no shingles (e.g. empty files)."""
+    shingles = shingle_hashes(source_files)
+    return minhash(shingles) if shingles else None
+
+
+def index_submission(db: Session, assignment_id: int, student_id: str, source_files: list) -> None:
+    """
+    Fingerprint a submission and (re)insert it into the assignment's LSH index.
+    A student's previous fingerprint for the assignment is replaced. Does not commit.
+    """
+    store_signature(db, assignment_id, student_id, submission_signature(source_files))
+
+
+def store_signature(db: Session, assignment_id: int, student_id: str, signature: list[int] | None) -> None:
+    """Insert a precomputed signature into the LSH index, replacing the student's previous one. Does not commit."""
+    fingerprint = db.query(models.SimilarityFingerprint).filter(
+        models.SimilarityFingerprint.assignment_id == assignment_id,
+        models.SimilarityFingerprint.student_id == student_id,
+    ).first()
+
+    if signature is None:
+        if fingerprint:
+            db.delete(fingerprint)
+        return
+
+    if fingerprint:
+        fingerprint.signature = signature
+    else:
+        fingerprint = models.SimilarityFingerprint(
+            assignment_id=assignment_id, student_id=student_id, signature=signature
+        )
+        db.add(fingerprint)
+
+    fingerprint.buckets = [
+        models.LshBucket(assignment_id=assignment_id, band=band, bucket=key)
+        for band, key in enumerate(band_keys(signature))
+    ]
+
+
+def similar_pairs(db: Session, assignment_id: int, threshold: float) -> list[dict]:
+    """Candidate pairs sharing at least one LSH bucket, verified against the threshold on their signatures."""
+    a = aliased(models.LshBucket)
+    b = aliased(models.LshBucket)
+    candidates = db.execute(
+        select(a.fingerprint_id, b.fingerprint_id).distinct().join(
+            b,
+            (a.assignment_id == b.assignment_id)
+            & (a.band == b.band)
+            & (a.bucket == b.bucket)
+            & (a.fingerprint_id < b.fingerprint_id),
+        ).where(a.assignment_id == assignment_id)
+    ).all()
+    if not candidates:
+        return []
+
+    ids = {i for pair in candidates for i in pair}
+    fingerprints = {
+        f.id: f for f in db.query(models.SimilarityFingerprint).filter(models.SimilarityFingerprint.id.in_(ids))
+    }
+
+    pairs = []
+    for id_a, id_b in candidates:
+        fa, fb = fingerprints[id_a], fingerprints[id_b]
+        score = estimate_similarity(fa.signature, fb.signature)
+        if score >= threshold:
+            pairs.append({"student_a": fa.student_id, "student_b": fb.student_id, "similarity": round(score, 3)})
+
+    pairs.sort(key=lambda p: p["similarity"], reverse=True)
+    return pairs
@@ -0,0 +1,96 @@
+"""
+Content-addressed storage of the exact source files each grade was based on.
+
+Blobs hold the raw bytes of a file as it was read, so re-applying regex checks scans the same bytes the
+grade did; text is only decoded (with decode()) for Gemini and for display.
+"""
+
+import hashlib
+import zlib
+from sqlalchemy.orm import Session
+from app.db import models
+
+
+def _raw(content: bytes | str) -> bytes:
+    return content if isinstance(content, bytes) else content.encode("utf-8")
+
+
+def decode(data: bytes) -> str:
+    """Text of a source file for Gemini and display; bytes that are not UTF-8 are dropped."""
+    return data.decode("utf-8", errors="ignore")
+
+
+def content_hash(content: bytes | str) -> str:
+    """Content address of a source file: sha256 of its bytes (UTF-8 for text)."""
+    return hashlib.sha256(_raw(content)).hexdigest()
+
+
+def compress(content: bytes | str) -> bytes:
+    return zlib.compress(_raw(content), 6)
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    return zlib.decompress(data)
+
+
+def decompress(data: bytes) -> str:
+    return decode(decompress_bytes(data))
+
+
+def store_blobs(db: Session, contents: list[bytes | str]) -> list[str]:
+    """
+    Store file contents (raw bytes, or text stored as UTF-8) in the content-addressed blob table.
+    Contents already present (e.g. shared starter code) are not stored again.
+    Returns the content hashes in input order. Does not commit.
+    """
+    hashes = [content_hash(c) for c in contents]
+    new_blobs = {}
+    for digest, content in zip(hashes, contents):
+        new_blobs.setdefault(digest, content)
+
+    existing = {
+        row.hash for row in db.query(models.SourceBlob.hash).filter(models.SourceBlob.hash.in_(list(new_blobs)))
+    } if new_blobs else set()
+
+    rows = [
+        {"hash": digest, "data": compress(content), "size": len(_raw(content))}
+        for digest, content in new_blobs.items() if digest not in existing
+    ]
+    if rows:
+        db.execute(_insert_ignore(db).values(rows))
+    return hashes
+
+
+def store_snapshot(db: Session, grading_result: models.GradingResult, source_files: list) -> None:
+    """Record the exact files a grading result was based on: their raw bytes when they were read from disk. Does not commit."""
+    hashes = store_blobs(db, [f.get("data", f["content"]) for f in source_files])
+    grading_result.snapshot_files = [
+        models.SnapshotFile(path=f["path"], blob_hash=digest) for f, digest in zip(source_files, hashes)
+    ]
+
+
+def load_blobs(db: Session, hashes) -> dict[str, bytes]:
+    """Fetch compressed blob data by hash."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return {}
+    rows = db.query(models.SourceBlob.hash, models.SourceBlob.data).filter(models.SourceBlob.hash.in_(hashes))
+    return {row.hash: row.data for row in rows}
+
+
+def load_snapshot(db: Session, grading_result_id: int) -> list:
+    """Return the graded source files of a result as a list of {"path", "content"} dicts."""
+    files = db.query(models.SnapshotFile).filter(
+        models.SnapshotFile.grading_result_id == grading_result_id
+    ).order_by(models.SnapshotFile.id).all()
+    blobs = load_blobs(db, [f.blob_hash for f in files])
+    return [{"path": f.path, "content": decompress(blobs[f.blob_hash])} for f in files]
+
+
+def _insert_ignore(db: Session):
+    """INSERT ... ON CONFLICT DO NOTHING, so concurrent graders can store the same blob safely."""
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(models.SourceBlob.__table__).on_conflict_do_nothing(index_elements=["hash"])
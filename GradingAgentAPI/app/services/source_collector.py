@@ -0,0 +1,107 @@
+"""
+Bounded collection of submission sources.
+
+Walks the assignment folder with os.scandir, applies the criteria's include/exclude globs and enforces
+per-file, per-submission byte and file-count limits before anything is read, so the memory and time
+spent on one submission are bounded no matter what the student committed. Accepted files are read
+concurrently in a thread pool.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from app.services import snapshots
+
+DEFAULT_INCLUDE = ["*.java"]
+_BINARY_SNIFF_BYTES = 8192
+_SKIP_DIRS = {".git"}
+
+
+def _matches(rel_path: str, name: str, patterns: list) -> bool:
+    return any(fnmatch(rel_path, p) or fnmatch(name, p) for p in patterns)
+
+
+def _scan_candidates(root: str, include: list, exclude: list) -> list[tuple[str, str, int]]:
+    """Return (relative_path, absolute_path, size) of every file matching the globs, sorted by path."""
+    candidates = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir():
+                        if entry.name not in _SKIP_DIRS and not _matches(rel_path, entry.name, exclude):
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        if _matches(rel_path, entry.name, include) and not _matches(rel_path, entry.name, exclude):
+                            candidates.append((rel_path, entry.path, entry.stat().st_size))
+        except OSError as e:
+            print(f"Warning: Could not scan {directory}: {e}")
+    candidates.sort()
+    return candidates
+
+
+def _read_file(abs_path: str, limit: int) -> bytes | None:
+    """Read at most limit bytes of a file, returning None if it looks binary."""
+    with open(abs_path, "rb") as f:
+        data = f.read(limit)
+    if b"\0" in data[:_BINARY_SNIFF_BYTES]:
+        return None
+    return data
+
+
+def collect_sources(
+    root: str,
+    include: list | None = None,
+    exclude: list | None = None,
+    max_file_bytes: int = 512 * 1024,
+    max_total_bytes: int = 4 * 1024 * 1024,
+    max_files: int = 500,
+    workers: int = 8,
+) -> tuple[list, list]:
+    """
+    Collect source files under root.
+    Returns (source_files, skipped) where source_files are {"path", "abs_path", "data", "content"} dicts (the
+    raw bytes and their decoded text) and skipped lists
+    {"path", "reason"} for every matching file that was left out.
+    """
+    candidates = _scan_candidates(root, include or DEFAULT_INCLUDE, exclude or [])
+
+    accepted = []
+    skipped = []
+    total_bytes = 0
+    for rel_path, abs_path, size in candidates:
+        if size > max_file_bytes:
+            skipped.append({"path": rel_path, "reason": f"file larger than {max_file_bytes} bytes"})
+        elif len(accepted) >= max_files:
+            skipped.append({"path": rel_path, "reason": f"more than {max_files} files"})
+        elif total_bytes + size > max_total_bytes:
+            skipped.append({"path": rel_path, "reason": f"submission larger than {max_total_bytes} bytes"})
+        else:
+            accepted.append((rel_path, abs_path))
+            total_bytes += size
+
+    source_files = []
+    if accepted:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(accepted)))) as pool:
+            futures = [
+                (rel_path, abs_path, pool.submit(_read_file, abs_path, max_file_bytes)) for rel_path, abs_path in accepted
+            ]
+            for rel_path, abs_path, future in futures:
+                try:
+                    data = future.result()
+                except OSError as e:
+                    skipped.append({"path": rel_path, "reason": f"unreadable: {e}"})
+                    continue
+                if data is None:
+                    skipped.append({"path": rel_path, "reason": "binary file"})
+                    continue
+                source_files.append({
+                    "path": rel_path, "abs_path": abs_path, "data": data, "content": snapshots.decode(data)
+                })
+
+    return source_files, skipped
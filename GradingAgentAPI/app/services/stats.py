@@ -0,0 +1,112 @@
+"""
+Assignment analytics computed in SQL.
+
+The grade histogram, percentiles and most common deductions are aggregated by the database from the
+grading_results and deductions tables, so no feedback text is loaded or parsed. The payload is cached in
+assignment_stats under a fingerprint of the assignment's latest results (newest id, count, latest update); when a
+new result lands or an existing one is re-graded the fingerprint changes and the next read recomputes.
+"""
+
+import hashlib
+import math
+from sqlalchemy import case, distinct, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.db import models
+
+PERCENTILES = (25, 50, 75, 90)
+TOP_DEDUCTIONS = 10
+
+
+def _results(db: Session, assignment_id: int):
+    """Each student's latest result; earlier attempts do not count towards the statistics."""
+    return db.query(models.GradingResult).filter(
+        models.GradingResult.assignment_id == assignment_id, models.GradingResult.is_latest.is_(True)
+    )
+
+
+def fingerprint(db: Session, assignment_id: int) -> str:
+    newest_id, count, updated_at = _results(db, assignment_id).with_entities(
+        func.max(models.GradingResult.id), func.count(models.GradingResult.id), func.max(models.GradingResult.updated_at)
+    ).one()
+    version = f"{assignment_id}:{newest_id or 0}:{count}:{updated_at.isoformat() if updated_at else ''}"
+    return hashlib.sha256(version.encode("utf-8")).hexdigest()
+
+
+def _histogram(db: Session, assignment_id: int) -> list[dict]:
+    """Counts per 10-point bin; 100 falls into the top bin."""
+    # Comparisons rather than CAST(grade / 10), which Postgres rounds and SQLite truncates
+    grade = models.GradingResult.grade
+    bin_index = case(*((grade >= i * 10, i) for i in range(9, 0, -1)), else_=0).label("bin")
+    counts = dict(_results(db, assignment_id).with_entities(bin_index, func.count()).group_by(bin_index).all())
+    return [
+        {"range": f"{i * 10}-{i * 10 + 9 if i < 9 else 100}", "count": counts.get(i, 0)}
+        for i in range(10)
+    ]
+
+
+def _percentiles(db: Session, assignment_id: int, count: int) -> dict:
+    """Nearest-rank percentiles, each read with ORDER BY ... OFFSET so only one row is returned."""
+    percentiles = {}
+    ordered = _results(db, assignment_id).with_entities(models.GradingResult.grade).order_by(models.GradingResult.grade)
+    for p in PERCENTILES:
+        rank = max(1, math.ceil(p / 100 * count))
+        percentiles[f"p{p}"] = ordered.offset(rank - 1).limit(1).scalar()
+    return percentiles
+
+
+def _top_deductions(db: Session, assignment_id: int) -> list[dict]:
+    occurrences = func.count(models.Deduction.id)
+    rows = db.query(
+        models.Deduction.source,
+        models.Deduction.message,
+        occurrences,
+        func.count(distinct(models.Deduction.grading_result_id)),
+        func.sum(models.Deduction.points),
+    ).join(models.GradingResult).filter(
+        models.GradingResult.assignment_id == assignment_id, models.GradingResult.is_latest.is_(True)
+    ).group_by(
+        models.Deduction.source, models.Deduction.message
+    ).order_by(occurrences.desc(), models.Deduction.message).limit(TOP_DEDUCTIONS).all()
+    return [
+        {"source": source, "message": message, "occurrences": n, "results": results, "total_points": int(points or 0)}
+        for source, message, n, results, points in rows
+    ]
+
+
+def compute(db: Session, assignment_id: int) -> dict:
+    count, mean, minimum, maximum = _results(db, assignment_id).with_entities(
+        func.count(models.GradingResult.id),
+        func.avg(models.GradingResult.grade),
+        func.min(models.GradingResult.grade),
+        func.max(models.GradingResult.grade),
+    ).one()
+    return {
+        "results": count,
+        "mean": round(float(mean), 2) if mean is not None else None,
+        "min": minimum,
+        "max": maximum,
+        "percentiles": _percentiles(db, assignment_id, count) if count else {f"p{p}": None for p in PERCENTILES},
+        "histogram": _histogram(db, assignment_id),
+        "top_deductions": _top_deductions(db, assignment_id),
+    }
+
+
+def assignment_stats(db: Session, assignment_id: int) -> dict:
+    """Cached stats for an assignment, recomputed when its results fingerprint has changed."""
+    current = fingerprint(db, assignment_id)
+    cached = db.get(models.AssignmentStats, assignment_id)
+    if cached is not None and cached.fingerprint == current:
+        return cached.payload
+
+    payload = compute(db, assignment_id)
+    if cached is None:
+        db.add(models.AssignmentStats(assignment_id=assignment_id, fingerprint=current, payload=payload))
+    else:
+        cached.fingerprint = current
+        cached.payload = payload
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Another request cached the same stats first
+    return payload
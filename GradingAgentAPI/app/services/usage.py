@@ -0,0 +1,127 @@
+"""
+Gemini usage accounting.
+
+Every grading result stores the totals of its Gemini calls (prompt, cached and output tokens, the model
+that decided the grade, time spent in calls and retries), summed from its llm_tiers records, with their
+cost priced per call from LLM_PRICES and the wall-clock time of the whole evaluation. Concurrent section
+calls overlap, so the summed call time can exceed the wall-clock time. The usage report aggregates those
+columns in SQL per assignment, criteria version and model, so the cost of a rubric and the effect of an
+optimization (retrieval, the cascade) can be compared across versions without loading any result.
+"""
+
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+
+# GradingResult columns filled from result_usage()
+COLUMNS = (
+    "prompt_tokens", "cached_tokens", "output_tokens", "llm_model", "llm_latency_ms", "llm_wall_ms",
+    "llm_retries", "llm_cost_usd",
+)
+
+
+def call_cost(tier: dict) -> float | None:
+    """USD cost of one Gemini call from its token counts, or None when its model has no price or usage is missing."""
+    prices = settings.LLM_PRICES.get(tier["model"])
+    if prices is None or tier.get("prompt_tokens") is None or tier.get("output_tokens") is None:
+        return None
+    cached = tier.get("cached_tokens") or 0
+    return (
+        (tier["prompt_tokens"] - cached) * prices["prompt"]
+        + cached * prices.get("cached", prices["prompt"])
+        + tier["output_tokens"] * prices["output"]
+    ) / 1_000_000
+
+
+def result_usage(tiers: list, wall_ms: int | None = None) -> dict:
+    """
+    Usage columns of one result from its llm_tiers and the wall-clock time of its Gemini evaluation.
+    Records without a latency (skipped or failed calls) made no billed call. A result without calls uses
+    no tokens, costs nothing and has no latency; token totals are None when calls were made but Gemini
+    reported no usage, and the cost is None when any call cannot be priced.
+    """
+    calls = [tier for tier in tiers if "latency_ms" in tier]
+
+    def total(field):
+        values = [tier[field] for tier in calls if tier.get(field) is not None]
+        if not values:
+            return None if calls else 0
+        return sum(values)
+
+    return {
+        "prompt_tokens": total("prompt_tokens"),
+        "cached_tokens": total("cached_tokens"),
+        "output_tokens": total("output_tokens"),
+        "llm_model": calls[-1]["model"] if calls else None,
+        "llm_latency_ms": total("latency_ms") if calls else None,
+        "llm_wall_ms": wall_ms if calls else None,
+        "llm_retries": total("retries"),
+        "llm_cost_usd": _total_cost(calls),
+    }
+
+
+def _total_cost(calls: list) -> float | None:
+    costs = [call_cost(tier) for tier in calls]
+    if None in costs:
+        return None
+    return round(sum(costs, 0.0), 6)
+
+
+def report(db: Session, assignment_id: int | None = None, since: datetime | None = None) -> dict:
+    """Usage per assignment, criteria version and model, plus overall totals, over every grading attempt."""
+    result = models.GradingResult
+    columns = (
+        func.count(result.id),
+        func.count(result.llm_model),
+        func.sum(result.prompt_tokens),
+        func.sum(result.cached_tokens),
+        func.sum(result.output_tokens),
+        func.avg(result.llm_latency_ms),
+        func.max(result.llm_latency_ms),
+        func.avg(result.llm_wall_ms),
+        func.max(result.llm_wall_ms),
+        func.sum(result.llm_retries),
+        func.sum(result.llm_cost_usd),
+        func.count(result.llm_cost_usd),
+    )
+    query = db.query(result).join(models.Assignment)
+    if assignment_id is not None:
+        query = query.filter(result.assignment_id == assignment_id)
+    if since is not None:
+        query = query.filter(result.created_at >= since)
+
+    groups = query.with_entities(
+        models.Assignment.name, result.criteria_version, result.llm_model, *columns
+    ).group_by(
+        models.Assignment.name, result.criteria_version, result.llm_model
+    ).order_by(models.Assignment.name, result.criteria_version, result.llm_model).all()
+    totals = query.with_entities(*columns).one()
+    return {
+        "totals": _usage_row(totals),
+        "groups": [
+            {"assignment_name": name, "criteria_version": version, "llm_model": model, **_usage_row(row)}
+            for name, version, model, *row in groups
+        ],
+    }
+
+
+def _usage_row(row) -> dict:
+    (results, with_calls, prompt, cached, output, avg_latency, max_latency, avg_wall, max_wall, retries,
+     cost, priced) = row
+    return {
+        "results": results,
+        "results_with_llm_calls": with_calls,
+        "prompt_tokens": int(prompt or 0),
+        "cached_tokens": int(cached or 0),
+        "output_tokens": int(output or 0),
+        "avg_prompt_tokens": round(int(prompt or 0) / with_calls, 1) if with_calls else None,
+        "avg_llm_latency_ms": round(float(avg_latency), 1) if avg_latency is not None else None,
+        "max_llm_latency_ms": max_latency,
+        "avg_llm_wall_ms": round(float(avg_wall), 1) if avg_wall is not None else None,
+        "max_llm_wall_ms": max_wall,
+        "llm_retries": int(retries or 0),
+        "cost_usd": round(float(cost or 0), 6),
+        "unpriced_results": results - priced,
+    }
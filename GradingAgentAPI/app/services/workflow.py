@@ -0,0 +1,198 @@
+"""
+Workflow engine for the grading pipeline.
+
+A workflow is a DAG of stages. Each stage declares the named values it consumes and produces, and starts
+as soon as all of its inputs exist, so stages that do not depend on each other run concurrently on the
+event loop. Every stage has its own timeout and retry budget and may declare a fallback for its outputs
+when it fails, and every run records when each stage started, how long it took, how many attempts it
+needed and how it ended. A stage can also be abandoned, cancelled while it runs or never started, once
+another stage produces a value that makes its work pointless.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+
+class StageTimeout(Exception):
+    """A stage used up its timeout on its last attempt."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class StageAbandoned(Exception):
+    """A stage was cancelled by its abandon_if condition; passed to its fallback."""
+
+    def __init__(self, stage: str, value: str):
+        super().__init__(f"Stage '{stage}' abandoned after '{value}' was produced")
+        self.stage = stage
+        self.value = value
+
+
+class Stage:
+    """
+    One step of a workflow: an async function called with its inputs as keyword arguments, returning a
+    dict with (at least) its outputs. A timeout applies to each attempt; timeouts and exceptions listed
+    in retry_on are retried up to `retries` more times. When every attempt fails, fallback(error), if
+    given, supplies the outputs instead of failing the run. With abandon_if=(name, predicate), the stage
+    is cancelled (or not started) as soon as value `name` exists and predicate(value) is true, and its
+    outputs are fallback(StageAbandoned); `name` need not be an input, so the stage does not wait for it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[dict]],
+        inputs: tuple = (),
+        outputs: tuple = (),
+        timeout: float | None = None,
+        retries: int = 0,
+        retry_on: tuple = (),
+        fallback: Callable[[Exception], dict] | None = None,
+        abandon_if: tuple[str, Callable[[Any], bool]] | None = None,
+    ):
+        if abandon_if is not None and fallback is None:
+            raise ValueError(f"Stage '{name}' has abandon_if but no fallback to supply its outputs")
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_on = tuple(retry_on)
+        self.fallback = fallback
+        self.abandon_if = abandon_if
+
+
+class Workflow:
+    """A validated DAG of stages; see run()."""
+
+    def __init__(self, stages: list[Stage]):
+        self.stages = list(stages)
+        self.producers = {}
+        names = set()
+        for stage in self.stages:
+            if stage.name in names:
+                raise ValueError(f"Duplicate stage '{stage.name}'")
+            names.add(stage.name)
+            for output in stage.outputs:
+                if output in self.producers:
+                    raise ValueError(f"'{output}' is produced by both '{self.producers[output].name}' and '{stage.name}'")
+                self.producers[output] = stage
+        self.inputs = {i for stage in self.stages for i in stage.inputs if i not in self.producers}
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        state = {}  # stage name -> "visiting" | "done"
+
+        def visit(stage, path):
+            if state.get(stage.name) == "done":
+                return
+            if state.get(stage.name) == "visiting":
+                raise ValueError("Workflow has a cycle: " + " -> ".join(path + [stage.name]))
+            state[stage.name] = "visiting"
+            for name in stage.inputs:
+                if name in self.producers:
+                    visit(self.producers[name], path + [stage.name])
+            state[stage.name] = "done"
+
+        for stage in self.stages:
+            visit(stage, [])
+
+    async def run(self, inputs: dict, timings: list | None = None) -> dict:
+        """
+        Run every stage and return all values (the given inputs and every stage's outputs).
+        Timing records are appended to `timings` as stages finish, so they are available even when the
+        run fails. The first stage failure without a fallback cancels the stages still running and is
+        raised unchanged.
+        """
+        missing = self.inputs - inputs.keys()
+        if missing:
+            raise ValueError(f"Missing workflow inputs: {', '.join(sorted(missing))}")
+        timings = [] if timings is None else timings
+        values = dict(inputs)
+        pending = list(self.stages)
+        running = {}
+        started = time.monotonic()
+        try:
+            while pending or running:
+                for stage in [s for s in pending if self._abandoned(s, values)]:
+                    pending.remove(stage)
+                    timings.append({"stage": stage.name, "outcome": "abandoned"})
+                    values.update(self._abandon_outputs(stage))
+                if not pending and not running:
+                    break
+                for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(stage)
+                    task = asyncio.create_task(
+                        self._run_stage(stage, {i: values[i] for i in stage.inputs}, started, timings)
+                    )
+                    running[task] = stage
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    del running[task]
+                    values.update(task.result())
+                for task, stage in [(t, s) for t, s in running.items() if self._abandoned(s, values)]:
+                    del running[task]
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    record = next(t for t in reversed(timings) if t["stage"] == stage.name)
+                    record["outcome"] = "abandoned"
+                    values.update(self._abandon_outputs(stage))
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            for stage in pending:
+                timings.append({"stage": stage.name, "outcome": "skipped"})
+        return values
+
+    @staticmethod
+    def _abandoned(stage: Stage, values: dict) -> bool:
+        if stage.abandon_if is None:
+            return False
+        name, predicate = stage.abandon_if
+        return name in values and predicate(values[name])
+
+    @staticmethod
+    def _abandon_outputs(stage: Stage) -> dict:
+        result = stage.fallback(StageAbandoned(stage.name, stage.abandon_if[0]))
+        return {o: result[o] for o in stage.outputs}
+
+    async def _run_stage(self, stage: Stage, kwargs: dict, started: float, timings: list) -> dict:
+        record = {"stage": stage.name, "start_ms": round((time.monotonic() - started) * 1000), "attempts": 0}
+        begin = time.monotonic()
+        try:
+            for attempt in range(stage.retries + 1):
+                record["attempts"] = attempt + 1
+                try:
+                    result = await asyncio.wait_for(stage.fn(**kwargs), stage.timeout)
+                    break
+                except asyncio.TimeoutError:
+                    if attempt == stage.retries:
+                        raise StageTimeout(stage.name, stage.timeout) from None
+                except stage.retry_on:
+                    if attempt == stage.retries:
+                        raise
+            missing = [o for o in stage.outputs if o not in result]
+            if missing:
+                raise RuntimeError(f"Stage '{stage.name}' did not produce {', '.join(missing)}")
+            record["outcome"] = "ok"
+        except asyncio.CancelledError:
+            record["outcome"] = "cancelled"
+            raise
+        except Exception as e:
+            record["outcome"] = "timeout" if isinstance(e, StageTimeout) else "error"
+            record["error"] = str(e) or type(e).__name__
+            if stage.fallback is None:
+                raise
+            result = stage.fallback(e)
+            record["outcome"] += "_fallback"
+        finally:
+            record["duration_ms"] = round((time.monotonic() - begin) * 1000)
+            timings.append(record)
+        return {o: result[o] for o in stage.outputs}
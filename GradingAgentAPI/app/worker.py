@@ -0,0 +1,140 @@
+"""
+Standalone grading worker.
+
+Run one or more containers next to the API with `python -m app.worker`; each claims jobs from the
+grading_jobs table (see app.services.job_queue) and runs them through the same grading pipeline as
+POST /grade. Throughput scales with the number of workers, with Postgres as the only broker.
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from fastapi import HTTPException
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.schemas.grading import GradingRequest
+from app.services import deadline, grading_service, job_queue, profiler
+
+
+class _Heartbeat(threading.Thread):
+    """
+    Renews a job's lease from a separate thread, so a long blocking stage cannot starve it, and watches
+    for DELETE /jobs/{id}. If the job is cancelled or its lease is lost (e.g. another worker reclaimed
+    it), the grading task is cancelled, which kills a running clone and abandons pending Gemini calls.
+    """
+
+    def __init__(self, job_id: int, worker_id: str, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        super().__init__(daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.loop = loop
+        self.task = task
+        self.stopped = threading.Event()
+        self.lost = False
+        self.cancelled = False
+
+    def run(self):
+        renewed = time.monotonic()
+        while not self.stopped.wait(min(settings.JOB_CANCEL_POLL_SECONDS, settings.JOB_HEARTBEAT_SECONDS)):
+            db = SessionLocal()
+            try:
+                self.cancelled = job_queue.is_cancelled(db, self.job_id)
+                owned = not self.cancelled
+                if owned and time.monotonic() - renewed >= settings.JOB_HEARTBEAT_SECONDS:
+                    owned = job_queue.heartbeat(db, self.job_id, self.worker_id)
+                    renewed = time.monotonic()
+            except Exception as e:
+                print(f"Heartbeat for job {self.job_id} failed: {e}")
+                continue
+            finally:
+                db.close()
+            if not owned:
+                self.lost = not self.cancelled
+                self.loop.call_soon_threadsafe(self.task.cancel)
+                return
+
+
+async def _grade_job(job, db) -> dict:
+    request = GradingRequest(**job_queue.request_payload(job))
+    async with deadline.scope(settings.JOB_DEADLINE_SECONDS):
+        if job.profile:
+            label = f"{request.assignment_name}: {request.repo_link}"
+            return await profiler.profiled(db, label, grading_service.grade_assignment(request, db), job_id=job.id)
+        return await grading_service.grade_assignment(request, db)
+
+
+async def process_job(db, job, worker_id: str) -> None:
+    """Run one claimed job to completion and record the outcome."""
+    task = asyncio.create_task(_grade_job(job, db))
+    heartbeat = _Heartbeat(job.id, worker_id, asyncio.get_running_loop(), task)
+    heartbeat.start()
+    try:
+        result = await task
+    except asyncio.CancelledError:
+        if not (heartbeat.lost or heartbeat.cancelled):
+            raise
+        db.rollback()
+        if heartbeat.cancelled:
+            print(f"Worker {worker_id} stopped cancelled job {job.id}")
+        else:
+            print(f"Worker {worker_id} lost the lease on job {job.id}")
+        return
+    except HTTPException as e:
+        # Client errors (missing criteria, bad repository) will not succeed on retry, and neither will a
+        # grade that ran out of time (408 clone timeout, 504 deadline or stage timeout): a retry gets the same budget
+        db.rollback()
+        job_queue.fail(db, job, str(e.detail), retry=e.status_code >= 500 and e.status_code != 504)
+        return
+    except Exception as e:
+        db.rollback()
+        job_queue.fail(db, job, f"{type(e).__name__}: {e}", retry=not isinstance(e, TimeoutError))
+        return
+    finally:
+        heartbeat.stopped.set()
+
+    job_queue.complete(db, job, result)
+
+
+async def _worker_loop(worker_id: str, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            job = job_queue.claim(db, worker_id)
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await process_job(db, job, worker_id)
+        except Exception as e:
+            print(f"Worker {worker_id} error: {e}")
+            await asyncio.sleep(settings.JOB_POLL_SECONDS)
+        finally:
+            db.close()
+
+
+async def run_worker(concurrency: int) -> None:
+    base_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)  # Finish the current jobs, then exit
+    print(f"Grading worker {base_id} started with concurrency {concurrency}")
+    await asyncio.gather(*(_worker_loop(f"{base_id}/{i}", stop) for i in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claim and run grading jobs from the database queue.")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(run_worker(max(1, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup-time benchmark for the API.
+
+Each run starts a fresh interpreter and measures:
+  - import_ms: `import app.main`
+  - first_request_ms: the first GET / after startup (app and middleware construction, routing)
+  - ready_ms: time from startup until GET /ready answers 200 (background warm-up done)
+and lists any heavy modules loaded by the import, which should be none.
+
+Usage: python benchmarks/startup_bench.py [--runs 5]
+Without DATABASE_URL a throwaway SQLite database is used.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ["google.generativeai", "docx"]
+
+_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+import_ms = (time.perf_counter() - start) * 1000
+heavy = [m for m in json.loads(sys.argv[1]) if m in sys.modules]
+
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    started = time.perf_counter()
+    client.get("/")
+    first_request_ms = (time.perf_counter() - started) * 1000
+    while client.get("/ready").status_code != 200:
+        if time.perf_counter() - started > 60:
+            break
+        time.sleep(0.01)
+    ready_ms = (time.perf_counter() - started) * 1000
+
+print(json.dumps({
+    "import_ms": import_ms,
+    "first_request_ms": first_request_ms,
+    "ready_ms": ready_ms,
+    "heavy_modules_at_import": heavy,
+}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, json.dumps(HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import, first-request and readiness latency.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = dict(os.environ)
+        if not env.get("DATABASE_URL"):
+            env["DATABASE_URL"] = f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"
+            subprocess.run(
+                [sys.executable, "-m", "app.db.init_db"],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                env=env,
+                capture_output=True,
+                check=True,
+            )
+
+        runs = [run_once(env) for _ in range(max(1, args.runs))]
+
+    report = {
+        metric: {
+            "median": round(statistics.median(r[metric] for r in runs), 1),
+            "max": round(max(r[metric] for r in runs), 1),
+        }
+        for metric in ("import_ms", "first_request_ms", "ready_ms")
+    }
+    report["runs"] = len(runs)
+    report["heavy_modules_at_import"] = sorted({m for r in runs for m in r["heavy_modules_at_import"]})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,32 @@
+import asyncio
+import os
 import pytest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from cryptography.fernet import Fernet
 from app.main import app
+from app.core.config import settings
 from app.db.models import Base
 from app.api.deps import get_db
+from app.db.session import instrument
 
 # Setup test database
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+instrument(engine)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def job_secret_key(monkeypatch):
+    """Queued jobs' credentials are encrypted with JOB_SECRET_KEY, which deployments must set."""
+    monkeypatch.setattr(settings, "JOB_SECRET_KEY", Fernet.generate_key().decode("ascii"))
+
+
 @pytest.fixture(name="session")
 def session_fixture():
     Base.metadata.create_all(bind=engine)
@@ -33,4 +46,55 @@ def client_fixture(session: TestingSessionLocal):
     app.dependency_overrides[get_db] = override_get_db
     with TestClient(app) as client:
         yield client
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+
+class FakeProcess:
+    """Stands in for the asyncio subprocess running `git clone`."""
+
+    def __init__(self, returncode: int = 0, stderr: bytes = b"", delay: float = 0):
+        self.returncode = None
+        self.killed = False
+        self._exit_code = returncode
+        self._stderr = stderr
+        self._delay = delay
+
+    async def communicate(self):
+        await asyncio.sleep(self._delay)
+        self.returncode = self._exit_code
+        return b"", self._stderr
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    async def wait(self):
+        return self.returncode
+
+
+@pytest.fixture(name="fake_clone")
+def fake_clone_fixture():
+    """
+    Patch `git clone` to write the given {relative_path: content} files into the checkout. A non-zero
+    returncode fails the clone with stderr; delay makes it hang that long. The patch's `processes`
+    attribute lists the fake processes started.
+    """
+    def install(files: dict, returncode: int = 0, stderr: str = "", delay: float = 0):
+        processes = []
+
+        async def clone(*cmd, **kwargs):
+            destination = cmd[-1]
+            for path, content in files.items():
+                full_path = os.path.join(destination, path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                mode = "wb" if isinstance(content, bytes) else "w"
+                with open(full_path, mode) as f:
+                    f.write(content)
+            process = FakeProcess(returncode, stderr.encode("utf-8"), delay)
+            processes.append(process)
+            return process
+
+        patcher = patch("asyncio.create_subprocess_exec", side_effect=clone)
+        patcher.processes = processes
+        return patcher
+    return install
@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.services.admission import AdmissionController
+
+
+def test_rejects_with_retry_after_when_queue_is_full():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=1)
+        await controller.acquire("ta-1")
+        waiting = asyncio.create_task(controller.acquire("ta-1"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as rejected:
+            await controller.acquire("ta-2")
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) > 0
+
+        controller.release()
+        await waiting
+        assert (controller.inflight, controller.queued) == (1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_follows_throughput():
+    controller = AdmissionController(max_inflight=2, max_queue=10)
+    controller.inflight = 2
+    controller.queued = 9
+    controller.throughput = lambda: 0.5  # Two seconds per grade
+    assert controller.retry_after() == 20
+
+
+def test_slots_are_shared_round_robin_across_tas():
+    """A TA with a large batch queued first does not starve a TA who arrives later"""
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=10)
+        order = []
+
+        async def grade(tenant, label):
+            await controller.acquire(tenant)
+            order.append(label)
+
+        await controller.acquire("batch")
+        tasks = [asyncio.create_task(grade("batch", f"batch-{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(grade("other", "other-0")))
+        await asyncio.sleep(0)
+
+        for _ in range(4):
+            controller.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["batch-0", "other-0", "batch-1", "batch-2"]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=10)
+        await controller.acquire("ta-1")
+        waiting = asyncio.create_task(controller.acquire("ta-2"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        assert controller.queued == 0
+        controller.release()
+        assert controller.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_stats(client: TestClient):
+    response = client.get("/admission")
+    assert response.status_code == 200
+    assert response.json()["inflight"] == 0
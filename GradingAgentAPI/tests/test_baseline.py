@@ -0,0 +1,73 @@
+from fastapi.testclient import TestClient
+from io import BytesIO
+import zipfile
+from app.db import models
+from app.services import baseline as baseline_service
+from app.services.grading_service import _prepare_code_for_gemini
+
+STARTER_NODE = "public class Node {\n    int value;\n    Node next;\n}\n"
+STARTER_LIST = "".join(f"    // TODO step {i}\n" for i in range(40))
+STARTER_LIST = "public class LinkedList {\n" + STARTER_LIST + "    public void add(int value) {\n    }\n}\n"
+
+
+def _zip(files: dict) -> bytes:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for path, content in files.items():
+            archive.writestr(path, content)
+    return buffer.getvalue()
+
+
+def test_strip_baseline():
+    """Test that unchanged starter files are omitted and modified ones become diffs"""
+    baseline = {"Node.java": STARTER_NODE, "src/LinkedList.java": STARTER_LIST}
+    student_list = STARTER_LIST.replace("    public void add(int value) {\n", "    public void add(int value) {\n        size++;\n")
+    source_files = [
+        {"path": "Node.java", "content": STARTER_NODE},
+        {"path": "src/LinkedList.java", "content": student_list},
+        {"path": "Main.java", "content": "public class Main {}"},
+    ]
+
+    prompt_files, omitted = baseline_service.strip_baseline(source_files, baseline)
+
+    assert omitted == ["Node.java"]
+    assert [f["path"] for f in prompt_files] == ["src/LinkedList.java", "Main.java"]
+    assert prompt_files[0]["diff"] is True
+    assert "+        size++;" in prompt_files[0]["content"]
+    assert prompt_files[1]["content"] == "public class Main {}"
+
+    code_context = _prepare_code_for_gemini(prompt_files, omitted_files=omitted)
+    assert "Unchanged starter code omitted: Node.java" in code_context
+    assert "FILE: src/LinkedList.java (diff against starter code)" in code_context
+
+
+def test_strip_baseline_without_baseline():
+    source_files = [{"path": "Main.java", "content": "public class Main {}"}]
+    assert baseline_service.strip_baseline(source_files, {}) == (source_files, [])
+
+
+def test_upload_baseline_zip(client: TestClient, session):
+    """Test uploading starter code as a zip; a leading assignment folder is stripped"""
+    response = client.post(
+        "/assignments/Linked List/baseline",
+        files={
+            "baseline_file": (
+                "starter.zip",
+                _zip({"Linked List/Node.java": STARTER_NODE, "Linked List/README.md": "ignored"}),
+                "application/zip"
+            )
+        }
+    )
+    assert response.status_code == 200
+    assert response.json()["files"] == 1
+
+    assignment = session.query(models.Assignment).filter(models.Assignment.name == "Linked List").one()
+    assert baseline_service.load_baseline(session, assignment.id) == {"Node.java": STARTER_NODE}
+
+
+def test_upload_baseline_invalid_file_type(client: TestClient):
+    response = client.post(
+        "/assignments/Linked List/baseline",
+        files={"baseline_file": ("starter.pdf", b"pdf", "application/pdf")}
+    )
+    assert response.status_code == 400
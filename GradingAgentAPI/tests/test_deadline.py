@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+from app.api import disconnect
+from app.services import deadline
+
+
+def test_scope_raises_504_and_nested_scopes_keep_the_sooner_deadline():
+    async def main():
+        async with deadline.scope(10):
+            async with deadline.scope(60):
+                assert deadline.remaining() <= 10
+        assert deadline.remaining() is None
+        async with deadline.scope(0.05):
+            await asyncio.sleep(1)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main())
+    assert error.value.status_code == 504
+
+
+def test_scope_does_not_swallow_inner_timeouts():
+    async def main():
+        async with deadline.scope(10):
+            await asyncio.wait_for(asyncio.sleep(1), 0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after: int):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.polls > self.disconnect_after
+
+
+def test_cancel_on_disconnect_cancels_the_work():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    with patch("app.api.disconnect.settings.DISCONNECT_POLL_SECONDS", 0.01):
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(disconnect.cancel_on_disconnect(FakeRequest(disconnect_after=2), work()))
+    assert error.value.status_code == 499
+    assert cancelled == [True]
+
+
+def test_cancel_on_disconnect_returns_the_result_while_connected():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "graded"
+
+    with patch("app.api.disconnect.settings.DISCONNECT_POLL_SECONDS", 0.01):
+        assert asyncio.run(disconnect.cancel_on_disconnect(FakeRequest(disconnect_after=1000), work())) == "graded"
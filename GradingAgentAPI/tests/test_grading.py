@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
-import subprocess
 import json
+import pytest
 
 
 def test_create_assignment_success(client: TestClient):
@@ -75,7 +75,7 @@ def test_upload_criteria_txt(client: TestClient):
     assert "saved" in response.json()["message"].lower()
 
 
-def test_grade_assignment_success(client: TestClient):
+def test_grade_assignment_success(client: TestClient, fake_clone):
     """Test successful grading with mocked Gemini API"""
     # Setup assignment and criteria
     assignment_name = "Grade Test Assignment"
@@ -104,27 +104,12 @@ def test_grade_assignment_success(client: TestClient):
     )
 
     # Mock the subprocess, file operations, and Gemini API
-    with patch("subprocess.run") as mock_run, \
-         patch("os.walk") as mock_walk, \
-         patch("os.path.isdir") as mock_isdir, \
-         patch("builtins.open", new_callable=MagicMock) as mock_open, \
+    # Mock the git clone and Gemini API
+    source = 'public class BinarySearch {\n    System.out.println("test");\n}'
+    with fake_clone({f"{assignment_name}/BinarySearch.java": source}), \
          patch("google.generativeai.configure") as mock_genai_config, \
          patch("google.generativeai.GenerativeModel") as mock_genai_model:
 
-        # Mock git clone
-        mock_run.return_value = MagicMock(returncode=0)
-
-        # Mock directory check
-        mock_isdir.return_value = True
-
-        # Mock file walking
-        mock_walk.return_value = [("/tmp/test", [], ["BinarySearch.java"])]
-
-        # Mock file reading
-        mock_file = MagicMock()
-        mock_file.read.return_value = 'public class BinarySearch {\n    System.out.println("test");\n}'
-        mock_open.return_value.__enter__.return_value = mock_file
-
         # Mock Gemini API response
         mock_response = MagicMock()
         mock_response.text = "[-10 points] Missing error handling for edge cases\n[-5 points] Code lacks proper documentation"
@@ -152,6 +137,11 @@ def test_grade_assignment_success(client: TestClient):
         # Grade should be 100 - 5 (regex) - 10 (gemini) - 5 (gemini) = 80
         assert result["grading_result"]["grade"] == 80
 
+        # Every workflow stage ran once and was timed
+        timings = {t["stage"]: t for t in result["grading_result"]["stage_timings"]}
+        assert set(timings) == {"clone", "collect", "baseline", "regex", "context", "fingerprint", "llm"}
+        assert all(t["outcome"] == "ok" and t["attempts"] == 1 for t in timings.values())
+
 
 def test_grade_assignment_no_criteria(client: TestClient):
     """Test grading when criteria doesn't exist"""
@@ -168,7 +158,7 @@ def test_grade_assignment_no_criteria(client: TestClient):
     assert "not found" in response.json()["detail"].lower()
 
 
-def test_grade_assignment_clone_fails(client: TestClient):
+def test_grade_assignment_clone_fails(client: TestClient, fake_clone):
     """Test grading when git clone fails"""
     assignment_name = "Clone Fail Test"
     client.post("/assignments", json={"assignment_name": assignment_name})
@@ -189,11 +179,7 @@ def test_grade_assignment_clone_fails(client: TestClient):
         }
     )
 
-    with patch("subprocess.run") as mock_run:
-        mock_run.side_effect = subprocess.CalledProcessError(
-            1, "git clone", stderr="fatal: repository not found"
-        )
-
+    with fake_clone({}, returncode=128, stderr="fatal: repository not found"):
         response = client.post(
             "/grade",
             json={
@@ -208,7 +194,7 @@ def test_grade_assignment_clone_fails(client: TestClient):
     assert "clone" in response.json()["detail"].lower()
 
 
-def test_grade_assignment_no_java_files(client: TestClient):
+def test_grade_assignment_no_java_files(client: TestClient, fake_clone):
     """Test grading when no Java files are found"""
     assignment_name = "No Java Files Test"
     client.post("/assignments", json={"assignment_name": assignment_name})
@@ -229,13 +215,8 @@ def test_grade_assignment_no_java_files(client: TestClient):
         }
     )
 
-    with patch("subprocess.run") as mock_run, \
-         patch("os.path.isdir") as mock_isdir, \
-         patch("os.walk") as mock_walk:
-
-        mock_run.return_value = MagicMock(returncode=0)
-        mock_isdir.return_value = True
-        mock_walk.return_value = [("/tmp/test", [], [])]  # No files
+    # Assignment folder exists but contains no Java files
+    with fake_clone({f"{assignment_name}/README.md": "No code here"}):
 
         response = client.post(
             "/grade",
@@ -265,7 +246,7 @@ def test_get_student_grades(client: TestClient):
     assert isinstance(response.json(), list)
 
 
-def test_student_id_extraction(client: TestClient):
+def test_student_id_extraction(client: TestClient, fake_clone):
     """Test that student ID is correctly extracted from GitHub URL"""
     assignment_name = "Student ID Test"
     client.post("/assignments", json={"assignment_name": assignment_name})
@@ -286,17 +267,10 @@ def test_student_id_extraction(client: TestClient):
         }
     )
 
-    with patch("subprocess.run"), \
-         patch("os.path.isdir", return_value=True), \
-         patch("os.walk", return_value=[("/tmp/test", [], ["Test.java"])]), \
-         patch("builtins.open", new_callable=MagicMock), \
+    with fake_clone({f"{assignment_name}/Test.java": "public class Test {}"}), \
          patch("google.generativeai.configure"), \
          patch("google.generativeai.GenerativeModel"):
 
-        # Mock file reading
-        mock_file = MagicMock()
-        mock_file.read.return_value = "public class Test {}"
-
         response = client.post(
             "/grade",
             json={
@@ -309,3 +283,568 @@ def test_student_id_extraction(client: TestClient):
 
         assert response.status_code == 200
         assert response.json()["student_id"] == "johndoe"
+
+
+def test_reapply_regex_updates_stored_results(client: TestClient, fake_clone):
+    """Test that new regex checks are applied to stored snapshots without re-cloning"""
+    assignment_name = "Reapply Regex Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+
+    def upload(regex_checks):
+        criteria = {"natural_language_rubric": "Test rubric", "regex_checks": regex_checks}
+        client.post(
+            f"/assignments/{assignment_name}/criteria",
+            files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+        )
+
+    upload([])
+
+    source = "class Sorter {\n  void run() { Collections.sort(items); }\n}"
+    with fake_clone({f"{assignment_name}/Sorter.java": source}), \
+         patch("google.generativeai.configure"), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+
+        mock_genai_model.return_value.generate_content.return_value = MagicMock(text="[-10 points] Missing JavaDoc")
+
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/sorter/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+        assert response.json()["grading_result"]["grade"] == 90
+
+    upload([{"pattern": "Collections\\.sort", "deduction": 20, "message": "Used Collections.sort"}])
+
+    with patch("asyncio.create_subprocess_exec") as mock_clone, \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        response = client.post(f"/assignments/{assignment_name}/reapply-regex")
+        mock_clone.assert_not_called()
+        mock_genai_model.assert_not_called()
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["scanned"] == 1
+    assert result["affected"] == [{"student_id": "sorter", "old_grade": 90, "new_grade": 70}]
+
+    grades = client.get("/grades/sorter").json()
+    assert grades[0]["grade"] == 70
+    assert "GRADE: 70/100" in grades[0]["feedback"]
+    assert "Used Collections.sort (in Sorter.java:2)" in grades[0]["feedback"]
+    assert "Missing JavaDoc" in grades[0]["feedback"]
+
+    stats = client.get(f"/assignments/{assignment_name}/stats").json()
+    assert {(d["source"], d["message"], d["total_points"]) for d in stats["top_deductions"]} == {
+        ("regex", "Used Collections.sort", 20),
+        ("llm", "Missing JavaDoc", 10),
+    }
+
+
+def test_reapply_regex_scans_the_bytes_that_were_graded(client: TestClient, fake_clone, session):
+    """Test that snapshots keep non-UTF-8 bytes, so re-applying checks matches what the grade matched"""
+    from app.db import models
+    from app.services import snapshots
+    assignment_name = "Reapply Bytes Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    checks = [{"pattern": "caf.;", "deduction": 10, "message": "Latin-1 literal"}]
+    criteria = {"natural_language_rubric": "Test rubric", "regex_checks": checks}
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+
+    source = b'class Menu {\n  String item = "caf\xe9;";\n}'  # Latin-1, not valid UTF-8
+    with fake_clone({f"{assignment_name}/Menu.java": source}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.return_value = MagicMock(text="No issues.")
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/menu/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+    assert response.json()["grading_result"]["grade"] == 90
+
+    result = client.post(f"/assignments/{assignment_name}/reapply-regex").json()
+    assert result["scanned"] == 1
+    assert result["affected"] == []
+    assert client.get("/grades/menu").json()[0]["grade"] == 90
+
+    blob = session.query(models.SourceBlob).filter(models.SourceBlob.hash == snapshots.content_hash(source)).one()
+    assert snapshots.decompress_bytes(blob.data) == source
+
+
+def test_reapply_regex_does_not_lift_a_grade_that_skipped_gemini(client: TestClient, fake_clone):
+    """Test that lowering the check that skipped Gemini flags the result for a re-grade instead of awarding points"""
+    assignment_name = "Reapply Skip Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+
+    def upload(deduction):
+        checks = [{"pattern": "class Main", "deduction": deduction, "message": "Submitted the starter file"}]
+        criteria = {"natural_language_rubric": "Test rubric", "regex_checks": checks}
+        client.post(
+            f"/assignments/{assignment_name}/criteria",
+            files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+        )
+
+    upload(100)
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/starter/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+    assert response.json()["grading_result"]["grade"] == 0
+
+    upload(20)
+    result = client.post(f"/assignments/{assignment_name}/reapply-regex").json()
+    assert result["needs_regrade"] == ["starter"]
+    assert result["affected"] == []
+    assert client.get("/grades/starter").json()[0]["grade"] == 0
+
+    upload(150)
+    result = client.post(f"/assignments/{assignment_name}/reapply-regex").json()
+    assert result["needs_regrade"] == []
+
+
+def test_grade_assignment_skips_oversized_and_excluded_files(client: TestClient, fake_clone):
+    """Test that the collector honours criteria globs and size limits and reports skipped files"""
+    assignment_name = "Collector Test"
+    criteria = {
+        "natural_language_rubric": "Test rubric",
+        "regex_checks": [],
+        "exclude_globs": ["build/*"]
+    }
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+
+    with fake_clone({
+        f"{assignment_name}/src/Main.java": "public class Main {}",
+        f"{assignment_name}/src/Generated.java": "// generated\n" * 100,
+        f"{assignment_name}/src/Blob.java": b"\x00\x01binary",
+        f"{assignment_name}/build/Copy.java": "public class Copy {}",
+    }), \
+         patch("app.services.grading_service.settings.MAX_SOURCE_FILE_BYTES", 1000), \
+         patch("google.generativeai.configure"), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+
+        mock_genai_model.return_value.generate_content.return_value = MagicMock(text="Looks good")
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/collector/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+
+    assert response.status_code == 200
+    feedback = response.json()["grading_result"]["feedback"]
+    assert "SKIPPED FILES" in feedback
+    assert "src/Generated.java: file larger than 1000 bytes" in feedback
+    assert "src/Blob.java: binary file" in feedback
+    assert "build/Copy.java" not in feedback
+
+    prompt = mock_genai_model.return_value.generate_content.call_args[0][0]
+    assert "FILE: src/Main.java" in prompt
+    assert "Generated.java" not in prompt.split("STUDENT'S CODE:")[1]
+
+
+@pytest.mark.parametrize("globs", ["*.java", [1], ["src/*.java", None], [""], {"src": "*.java"}])
+@pytest.mark.parametrize("field", ["include_globs", "exclude_globs"])
+def test_upload_criteria_rejects_invalid_globs(client: TestClient, field, globs):
+    criteria = {"natural_language_rubric": "Test rubric", field: globs}
+    response = client.post(
+        "/assignments/Bad Globs/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 400
+    assert field in response.json()["detail"]
+
+
+def test_upload_criteria_rejects_catastrophic_regex(client: TestClient):
+    """Test that save_criteria rejects regex checks prone to catastrophic backtracking"""
+    criteria = {
+        "natural_language_rubric": "Test rubric",
+        "regex_checks": [{"pattern": "(\\s*\\w+)*;", "deduction": 5, "message": "Slow pattern"}]
+    }
+    response = client.post(
+        "/assignments/Unsafe Regex Test/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 400
+    assert "unsafe regex" in response.json()["detail"].lower()
+
+
+
+def test_upload_criteria_warns_about_patterns_that_can_span_lines(client: TestClient):
+    """Test that save_criteria saves but warns about checks that may match differently over whole files"""
+    criteria = {
+        "natural_language_rubric": "Test rubric",
+        "regex_checks": [
+            {"pattern": "catch \\([^)]*\\) \\{\\s*\\}", "deduction": 5, "message": "Empty catch block"},
+            {"pattern": "System\\.exit", "deduction": 5, "message": "Called System.exit"},
+        ]
+    }
+    response = client.post(
+        "/assignments/Regex Warning Test/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 200
+    warnings = response.json()["warnings"]
+    assert len(warnings) == 1
+    assert "catch" in warnings[0] and "span lines" in warnings[0]
+
+def test_regrading_keeps_history_and_one_latest_result(client: TestClient, fake_clone):
+    """Test that a re-grade replaces the current grade and keeps the earlier attempt as history"""
+    assignment_name = "History Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+
+    def upload(regex_checks):
+        criteria = {"natural_language_rubric": "Test rubric", "regex_checks": regex_checks}
+        client.post(
+            f"/assignments/{assignment_name}/criteria",
+            files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+        )
+
+    def grade():
+        with fake_clone({f"{assignment_name}/Main.java": "class Main { void f() { System.exit(0); } }"}), \
+             patch("google.generativeai.GenerativeModel") as mock_genai_model:
+            mock_genai_model.return_value.generate_content.return_value = MagicMock(text="Looks good")
+            return client.post(
+                "/grade",
+                json={
+                    "assignment_name": assignment_name,
+                    "repo_link": "https://github.com/historian/repo",
+                    "token": "test_token",
+                    "gemini_api_key": "test_key"
+                }
+            )
+
+    upload([])
+    assert grade().json()["grading_result"]["grade"] == 100
+    upload([{"pattern": "System\\.exit", "deduction": 15, "message": "Called System.exit"}])
+    assert grade().json()["grading_result"]["grade"] == 85
+
+    current = client.get("/grades/historian").json()
+    assert [(g["grade"], g["criteria_version"], g["is_latest"]) for g in current] == [(85, 2, True)]
+
+    history = client.get("/grades/historian/history", params={"assignment_name": assignment_name}).json()
+    assert [(g["grade"], g["criteria_version"], g["is_latest"]) for g in history] == [(85, 2, True), (100, 1, False)]
+    assert history[0]["created_at"] >= history[1]["created_at"]
+
+    stats = client.get(f"/assignments/{assignment_name}/stats").json()
+    assert stats["results"] == 1
+
+
+def test_json_output_mode_validates_and_retries(client: TestClient, fake_clone):
+    """Test that JSON mode requests schema-constrained output, retries malformed output and drops repeats"""
+    assignment_name = "JSON Output Test"
+    criteria = {"natural_language_rubric": "Test rubric", "regex_checks": [], "llm_output_mode": "json"}
+    response = client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 200
+
+    valid = {
+        "deductions": [
+            {"points": 10, "description": "Strategy interface is missing"},
+            {"points": 10, "description": "Strategy interface is missing"},
+            {"points": 5, "description": "No JavaDoc on public methods"},
+        ],
+        "summary": "Solid start, but the pattern is incomplete.",
+    }
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        generate = mock_genai_model.return_value.generate_content
+        generate.side_effect = [
+            MagicMock(text='{"deductions": [{"points": "ten"}]'),
+            MagicMock(text=json.dumps(valid)),
+        ]
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/jsonstudent/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+
+    assert response.status_code == 200
+    result = response.json()["grading_result"]
+    assert generate.call_count == 2
+    assert generate.call_args.kwargs["generation_config"]["response_mime_type"] == "application/json"
+    assert result["grade"] == 85
+    assert result["llm_deductions"] == [
+        "[-10 points] Strategy interface is missing",
+        "[-5 points] No JavaDoc on public methods",
+    ]
+    assert result["llm_feedback"] == "Solid start, but the pattern is incomplete."
+
+
+def test_invalid_llm_output_mode_is_rejected(client: TestClient):
+    criteria = {"natural_language_rubric": "Test rubric", "llm_output_mode": "yaml"}
+    response = client.post(
+        "/assignments/Bad Mode/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("cascade", [
+    "yes",
+    {"confidence_threshold": "0.9"},
+    {"confidence_threshold": 0},
+    {"confidence_threshold": 1.5},
+    {"screen_max_chars": "6000"},
+    {"screen_max_chars": 0},
+    {"screen_max_chars": 6000.5},
+    {"screen_model": ""},
+    {"grade_model": 3},
+    {"screen_modle": "gemini-1.5-flash-8b"},
+])
+def test_invalid_cascade_is_rejected(client: TestClient, cascade):
+    criteria = {"natural_language_rubric": "Test rubric", "cascade": cascade}
+    response = client.post(
+        "/assignments/Bad Cascade/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 400
+    assert "cascade" in response.json()["detail"]
+
+
+def _grade_with_cascade(client, fake_clone, assignment_name, regex_checks, responses, source="class Main {}", **cascade):
+    criteria = {
+        "natural_language_rubric": "Implement the Strategy pattern.",
+        "regex_checks": regex_checks,
+        "cascade": {"screen_model": "screen-model", "grade_model": "grade-model", "confidence_threshold": 0.8, **cascade},
+    }
+    response = client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    assert response.status_code == 200
+    with fake_clone({f"{assignment_name}/Main.java": source}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.side_effect = [MagicMock(text=text) for text in responses]
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/cascader/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+    assert response.status_code == 200
+    return response.json()["grading_result"], [c.args[0] for c in mock_genai_model.call_args_list]
+
+
+def test_cascade_accepts_a_confident_screen(client: TestClient, fake_clone):
+    """Test that a confident screening verdict skips the grading model"""
+    screen = json.dumps({"verdict": "full_marks", "confidence": 0.95, "reason": "Complete Strategy pattern."})
+    result, models_called = _grade_with_cascade(client, fake_clone, "Cascade Accept", [], [screen])
+
+    assert models_called == ["screen-model"]
+    assert result["grade"] == 100
+    assert [(t["tier"], t["model"], t["outcome"]) for t in result["llm_tiers"]] == [("screen", "screen-model", "accepted")]
+    assert result["llm_tiers"][0]["threshold"] == 0.8
+
+
+def test_cascade_escalates_an_uncertain_screen(client: TestClient, fake_clone):
+    """Test that a low-confidence screen escalates to the full rubric evaluation"""
+    screen = json.dumps({"verdict": "full_marks", "confidence": 0.5, "reason": "Probably fine."})
+    result, models_called = _grade_with_cascade(
+        client, fake_clone, "Cascade Escalate", [], [screen, "[-10 points] Context class is missing"]
+    )
+
+    assert models_called == ["screen-model", "grade-model"]
+    assert result["grade"] == 90
+    assert [(t["tier"], t["outcome"] if "outcome" in t else None) for t in result["llm_tiers"]] == [
+        ("screen", "escalated"), ("grade", None)
+    ]
+
+
+def test_cascade_escalates_full_marks_on_truncated_code(client: TestClient, fake_clone):
+    """Test that a screen which only saw part of the code cannot award full marks"""
+    screen = json.dumps({"verdict": "full_marks", "confidence": 0.99, "reason": "Looks complete."})
+    source = "class Main {\n" + "    // padding\n" * 50 + "}"
+    result, models_called = _grade_with_cascade(
+        client, fake_clone, "Cascade Truncated", [], [screen, "[-20 points] Strategy interface is missing"],
+        source=source, screen_max_chars=100,
+    )
+
+    assert models_called == ["screen-model", "grade-model"]
+    assert result["grade"] == 80
+    assert result["llm_tiers"][0]["outcome"] == "escalated"
+    assert result["llm_tiers"][0]["truncated"] is True
+
+
+def test_gemini_is_skipped_when_regex_deductions_reach_100(client: TestClient, fake_clone):
+    """Test that the Gemini evaluation is abandoned once automatic deductions take the grade to zero"""
+    import time
+    checks = [{"pattern": "class Main", "deduction": 100, "message": "Submitted the starter file unchanged"}]
+
+    def slow_screen(*args, **kwargs):
+        time.sleep(0.5)
+        return MagicMock(text=json.dumps({"verdict": "full_marks", "confidence": 0.99, "reason": "Done."}))
+
+    with patch("app.services.llm_client._model_for_key") as model_for_key:
+        model_for_key.return_value.generate_content.side_effect = slow_screen
+        result, _ = _grade_with_cascade(client, fake_clone, "Cascade Skip", checks, [])
+
+    assert result["grade"] == 0
+    assert result["llm_tiers"][-1]["outcome"] == "skipped_llm"
+    assert result["llm_feedback"].startswith("Automatic deductions already reach 100 points")
+    timings = {t["stage"]: t for t in result["stage_timings"]}
+    assert timings["llm"]["outcome"] == "abandoned"
+
+
+def test_regex_checks_and_gemini_run_concurrently(client: TestClient, fake_clone):
+    """Test that the Gemini evaluation does not wait for the regex checks"""
+    import time
+    from app.services import regex_sandbox
+    apply_regex_checks = regex_sandbox.apply_regex_checks
+
+    def slow_regex(*args, **kwargs):
+        time.sleep(0.3)
+        return apply_regex_checks(*args, **kwargs)
+
+    def slow_grade(*args, **kwargs):
+        time.sleep(0.3)
+        return MagicMock(text="[-10 points] Context class is missing")
+
+    with patch("app.services.regex_sandbox.apply_regex_checks", side_effect=slow_regex), \
+         patch("app.services.llm_client._model_for_key") as model_for_key:
+        model_for_key.return_value.generate_content.side_effect = slow_grade
+        result, _ = _grade_with_cascade(client, fake_clone, "Concurrent Stages", [], [])
+
+    assert result["grade"] == 90
+    timings = {t["stage"]: t for t in result["stage_timings"]}
+    regex_end = timings["regex"]["start_ms"] + timings["regex"]["duration_ms"]
+    llm_end = timings["llm"]["start_ms"] + timings["llm"]["duration_ms"]
+    assert timings["llm"]["start_ms"] < regex_end and timings["regex"]["start_ms"] < llm_end
+
+
+def test_files_the_regex_checks_could_not_scan_are_reported(client: TestClient, fake_clone):
+    """Test that a file lost to a regex scan error is listed in the feedback instead of silently passing"""
+    checks = [{"pattern": "class Main", "deduction": 10, "message": "Starter class"}]
+    sandbox = MagicMock()
+    sandbox.run.return_value = ({}, [], {0: "FileNotFoundError: Main.java"})
+
+    with patch("app.services.regex_sandbox.get_sandbox", return_value=sandbox):
+        result, _ = _grade_with_cascade(client, fake_clone, "Unscanned File", checks, ["not json", "Looks good."])
+
+    assert result["grade"] == 100
+    assert "SKIPPED FILES" in result["feedback"]
+    assert "Main.java: regex checks not applied: FileNotFoundError: Main.java" in result["feedback"]
+
+
+def test_rubric_sections_are_graded_concurrently_and_capped(client: TestClient, fake_clone):
+    """Test that each rubric section gets its own concurrent call and its deductions are capped at its points"""
+    import threading
+    assignment_name = "Sectioned Rubric"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    rubric_text = (
+        "Implement the Strategy pattern.\n\n"
+        "- Design (30 points): A Strategy interface with two implementations.\n"
+        "- Style (5 points): Consistent naming.\n"
+    )
+    upload = client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("rubric.txt", rubric_text.encode("utf-8"), "text/plain")}
+    )
+    assert upload.status_code == 200
+
+    both_sections_started = threading.Barrier(2, timeout=5)
+
+    def generate(prompt, **kwargs):
+        both_sections_started.wait()  # Fails with BrokenBarrierError if the sections run one after another
+        if "Evaluate ONLY this rubric section: Design" in prompt:
+            return MagicMock(text="[-10 points] Only one Strategy implementation")
+        return MagicMock(text="[-20 points] Inconsistent naming throughout")
+
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.side_effect = generate
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/sectioned/repo",
+                "token": "test_token",
+                "gemini_api_key": "sectioned_key"  # A fresh key starts at the initial concurrency of 2
+            }
+        )
+
+    assert response.status_code == 200
+    result = response.json()["grading_result"]
+    assert result["grade"] == 85
+    assert "## Design (30 points)" in result["feedback"]
+    assert "## Style (5 points)" in result["feedback"]
+    assert "Style: Inconsistent naming throughout (capped at the section's 5 points)" in result["feedback"]
+    assert sorted(t["section"] for t in result["llm_tiers"]) == ["Design", "Style"]
+
+
+def _post_grade(client: TestClient, assignment_name: str, headers: dict | None = None):
+    return client.post(
+        "/grade",
+        json={
+            "assignment_name": assignment_name,
+            "repo_link": "https://github.com/deadline/repo",
+            "token": "test_token",
+            "gemini_api_key": "test_key"
+        },
+        headers=headers or {}
+    )
+
+
+def test_grade_deadline_kills_a_hanging_clone(client: TestClient, fake_clone):
+    """Test that a grade past its X-Grade-Deadline answers 504 and kills the git process"""
+    assignment_name = "Deadline Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("rubric.txt", b"Any rubric", "text/plain")}
+    )
+
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}, delay=10) as clone:
+        response = _post_grade(client, assignment_name, headers={"X-Grade-Deadline": "0.2"})
+
+    assert response.status_code == 504
+    assert clone.processes[0].killed
+
+
+def test_gemini_calls_time_out_at_the_grade_deadline(client: TestClient, fake_clone):
+    """Test that the remaining deadline bounds each Gemini HTTP request"""
+    assignment_name = "Deadline Budget Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("rubric.txt", b"Any rubric", "text/plain")}
+    )
+
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.return_value = MagicMock(text="Looks good")
+        response = _post_grade(client, assignment_name, headers={"X-Grade-Deadline": "30"})
+
+    assert response.status_code == 200
+    timeout = mock_genai_model.return_value.generate_content.call_args.kwargs["request_options"]["timeout"]
+    assert 0 < timeout <= 30
@@ -0,0 +1,164 @@
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch, AsyncMock
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app import worker
+from app.core.config import settings
+from app.db import models
+from app.services import job_queue
+
+REQUEST = {
+    "assignment_name": "Queue Test",
+    "repo_link": "https://github.com/queued/repo",
+    "token": "test_token",
+    "gemini_api_key": "test_key"
+}
+
+
+def test_enqueue_and_get_job(client: TestClient):
+    response = client.post("/jobs", json=REQUEST)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert response.json()["status"] == "queued"
+
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert "token" not in response.json()
+
+    assert client.get("/jobs/9999").status_code == 404
+
+
+def test_credentials_are_stored_encrypted(client: TestClient, session, monkeypatch):
+    job = job_queue.enqueue(session, dict(REQUEST))
+    assert "token" not in job.payload and "gemini_api_key" not in job.payload
+    assert "test_token" not in job.secrets and "test_key" not in job.secrets
+    assert job_queue.request_payload(job) == REQUEST
+
+    monkeypatch.setattr(settings, "JOB_SECRET_KEY", None)
+    assert client.post("/jobs", json=REQUEST).status_code == 503
+
+
+def test_claim_skips_running_jobs_and_reclaims_expired_leases(session):
+    first = job_queue.enqueue(session, dict(REQUEST))
+    second = job_queue.enqueue(session, dict(REQUEST))
+
+    assert job_queue.claim(session, "worker-a").id == first.id
+    assert job_queue.claim(session, "worker-b").id == second.id
+    assert job_queue.claim(session, "worker-c") is None
+
+    # worker-a dies: once its lease expires the job is handed to another worker
+    first.lease_expires_at = job_queue.utcnow() - timedelta(seconds=1)
+    session.commit()
+    reclaimed = job_queue.claim(session, "worker-c")
+    assert reclaimed.id == first.id
+    assert reclaimed.attempts == 2
+    assert job_queue.heartbeat(session, first.id, "worker-a") is False
+    assert job_queue.heartbeat(session, first.id, "worker-c") is True
+
+
+def test_expired_job_fails_after_max_attempts(session):
+    job = job_queue.enqueue(session, dict(REQUEST))
+    job.attempts = job.max_attempts
+    job.status = "running"
+    job.lease_expires_at = job_queue.utcnow() - timedelta(seconds=1)
+    session.commit()
+
+    assert job_queue.claim(session, "worker-a") is None
+    session.refresh(job)
+    assert job.status == "failed"
+    assert "token" not in job.payload
+
+
+def test_process_job_completes_and_clears_credentials(session):
+    job_queue.enqueue(session, dict(REQUEST))
+    job = job_queue.claim(session, "worker-a")
+    result = {"message": "Assignment grading complete.", "student_id": "queued"}
+
+    with patch("app.services.grading_service.grade_assignment", new=AsyncMock(return_value=result)) as grade:
+        asyncio.run(worker.process_job(session, job, "worker-a"))
+
+    request = grade.call_args.args[0]
+    assert (request.token, request.gemini_api_key) == ("test_token", "test_key")
+    session.refresh(job)
+    assert job.status == "completed"
+    assert job.result == result
+    assert job.secrets is None
+    assert job.payload == {"assignment_name": "Queue Test", "repo_link": "https://github.com/queued/repo"}
+
+
+def test_process_job_retries_only_retryable_errors(session):
+    job_queue.enqueue(session, dict(REQUEST))
+    job = job_queue.claim(session, "worker-a")
+
+    with patch("app.services.grading_service.grade_assignment", new=AsyncMock(side_effect=RuntimeError("boom"))):
+        asyncio.run(worker.process_job(session, job, "worker-a"))
+    session.refresh(job)
+    assert job.status == "queued"
+
+    job = job_queue.claim(session, "worker-a")
+    not_found = HTTPException(status_code=404, detail="Grading criteria for 'Queue Test' not found.")
+    with patch("app.services.grading_service.grade_assignment", new=AsyncMock(side_effect=not_found)):
+        asyncio.run(worker.process_job(session, job, "worker-a"))
+    session.refresh(job)
+    assert job.status == "failed"
+    assert "not found" in job.error
+    assert session.query(models.GradingJob).count() == 1
+
+
+def test_process_job_does_not_retry_timeouts(session):
+    # A retry would get the same time budget and most likely run out of it again
+    timeouts = [
+        HTTPException(status_code=504, detail="Grading deadline exceeded"),
+        HTTPException(status_code=408, detail="Repository clone timeout"),
+        TimeoutError(),
+    ]
+    for error in timeouts:
+        job_queue.enqueue(session, dict(REQUEST))
+        job = job_queue.claim(session, "worker-a")
+        with patch("app.services.grading_service.grade_assignment", new=AsyncMock(side_effect=error)):
+            asyncio.run(worker.process_job(session, job, "worker-a"))
+        session.refresh(job)
+        assert job.status == "failed"
+        assert job.attempts == 1
+
+
+def test_cancel_job(client: TestClient, session):
+    job_id = client.post("/jobs", json=REQUEST).json()["job_id"]
+
+    response = client.delete(f"/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert job_queue.claim(session, "worker-a") is None
+    job = session.get(models.GradingJob, job_id)
+    session.refresh(job)
+    assert "token" not in job.payload
+
+    assert client.delete(f"/jobs/{job_id}").status_code == 200
+    assert client.delete("/jobs/9999").status_code == 404
+
+    job.status = "completed"
+    session.commit()
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+
+
+def test_worker_stops_a_cancelled_running_job(session):
+    from tests.conftest import TestingSessionLocal
+    job_queue.enqueue(session, dict(REQUEST))
+    job = job_queue.claim(session, "worker-a")
+
+    async def hang(request, db):
+        cancel_db = TestingSessionLocal()
+        job_queue.cancel(cancel_db, cancel_db.get(models.GradingJob, job.id))
+        cancel_db.close()
+        await asyncio.sleep(10)
+
+    with patch("app.worker.SessionLocal", TestingSessionLocal), \
+         patch("app.worker.settings.JOB_CANCEL_POLL_SECONDS", 0.05), \
+         patch("app.services.grading_service.grade_assignment", new=hang):
+        asyncio.run(asyncio.wait_for(worker.process_job(session, job, "worker-a"), timeout=5))
+
+    session.refresh(job)
+    assert job.status == "cancelled"
+    assert job.result is None
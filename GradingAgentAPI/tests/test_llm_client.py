@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from google.api_core import exceptions as google_exceptions
+from app.services import llm_client
+from app.services.llm_client import AIMDLimiter
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    limiter = AIMDLimiter("test", initial=2.0)
+    for _ in range(10):
+        limiter.on_success(0.5)
+    assert 4.0 < limiter.limit < 5.0
+
+    increased = limiter.limit
+    limiter.on_rate_limited()
+    assert limiter.limit == increased / 2
+
+    # A burst of 429s from the same round trip only halves the limit once
+    limiter.on_rate_limited()
+    assert limiter.limit == increased / 2
+
+
+def test_latency_growth_reduces_limit():
+    limiter = AIMDLimiter("test", initial=8.0)
+    limiter.on_success(0.2)
+    limiter._last_decrease = -100
+    for _ in range(5):
+        limiter.on_success(2.0)
+    assert limiter.limit < 8.0
+
+
+def test_limiter_caps_concurrency():
+    async def scenario():
+        limiter = AIMDLimiter("test", initial=2.0)
+        await limiter.acquire()
+        await limiter.acquire()
+        third = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not third.done()
+        limiter.release()
+        await third
+        assert limiter.inflight == 2
+
+    asyncio.run(scenario())
+
+
+def test_generate_retries_rate_limits(client: TestClient):
+    model = MagicMock()
+    model.generate_content.side_effect = [google_exceptions.ResourceExhausted("quota"), MagicMock(text="ok")]
+
+    with patch("google.generativeai.GenerativeModel", return_value=model), \
+         patch("app.services.llm_client.settings.LLM_BACKOFF_SECONDS", 0):
+        response, stats = asyncio.run(llm_client.generate("capacity-test-key", "gemini-1.5-flash", "prompt"))
+
+    assert response.text == "ok"
+    assert stats["retries"] == 1
+
+    capacity = client.get("/llm/capacity").json()
+    entry = next(c for c in capacity if c["key_id"] == llm_client.key_id("capacity-test-key"))
+    assert entry["rate_limited"] == 1
+    assert entry["successes"] == 1
+    assert "capacity-test-key" not in str(capacity)
+
+
+def test_cancelled_calls_release_their_slots():
+    """Test that calls cancelled mid-flight or while queued do not leak limiter slots"""
+    unblock = threading.Event()
+    model = MagicMock()
+    model.generate_content.side_effect = lambda *args, **kwargs: unblock.wait(5) and MagicMock(text="late")
+
+    async def scenario():
+        limiter = llm_client.get_limiter("cancel-test-key")
+        limiter.limit = 2.0
+        calls = [asyncio.create_task(llm_client.generate("cancel-test-key", "gemini-1.5-flash", "prompt")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert limiter.inflight == 2
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        inflight = limiter.inflight
+
+        model.generate_content.side_effect = None
+        model.generate_content.return_value = MagicMock(text="ok")
+        try:
+            response, _ = await asyncio.wait_for(
+                llm_client.generate("cancel-test-key", "gemini-1.5-flash", "prompt"), timeout=2
+            )
+        finally:
+            unblock.set()
+        return inflight, response
+
+    with patch("google.generativeai.GenerativeModel", return_value=model):
+        inflight, response = asyncio.run(scenario())
+
+    assert inflight == 0
+    assert response.text == "ok"
+
+
+def test_untested_sdk_version_is_refused():
+    model = MagicMock()
+    with patch("google.generativeai.__version__", "0.9.0"), pytest.raises(RuntimeError, match="0.9.0"):
+        llm_client._bind_client(model, MagicMock())
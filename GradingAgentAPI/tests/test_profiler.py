@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.db import models
+from app.services import profiler
+
+ADMIN = {"X-Admin-Token": "admin-secret"}
+
+
+def _busy_grade(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        sum(range(1000))
+
+
+def test_profile_records_folded_stacks_and_peak_memory(session):
+    async def grade():
+        await asyncio.to_thread(_busy_grade, 0.2)
+        blob = bytearray(4 * 1024 * 1024)
+        return {"grade": len(blob) and 90}
+
+    with patch("app.services.profiler.settings.PROFILE_SAMPLE_INTERVAL_SECONDS", 0.005):
+        result = asyncio.run(profiler.profiled(session, "Unit", grade()))
+
+    assert result["grade"] == 90
+    record = session.get(models.Profile, result["profile_id"])
+    assert record.samples > 5
+    assert "_busy_grade" in record.folded
+    assert record.peak_memory_bytes >= 4 * 1024 * 1024
+    assert record.error is None
+
+    svg = profiler.render_svg(record.folded)
+    assert svg.startswith("<svg") and "_busy_grade" in svg
+
+
+def test_failed_grades_are_still_profiled(session):
+    async def grade():
+        raise RuntimeError("clone hung")
+
+    try:
+        asyncio.run(profiler.profiled(session, "Failing", grade()))
+    except RuntimeError:
+        pass
+    record = session.query(models.Profile).filter(models.Profile.label == "Failing").one()
+    assert record.error == "RuntimeError: clone hung"
+
+
+def test_profiling_requires_the_admin_token(client: TestClient):
+    body = {
+        "assignment_name": "Profiled",
+        "repo_link": "https://github.com/profiled/repo",
+        "token": "test_token",
+        "gemini_api_key": "test_key"
+    }
+    assert client.post("/grade", json=body, headers={"X-Debug-Profile": "1"}).status_code == 403
+    assert client.get("/debug/profiles/1").status_code == 403
+    with patch("app.api.deps.settings.ADMIN_TOKEN", "admin-secret"):
+        assert client.post("/jobs", json=body, headers={"X-Debug-Profile": "1", "X-Admin-Token": "wrong"}).status_code == 403
+        response = client.post("/jobs", json=body, headers={"X-Debug-Profile": "1", **ADMIN})
+        assert response.status_code == 200
+        assert client.get(f"/jobs/{response.json()['job_id']}").json()["profile"] is True
+
+
+def test_profiled_grade_is_retrievable_as_a_flamegraph(client: TestClient, fake_clone):
+    assignment_name = "Profiled Grade"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    criteria = {"natural_language_rubric": "Any rubric", "regex_checks": []}
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("app.api.deps.settings.ADMIN_TOKEN", "admin-secret"), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.return_value = MagicMock(text="Looks good")
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": "https://github.com/profiled/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            },
+            headers={"X-Debug-Profile": "true", **ADMIN}
+        )
+        assert response.status_code == 200
+        profile_id = response.json()["profile_id"]
+
+        summary = client.get(f"/debug/profiles/{profile_id}", headers=ADMIN).json()
+        folded = client.get(f"/debug/profiles/{profile_id}?format=folded", headers=ADMIN)
+        svg = client.get(f"/debug/profiles/{profile_id}?format=svg", headers=ADMIN)
+        listed = client.get("/debug/profiles", headers=ADMIN).json()
+        missing = client.get("/debug/profiles/9999", headers=ADMIN)
+
+    assert summary["label"] == f"{assignment_name}: https://github.com/profiled/repo"
+    assert summary["peak_memory_bytes"] > 0
+    assert folded.headers["content-type"].startswith("text/plain")
+    assert svg.headers["content-type"] == "image/svg+xml"
+    assert any(p["id"] == profile_id for p in listed)
+    assert missing.status_code == 404
@@ -0,0 +1,49 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.db import models
+from app.db.session import redact
+
+
+def _add_results(session, assignment_name: str, students: int):
+    assignment = models.Assignment(name=assignment_name)
+    session.add(assignment)
+    session.flush()
+    for i in range(students):
+        session.add(models.GradingResult(
+            assignment_id=assignment.id, student_id=f"student{i}", grade=90, feedback="ok", is_latest=True
+        ))
+    session.commit()
+
+
+def test_redact_masks_literals():
+    statement = "SELECT * FROM grading_results WHERE student_id = 'alice' AND grade > 90 AND id = %(id_1)s"
+    assert redact(statement) == "SELECT * FROM grading_results WHERE student_id = '?' AND grade > ? AND id = %(id_1)s"
+
+
+def test_grade_listing_query_count_does_not_grow_with_results(client: TestClient, session):
+    with patch("app.api.query_metrics.settings.DB_DEBUG_HEADERS", True):
+        _add_results(session, "Few Results", 1)
+        few = client.get("/grades")
+        _add_results(session, "Many Results", 5)
+        many = client.get("/grades")
+
+    assert len(many.json()) == len(few.json()) + 5
+    assert int(few.headers["X-DB-Queries"]) > 0
+    assert many.headers["X-DB-Queries"] == few.headers["X-DB-Queries"]
+    assert float(many.headers["X-DB-Time-Ms"]) >= 0
+
+
+def test_headers_are_off_by_default(client: TestClient):
+    assert "X-DB-Queries" not in client.get("/grades").headers
+
+
+def test_metrics_report_routes_and_slow_queries_without_parameters(client: TestClient):
+    with patch("app.db.session.settings.SLOW_QUERY_MS", 0):
+        client.get("/grades/alice-secret")
+    metrics = client.get("/metrics").json()
+
+    assert metrics["routes"]["GET /grades/{student_name}"]["requests"] >= 1
+    assert metrics["db"]["slow_queries"] >= 1
+    slow = [q for q in metrics["db"]["recent_slow"] if q["route"] == "GET /grades/{student_name}"]
+    assert slow
+    assert all("alice-secret" not in str(q) for q in metrics["db"]["recent_slow"])
@@ -0,0 +1,91 @@
+from fastapi.testclient import TestClient
+from app.api.conditional import etag_matches
+from app.db import models
+
+
+def _add_result(session, student_id: str, feedback: str = "GRADE: 90/100", assignment_name: str = "Read Lab") -> models.GradingResult:
+    assignment = session.query(models.Assignment).filter_by(name=assignment_name).first()
+    if assignment is None:
+        assignment = models.Assignment(name=assignment_name)
+        session.add(assignment)
+    result = models.GradingResult(assignment=assignment, student_id=student_id, grade=90, feedback=feedback)
+    session.add(result)
+    session.commit()
+    return result
+
+
+def test_repeat_poll_returns_304_until_results_change(client: TestClient, session):
+    _add_result(session, "alice")
+
+    first = client.get("/grades/alice")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+
+    repeat = client.get("/grades/alice", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat.headers["etag"] == etag
+
+    # Another student's new result does not invalidate alice's listing
+    _add_result(session, "bob")
+    assert client.get("/grades/alice", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/grades", headers={"If-None-Match": etag}).status_code == 200
+
+    _add_result(session, "alice", assignment_name="Read Lab 2")
+    changed = client.get("/grades/alice", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+    assert changed.headers["etag"] != etag
+
+
+def test_updating_a_result_changes_the_etag(client: TestClient, session):
+    result = _add_result(session, "carol")
+    etag = client.get("/grades/carol").headers["etag"]
+
+    result.grade = 70
+    result.feedback = "GRADE: 70/100"
+    session.commit()
+
+    response = client.get("/grades/carol", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["grade"] == 70
+
+
+def test_large_listings_are_gzipped(client: TestClient, session):
+    _add_result(session, "dave", feedback="Detailed feedback. " * 500)
+
+    response = client.get("/grades/dave", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()[0]["student_id"] == "dave"
+
+    # One validator for both encodings must be weak, and it matches whichever copy the client holds
+    identity = client.get("/grades/dave", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] == response.headers["etag"]
+    assert identity.headers["etag"].startswith('W/"')
+    assert client.get("/grades/dave", headers={"If-None-Match": identity.headers["etag"]}).status_code == 304
+
+
+def test_listings_keep_the_schema_shape(client: TestClient, session):
+    result = _add_result(session, "erin")
+
+    [row] = client.get("/grades/erin").json()
+    assert row == {
+        "id": result.id, "assignment_name": "Read Lab", "student_id": "erin", "grade": 90.0,
+        "feedback": "GRADE: 90/100", "created_at": result.created_at.isoformat(),
+        "criteria_version": None, "is_latest": True,
+    }
+    history = client.get("/grades/erin/history").json()
+    assert history == [row]
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -0,0 +1,170 @@
+import re
+from app.services import regex_checks
+
+CHECKS = [
+    {"pattern": "Arrays\\.binarySearch", "deduction": 50, "message": "Used built-in binary search"},
+    {"pattern": "^import java\\.util\\.\\*;$", "deduction": 2, "message": "Wildcard import"},
+    {"pattern": "System\\.exit", "deduction": 5, "message": "Called System.exit"},
+    {"pattern": "", "deduction": 5, "message": "Incomplete check is ignored"},
+]
+
+SOURCE = """package search;
+import java.util.*;
+
+public class Search {
+    int find(int[] values, int key) {
+        return Arrays.binarySearch(values, key);
+    }
+
+    int again(int[] values, int key) {
+        return Arrays.binarySearch(values, key);
+    }
+}
+"""
+
+
+def test_scan_buffer_reports_first_match_line():
+    """Test that each check reports the line of its first match only"""
+    compiled = regex_checks.compile_checks(CHECKS)
+
+    assert len(compiled) == 3
+    assert regex_checks.scan_buffer(SOURCE.encode("utf-8"), compiled) == [(0, 6), (1, 2)]
+    assert regex_checks.scan_buffer(b"", compiled) == []
+
+
+def test_line_numbers_across_chunks(monkeypatch):
+    monkeypatch.setattr(regex_checks, "_COUNT_CHUNK", 7)
+    buffer = b"\n".join(b"line %d" % i for i in range(1, 101))
+    offsets = [buffer.index(b"line 1\n"), buffer.index(b"line 42"), buffer.index(b"line 100")]
+    assert regex_checks._line_numbers(buffer, offsets) == {offsets[0]: 1, offsets[1]: 42, offsets[2]: 100}
+
+
+def test_sandbox_matches_disk_and_memory(tmp_path):
+    """Test that memory-mapped files, file contents and empty files are scanned alike by the sandbox"""
+    from app.services import regex_sandbox
+
+    path = tmp_path / "Search.java"
+    path.write_text(SOURCE)
+    empty = tmp_path / "Empty.java"
+    empty.write_text("")
+
+    from_disk = regex_sandbox.apply_regex_checks([
+        {"path": "Search.java", "abs_path": str(path), "content": SOURCE},
+        {"path": "Empty.java", "abs_path": str(empty), "content": ""},
+    ], CHECKS)
+    from_memory = regex_sandbox.apply_regex_checks([{"path": "Search.java", "content": SOURCE}], CHECKS)
+
+    assert from_disk == from_memory
+    records, total, timed_out, unscanned = from_disk
+    assert [regex_checks.format_deduction(r) for r in records] == [
+        "[-50 points] Used built-in binary search (in Search.java:6)",
+        "[-2 points] Wildcard import (in Search.java:2)",
+    ]
+    assert (total, timed_out, unscanned) == (52, [], [])
+
+
+def test_static_check_rejects_catastrophic_patterns():
+    from app.services.regex_sandbox import find_catastrophic_construct
+
+    assert find_catastrophic_construct("(a+)+$")
+    assert find_catastrophic_construct("(\\w*)*x")
+    assert find_catastrophic_construct("(a|ab)*c")
+    assert find_catastrophic_construct("(x|x)+")
+    assert find_catastrophic_construct("Arrays\\.binarySearch") is None
+    assert find_catastrophic_construct("^import java\\.util\\.\\*;$") is None
+    assert find_catastrophic_construct("(public|private)\\s+static") is None
+    assert find_catastrophic_construct("(?:ab|cd)*") is None
+
+
+def test_static_check_allows_quantifiers_separated_by_a_literal():
+    from app.services.regex_sandbox import find_catastrophic_construct
+
+    assert find_catastrophic_construct("(?:\\w+\\.)*binarySearch") is None
+    assert find_catastrophic_construct("\\w+(?:\\s*,\\s*\\w+)*;") is None
+    # The separator must be mandatory and something the inner quantifier cannot match
+    assert find_catastrophic_construct("(?:\\w+,?)*;")
+    assert find_catastrophic_construct("(.*,)*x")
+    assert find_catastrophic_construct("(?i)(?:[a-z]+A)*")
+    assert find_catastrophic_construct("(?:(a+)+\\.)*")
+
+
+
+def test_patterns_whose_matches_may_change_are_flagged():
+    from app.services.regex_sandbox import find_line_semantics_changes
+
+    assert find_line_semantics_changes("Arrays\\.binarySearch") == []
+    assert find_line_semantics_changes("^import java\\.util\\.\\*;$") == []
+    assert find_line_semantics_changes("catch \\([^)\\n]*\\) \\{\\s*\\}") != []
+    assert find_line_semantics_changes("catch \\([^)\\n]*\\) \\{ *\\}") == []
+    assert find_line_semantics_changes("[^\\s]+\\.exit") == []
+    assert find_line_semantics_changes("catch \\([^)]*\\)") != []
+    assert find_line_semantics_changes("(?s)a.*b") != []
+    assert find_line_semantics_changes("a(?s:.*)b") != []
+    assert "non-ASCII" in find_line_semantics_changes("caf[éè]")[0]
+
+
+def test_unflagged_patterns_match_the_same_lines_as_before():
+    from app.services.regex_sandbox import find_line_semantics_changes
+
+    patterns = [
+        "Arrays\\.binarySearch", "^import java\\.util\\.\\*;$", "System\\.exit", "return \\w+\\.\\w+\\(",
+        "int \\w+\\(int\\[\\] \\w+", "key\\);$", "^}", "values, key",
+    ]
+    checks = [{"pattern": pattern, "deduction": 1, "message": pattern} for pattern in patterns]
+    compiled = regex_checks.compile_checks(checks)
+    hits = dict(regex_checks.scan_buffer(SOURCE.encode("utf-8"), compiled))
+
+    for index, pattern in enumerate(patterns):
+        assert find_line_semantics_changes(pattern) == []
+        # How checks were applied before: str patterns searched one line at a time
+        lines = [number for number, line in enumerate(SOURCE.split("\n"), 1) if re.search(pattern, line)]
+        assert hits.get(index) == (lines[0] if lines else None), pattern
+
+def test_sandbox_times_out_slow_check():
+    """Test that a backtracking pattern is stopped by its budget and the other checks still run"""
+    from app.services.regex_sandbox import RegexSandbox
+
+    checks = [
+        {"pattern": "(a+)+$", "deduction": 5, "message": "Catastrophic"},
+        {"pattern": "class", "deduction": 1, "message": "Has a class"},
+    ]
+    content = b"class A {}\n" + b"a" * 40 + b"!"
+    sandbox = RegexSandbox(1)
+
+    results, timed_out, errors = sandbox.run(checks, [("A.java", "bytes", content)], budget=0.5)
+
+    assert timed_out == [0]
+    assert errors == {}
+    assert results == {"A.java": [(1, 1)]}
+
+    # The replacement worker keeps serving requests
+    results, timed_out, errors = sandbox.run(checks[1:], [("B.java", "bytes", b"\n\nclass B {}")], budget=0.5)
+    assert (results, timed_out, errors) == ({"B.java": [(0, 3)]}, [], {})
+
+
+def test_unreadable_files_are_errors_not_timeouts(tmp_path):
+    """Test that a missing file or corrupt blob is reported without disabling the check"""
+    from app.services.regex_sandbox import RegexSandbox
+
+    checks = [{"pattern": "class", "deduction": 1, "message": "Has a class"}]
+    sandbox = RegexSandbox(1)
+    items = [
+        ("missing", "path", str(tmp_path / "Missing.java")),
+        ("corrupt", "zlib", b"not zlib data"),
+        ("ok", "bytes", b"class A {}"),
+    ]
+
+    results, timed_out, errors = sandbox.run(checks, items, budget=2)
+
+    assert timed_out == []
+    assert set(errors) == {"missing", "corrupt"}
+    assert errors["missing"].startswith("FileNotFoundError")
+    assert errors["corrupt"].startswith("error")  # zlib.error
+    assert results["ok"] == [(0, 1)]
+
+
+def test_sandbox_workers_are_not_forked():
+    """Test that workers are not forked from the multithreaded API process"""
+    from app.services import regex_sandbox
+
+    assert regex_sandbox._ctx.get_start_method() in ("forkserver", "spawn")
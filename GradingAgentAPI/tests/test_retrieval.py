@@ -0,0 +1,101 @@
+from app.services import retrieval
+from app.services.grading_service import _code_contexts, _prepare_code_for_gemini
+
+BINARY_SEARCH = '''package demo;
+
+/**
+ * Searches sorted arrays.
+ */
+public class BinarySearch {
+    private static final String BRACES = "{ not a block }";
+
+    /**
+     * Finds the target in a sorted array.
+     * @param arr sorted array
+     */
+    public int search(int[] arr, int target) {
+        if (arr == null || arr.length == 0) {
+            return -1;
+        }
+        return searchRange(arr, target, 0, arr.length - 1);
+    }
+
+    @Override
+    public String toString() { return "BinarySearch"; }
+
+    static class Node implements Comparable<Node> {
+        int value;
+        public int compareTo(Node other) {
+            Comparator<Node> c = new Comparator<Node>() { public int compare(Node a, Node b) { return 0; } };
+            return Integer.compare(value, other.value);
+        }
+    }
+}
+'''
+
+
+def _filler(name: str, methods: int = 30) -> dict:
+    body = "".join(
+        f"    public int step{i}(int value) {{\n        int result = value * {i};\n        return result + {i};\n    }}\n\n"
+        for i in range(methods)
+    )
+    return {"path": f"{name}.java", "content": f"public class {name} {{\n{body}}}\n"}
+
+
+def test_chunk_java_splits_classes_and_methods():
+    chunks = retrieval.chunk_java("BinarySearch.java", BINARY_SEARCH)
+    assert [c["name"] for c in chunks] == [
+        "BinarySearch", "BinarySearch.search", "BinarySearch.toString", "BinarySearch.Node", "BinarySearch.Node.compareTo"
+    ]
+    declaration, search = chunks[0], chunks[1]
+    assert "BRACES" in declaration["text"] and "searchRange" not in declaration["text"]
+    assert search["text"].startswith("    /**\n     * Finds the target")  # Javadoc travels with its method
+    assert (search["start_line"], search["end_line"]) == (9, 18)
+    assert "compare(Node a, Node b)" in chunks[4]["text"]  # Anonymous classes stay inside their method
+
+
+def test_unbalanced_java_falls_back_to_line_windows():
+    file = {"path": "Broken.java", "content": "public class Broken {\n" + "int x;\n" * 50}
+    assert retrieval.chunk_java(file["path"], file["content"]) is None
+    assert [c["name"] for c in retrieval.chunk_file(file)] == ["lines 1-40", "lines 41-51"]
+
+
+def test_bm25_prefers_rarer_terms():
+    index = retrieval.BM25Index([["edge", "case", "array"], ["array", "loop"], ["array", "loop", "loop"]])
+    scores = index.scores(["edge", "array"])
+    assert scores[0] > scores[1] > 0
+    assert index.scores(["missing"]) == [0.0, 0.0, 0.0]
+
+
+def test_oversized_submission_sends_the_most_relevant_chunks():
+    files = [_filler("Alpha"), {"path": "BinarySearch.java", "content": BINARY_SEARCH}, _filler("Omega")]
+    budget = 2000
+
+    walk_order = _prepare_code_for_gemini(files, max_chars=budget)
+    assert "public int search" not in walk_order
+
+    context = _prepare_code_for_gemini(files, max_chars=budget, query="Edge cases: empty or null arrays")
+    assert len(context) <= budget
+    assert "FILE: BinarySearch.java (relevant excerpts)" in context
+    assert "// --- BinarySearch.search (lines 9-18) ---" in context
+    assert "step0" not in context
+    assert "other code excerpts omitted" in context
+
+
+def test_small_submissions_are_sent_whole():
+    files = [{"path": "BinarySearch.java", "content": BINARY_SEARCH}]
+    context = _prepare_code_for_gemini(files, query="JavaDoc comments")
+    assert "FILE: BinarySearch.java\n" in context and "relevant excerpts" not in context
+
+
+def test_each_rubric_section_gets_its_own_excerpts(monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.LLM_CODE_MAX_CHARS", 1500)
+    files = [_filler("Alpha"), {"path": "BinarySearch.java", "content": BINARY_SEARCH}]
+    sections = {"context": "", "sections": [
+        {"name": "Documentation", "points": 10, "description": "JavaDoc comments on public methods"},
+        {"name": "Ordering", "points": 10, "description": "Node implements Comparable with compareTo"},
+    ]}
+
+    _, (documentation, ordering) = _code_contexts(files, None, "Binary search", sections)
+    assert "BinarySearch.search" in documentation
+    assert "BinarySearch.Node.compareTo" in ordering and "BinarySearch.search" not in ordering
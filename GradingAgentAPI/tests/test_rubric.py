@@ -0,0 +1,68 @@
+import json
+import os
+import pytest
+from fastapi import HTTPException
+from app.services import rubric
+
+EXAMPLE_CRITERIA = os.path.join(os.path.dirname(__file__), "..", "..", "example_criteria.json")
+
+
+def test_parse_sections_from_example_rubric():
+    with open(EXAMPLE_CRITERIA) as f:
+        text = json.load(f)["natural_language_rubric"]
+    sections, context = rubric.parse_sections(text)
+
+    assert [(s["name"], s["points"]) for s in sections] == [
+        ("Binary Search Implementation", 40),
+        ("Recursive vs Iterative", 10),
+        ("Edge Cases", 20),
+        ("Code Quality", 15),
+        ("Comments and Documentation", 10),
+        ("Time Complexity", 5),
+    ]
+    assert sections[2]["description"].startswith("The implementation should handle edge cases")
+    assert "implement a binary search algorithm" in context
+    assert "Total" not in context
+
+
+@pytest.mark.parametrize("total_line", ["Total (100 points)", "- Total (100 pts)", "Grand Total (100 points)", "Total: 100 points"])
+def test_total_line_is_not_a_section(total_line):
+    text = f"Grade the code.\n- Design (60 points): Strategy pattern\n- Style (40 points): Naming\n{total_line}"
+    sections, context = rubric.parse_sections(text)
+
+    assert [(s["name"], s["points"]) for s in sections] == [("Design", 60), ("Style", 40)]
+    assert sections[1]["description"] == "Naming"
+    assert "Total" not in context
+
+
+def test_parse_sections_needs_at_least_two_sections():
+    text = "Grade the code.\n1. Style (10 pts) - naming"
+    assert rubric.parse_sections(text) == ([], text)
+
+
+def test_continuation_lines_belong_to_their_section():
+    sections, _ = rubric.parse_sections("1) Design (30 points)\nUses the Strategy pattern.\n\n2) Tests (20 pts): JUnit")
+    assert sections == [
+        {"name": "Design", "points": 30, "description": "Uses the Strategy pattern."},
+        {"name": "Tests", "points": 20, "description": "JUnit"},
+    ]
+
+
+def test_cap_deductions_bounds_a_section():
+    section = {"name": "Edge Cases", "points": 20, "description": ""}
+    records = [
+        {"source": "llm", "points": 15, "message": "Empty array", "file": None, "line": None},
+        {"source": "llm", "points": 10, "message": "Missing element", "file": None, "line": None},
+        {"source": "llm", "points": 5, "message": "Single element", "file": None, "line": None},
+    ]
+    capped = rubric.cap_deductions(records, section)
+    assert [(r["points"], r["message"]) for r in capped] == [
+        (15, "Edge Cases: Empty array"),
+        (5, "Edge Cases: Missing element (capped at the section's 20 points)"),
+    ]
+
+
+def test_validate_sections_rejects_missing_points():
+    with pytest.raises(HTTPException) as error:
+        rubric.validate_sections([{"name": "Design"}])
+    assert error.value.status_code == 400
@@ -0,0 +1,102 @@
+from fastapi.testclient import TestClient
+from app.db import models
+from app.services import similarity
+
+BINARY_SEARCH = """
+/** Binary search over a sorted array. */
+public class BinarySearch {
+    public static int search(int[] values, int target) {
+        int low = 0;
+        int high = values.length - 1;
+        while (low <= high) {
+            int mid = (low + high) / 2;
+            if (values[mid] == target) {
+                return mid;
+            } else if (values[mid] < target) {
+                low = mid + 1;
+            } else {
+                high = mid - 1;
+            }
+        }
+        return -1;
+    }
+}
+"""
+
+# Same structure with renamed identifiers and different comments
+RENAMED = """
+// my own work
+public class Finder {
+    public static int find(int[] arr, int key) {
+        int lo = 0;
+        int hi = arr.length - 1;
+        while (lo <= hi) {
+            int m = (lo + hi) / 2;
+            if (arr[m] == key) {
+                return m;
+            } else if (arr[m] < key) {
+                lo = m + 1;
+            } else {
+                hi = m - 1;
+            }
+        }
+        return -1;
+    }
+}
+"""
+
+UNRELATED = """
+import java.util.ArrayList;
+import java.util.List;
+
+public class Library {
+    private final List<String> titles = new ArrayList<>();
+
+    public void add(String title) {
+        titles.add(title);
+    }
+
+    @Override
+    public String toString() {
+        StringBuilder builder = new StringBuilder("Library:");
+        for (String title : titles) {
+            builder.append(" ").append(title);
+        }
+        return builder.toString();
+    }
+}
+"""
+
+
+def test_normalization_ignores_identifiers_and_comments():
+    assert similarity.normalize_tokens(BINARY_SEARCH) == similarity.normalize_tokens(RENAMED)
+
+
+def test_similar_pairs_from_lsh_index(client: TestClient, session):
+    """Test that renamed copies are reported and unrelated submissions are not"""
+    assignment = models.Assignment(name="Similarity Test")
+    session.add(assignment)
+    session.commit()
+
+    similarity.index_submission(session, assignment.id, "alice", [{"path": "BinarySearch.java", "content": BINARY_SEARCH}])
+    similarity.index_submission(session, assignment.id, "bob", [{"path": "Finder.java", "content": RENAMED}])
+    similarity.index_submission(session, assignment.id, "carol", [{"path": "Library.java", "content": UNRELATED}])
+    session.commit()
+
+    response = client.get("/assignments/Similarity Test/similar", params={"threshold": 0.8})
+    assert response.status_code == 200
+    assert response.json()["pairs"] == [{"student_a": "alice", "student_b": "bob", "similarity": 1.0}]
+
+
+def test_reindexing_replaces_previous_fingerprint(session):
+    assignment = models.Assignment(name="Reindex Test")
+    session.add(assignment)
+    session.commit()
+
+    similarity.index_submission(session, assignment.id, "alice", [{"path": "A.java", "content": BINARY_SEARCH}])
+    session.commit()
+    similarity.index_submission(session, assignment.id, "alice", [{"path": "A.java", "content": UNRELATED}])
+    session.commit()
+
+    assert session.query(models.SimilarityFingerprint).count() == 1
+    assert session.query(models.LshBucket).count() == similarity.BANDS
@@ -0,0 +1,137 @@
+import asyncio
+from unittest.mock import patch, MagicMock
+from fastapi import HTTPException
+from app.db import models
+from app.schemas.grading import GradingRequest
+from app.services import grading_service
+from app.services import single_flight
+from app.services.single_flight import SingleFlight, lock_key
+
+
+def test_concurrent_duplicates_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def grade(label):
+            calls.append(label)
+            await asyncio.sleep(0.01)
+            return {"grade": 90, "by": label}
+
+        results = await asyncio.gather(
+            flight.do("repo-a", lambda: grade("first")),
+            flight.do("repo-a", lambda: grade("retry")),
+            flight.do("repo-b", lambda: grade("other")),
+        )
+        return calls, results, flight.inflight()
+
+    calls, results, inflight = asyncio.run(scenario())
+    assert calls == ["first", "other"]
+    assert results[0] is results[1]
+    assert results[2]["by"] == "other"
+    assert inflight == 0
+
+
+def test_duplicates_share_the_leaders_error():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def clone_fails():
+            await asyncio.sleep(0.01)
+            raise HTTPException(status_code=400, detail="Failed to clone repository")
+
+        return await asyncio.gather(
+            flight.do("key", clone_fails), flight.do("key", clone_fails), return_exceptions=True
+        )
+
+    errors = asyncio.run(scenario())
+    assert [e.status_code for e in errors] == [400, 400]
+
+
+def test_waiter_takes_over_when_the_leader_is_cancelled():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def grade(label):
+            calls.append(label)
+            await asyncio.sleep(0.01)
+            return label
+
+        leader = asyncio.create_task(flight.do("key", lambda: grade("leader")))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", lambda: grade("follower")))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return calls, await follower
+
+    calls, result = asyncio.run(scenario())
+    assert calls == ["leader", "follower"]
+    assert result == "follower"
+
+
+def test_lock_key_is_a_stable_signed_bigint():
+    key = lock_key("https://github.com/student/repo", "Lab 1", 2)
+    assert key == lock_key("https://github.com/student/repo", "Lab 1", 2)
+    assert key != lock_key("https://github.com/student/repo", "Lab 1", 3)
+    assert -2 ** 63 <= key < 2 ** 63
+
+
+def _postgres_session(attempts):
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    db.execute.return_value.scalar.side_effect = attempts
+    return db
+
+
+def test_advisory_lock_polls_until_it_is_free():
+    db = _postgres_session([False, False, True])
+    with patch.object(single_flight, "_LOCK_POLL_INITIAL_SECONDS", 0.001):
+        assert asyncio.run(single_flight.advisory_xact_lock(db, 42)) is True
+    assert db.execute.call_count == 3
+    assert "pg_try_advisory_xact_lock" in str(db.execute.call_args.args[0])
+
+
+def test_advisory_lock_wait_can_be_abandoned():
+    db = _postgres_session(lambda: False)
+
+    async def scenario():
+        with patch.object(single_flight, "_LOCK_POLL_INITIAL_SECONDS", 0.001):
+            try:
+                await asyncio.wait_for(single_flight.advisory_xact_lock(db, 42), timeout=0.05)
+            except asyncio.TimeoutError:
+                return True
+        return False
+
+    assert asyncio.run(scenario())
+    assert db.execute.call_count >= 2
+
+
+def test_grade_assignment_coalesces_duplicate_requests(session):
+    assignment = models.Assignment(name="Coalesce Lab")
+    assignment.criteria = models.Criteria(natural_language_rubric="Rubric", regex_checks=[], version=1)
+    session.add(assignment)
+    session.commit()
+
+    request = GradingRequest(
+        repo_link="https://github.com/student/repo",
+        assignment_name="Coalesce Lab",
+        token="token",
+        gemini_api_key="key",
+    )
+
+    async def slow_grade(*args):
+        await asyncio.sleep(0.01)
+        return {"message": "Assignment grading complete."}
+
+    async def scenario():
+        return await asyncio.gather(
+            grading_service.grade_assignment(request, session),
+            grading_service.grade_assignment(request, session),
+        )
+
+    with patch("app.services.grading_service._grade_submission", side_effect=slow_grade) as grade:
+        first, second = asyncio.run(scenario())
+
+    assert grade.call_count == 1
+    assert first is second
@@ -0,0 +1,55 @@
+from fastapi.testclient import TestClient
+from app.db import models
+from app.services import snapshots
+
+
+def _graded_result(session, student_id, source_files):
+    assignment = session.query(models.Assignment).filter(models.Assignment.name == "Snapshot Test").first()
+    if not assignment:
+        assignment = models.Assignment(name="Snapshot Test")
+        session.add(assignment)
+        session.commit()
+    result = models.GradingResult(assignment_id=assignment.id, student_id=student_id, grade=100, feedback="")
+    snapshots.store_snapshot(session, result, source_files)
+    session.add(result)
+    session.commit()
+    return result
+
+
+def test_identical_files_are_stored_once(session):
+    """Test that starter code shared across students is deduplicated"""
+    starter = "public class Node {\n    int value;\n}"
+    _graded_result(session, "alice", [
+        {"path": "Node.java", "content": starter},
+        {"path": "Main.java", "content": "class Main { /* alice */ }"},
+    ])
+    _graded_result(session, "bob", [
+        {"path": "Node.java", "content": starter},
+        {"path": "Main.java", "content": "class Main { /* bob */ }"},
+    ])
+
+    assert session.query(models.SnapshotFile).count() == 4
+    assert session.query(models.SourceBlob).count() == 3
+
+    blob = session.query(models.SourceBlob).filter(models.SourceBlob.hash == snapshots.content_hash(starter)).one()
+    assert blob.size == len(starter)
+    assert snapshots.decompress(blob.data) == starter
+
+
+def test_get_result_sources(client: TestClient, session):
+    """Test retrieving the exact files a grade was based on"""
+    files = [
+        {"path": "src/BinarySearch.java", "content": "class BinarySearch {}"},
+        {"path": "src/Main.java", "content": "class Main {}"},
+    ]
+    result = _graded_result(session, "carol", files)
+
+    response = client.get(f"/results/{result.id}/sources")
+    assert response.status_code == 200
+    assert response.json()["student_id"] == "carol"
+    assert response.json()["files"] == files
+
+
+def test_get_result_sources_not_found(client: TestClient):
+    response = client.get("/results/9999/sources")
+    assert response.status_code == 404
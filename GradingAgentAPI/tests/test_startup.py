@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+from app.db.init_db import init_db
+from app.services import warmup
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_loads_no_heavy_modules_and_needs_no_database():
+    """The app must import with the database unreachable and without the Gemini SDK or python-docx"""
+    probe = "import json, sys, app.main; print(json.dumps([m for m in ('google.generativeai', 'docx') if m in sys.modules]))"
+    env = dict(os.environ, DATABASE_URL="sqlite:////nonexistent/directory/grader.db")
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=API_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    assert json.loads(output.stdout) == []
+
+
+def test_init_db_creates_the_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    init_db(engine)
+    init_db(engine)  # Safe to run on every start
+    assert {"assignments", "grading_results", "grading_jobs"} <= set(inspect(engine).get_table_names())
+
+
+def test_ready_reports_warm_state(client: TestClient):
+    assert warmup.wait(timeout=30)
+    response = client.get("/ready")
+    body = response.json()
+    assert body["warm"] is True
+    assert body["components"]["gemini_sdk"]["ok"] is True
+    assert response.status_code == (200 if body["database"]["ok"] else 503)
@@ -0,0 +1,68 @@
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.db import models
+from app.services import stats
+
+
+def _add_result(session, assignment, student_id, grade, deductions=()):
+    session.add(models.GradingResult(
+        assignment=assignment,
+        student_id=student_id,
+        grade=grade,
+        feedback=f"GRADE: {grade}/100",
+        deductions=[
+            models.Deduction(source=source, points=points, message=message, file=file, line=1 if file else None)
+            for source, points, message, file in deductions
+        ],
+    ))
+    session.commit()
+
+
+def test_stats_are_aggregated_in_sql(client: TestClient, session):
+    assignment = models.Assignment(name="Stats Lab")
+    session.add(assignment)
+    print_check = ("regex", 5, "Used print statements", "Main.java")
+    for i, grade in enumerate([100, 95, 85, 85, 70, 40]):
+        deductions = [print_check] if grade < 100 else []
+        if grade <= 70:
+            deductions.append(("llm", 20, "Missing Strategy interface", None))
+        _add_result(session, assignment, f"student{i}", grade, deductions)
+
+    response = client.get("/assignments/Stats Lab/stats")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"] == 6
+    assert body["mean"] == 79.17
+    assert (body["min"], body["max"]) == (40, 100)
+    assert body["percentiles"] == {"p25": 70, "p50": 85, "p75": 95, "p90": 100}
+
+    histogram = {b["range"]: b["count"] for b in body["histogram"]}
+    assert histogram["90-100"] == 2
+    assert histogram["80-89"] == 2
+    assert histogram["70-79"] == 1
+    assert histogram["40-49"] == 1
+    assert sum(histogram.values()) == 6
+
+    assert body["top_deductions"][0] == {
+        "source": "regex", "message": "Used print statements", "occurrences": 5, "results": 5, "total_points": 25
+    }
+    assert body["top_deductions"][1]["occurrences"] == 2
+
+
+def test_stats_cache_is_invalidated_by_new_results(client: TestClient, session):
+    assignment = models.Assignment(name="Cached Lab")
+    session.add(assignment)
+    _add_result(session, assignment, "alice", 90)
+
+    with patch("app.services.stats.compute", wraps=stats.compute) as compute:
+        assert client.get("/assignments/Cached Lab/stats").json()["results"] == 1
+        assert client.get("/assignments/Cached Lab/stats").json()["results"] == 1
+        assert compute.call_count == 1
+
+        _add_result(session, assignment, "bob", 60)
+        assert client.get("/assignments/Cached Lab/stats").json()["results"] == 2
+        assert compute.call_count == 2
+
+
+def test_stats_for_unknown_assignment(client: TestClient):
+    assert client.get("/assignments/Nope/stats").status_code == 404
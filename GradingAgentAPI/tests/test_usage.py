@@ -0,0 +1,112 @@
+import json
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.db import models
+from app.services.usage import result_usage
+
+
+def _response(text: str, prompt_tokens: int, output_tokens: int):
+    usage = MagicMock(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens, cached_content_token_count=0)
+    return MagicMock(text=text, usage_metadata=usage)
+
+
+def _grade(client: TestClient, fake_clone, assignment_name: str, student: str, responses: list):
+    with fake_clone({f"{assignment_name}/Main.java": "class Main {}"}), \
+         patch("google.generativeai.GenerativeModel") as mock_genai_model:
+        mock_genai_model.return_value.generate_content.side_effect = responses
+        response = client.post(
+            "/grade",
+            json={
+                "assignment_name": assignment_name,
+                "repo_link": f"https://github.com/{student}/repo",
+                "token": "test_token",
+                "gemini_api_key": "test_key"
+            }
+        )
+    assert response.status_code == 200
+    return response.json()["grading_result"]
+
+
+def test_result_usage_sums_calls_and_ignores_skipped_tiers():
+    tiers = [
+        {"tier": "screen", "model": "small", "latency_ms": 300, "retries": 1, "prompt_tokens": 900, "cached_tokens": None, "output_tokens": 40},
+        {"tier": "grade", "model": "large", "latency_ms": 2000, "retries": 0, "prompt_tokens": 1500, "cached_tokens": 1000, "output_tokens": 200},
+    ]
+    assert result_usage(tiers) == {
+        "prompt_tokens": 2400, "cached_tokens": 1000, "output_tokens": 240,
+        "llm_model": "large", "llm_latency_ms": 2300, "llm_wall_ms": None, "llm_retries": 1, "llm_cost_usd": None,
+    }
+    assert result_usage([{"tier": "regex", "outcome": "skipped_llm"}], wall_ms=5) == {
+        "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+        "llm_model": None, "llm_latency_ms": None, "llm_wall_ms": None, "llm_retries": 0, "llm_cost_usd": 0.0,
+    }
+
+
+def test_result_usage_prices_each_call_and_keeps_wall_clock_time(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PRICES", {
+        "small": {"prompt": 1.0, "output": 2.0},
+        "large": {"prompt": 10.0, "cached": 2.5, "output": 20.0},
+    })
+    # Two concurrent section calls: 2 s of call time in 1.2 s of wall-clock time
+    tiers = [
+        {"tier": "grade", "model": "small", "latency_ms": 1000, "retries": 0, "prompt_tokens": 1000, "cached_tokens": None, "output_tokens": 100},
+        {"tier": "grade", "model": "large", "latency_ms": 1000, "retries": 0, "prompt_tokens": 3000, "cached_tokens": 1000, "output_tokens": 400},
+    ]
+    usage = result_usage(tiers, wall_ms=1200)
+    assert (usage["llm_latency_ms"], usage["llm_wall_ms"]) == (2000, 1200)
+    # (1000 * 1 + 100 * 2) + (2000 * 10 + 1000 * 2.5 + 400 * 20) per million tokens
+    assert usage["llm_cost_usd"] == 0.0317
+
+    tiers.append({"tier": "grade", "model": "unpriced", "latency_ms": 10, "retries": 0, "prompt_tokens": 1, "output_tokens": 1})
+    assert result_usage(tiers, wall_ms=1200)["llm_cost_usd"] is None
+
+
+def test_usage_is_stored_and_aggregated(client: TestClient, fake_clone, session, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PRICES", {
+        "screen-model": {"prompt": 1.0, "output": 2.0}, "grade-model": {"prompt": 10.0, "output": 20.0},
+    })
+    assignment_name = "Usage Test"
+    client.post("/assignments", json={"assignment_name": assignment_name})
+    criteria = {
+        "natural_language_rubric": "Implement the Strategy pattern.",
+        "regex_checks": [],
+        "cascade": {"screen_model": "screen-model", "grade_model": "grade-model", "confidence_threshold": 0.8},
+    }
+    client.post(
+        f"/assignments/{assignment_name}/criteria",
+        files={"criteria_file": ("criteria.json", json.dumps(criteria).encode("utf-8"), "application/json")}
+    )
+    uncertain = json.dumps({"verdict": "full_marks", "confidence": 0.5, "reason": "Probably fine."})
+    confident = json.dumps({"verdict": "full_marks", "confidence": 0.95, "reason": "Complete."})
+
+    escalated = _grade(client, fake_clone, assignment_name, "alice", [
+        _response(uncertain, 1000, 50), _response("[-10 points] Context class is missing", 3000, 400)
+    ])
+    _grade(client, fake_clone, assignment_name, "bob", [_response(confident, 1000, 30)])
+
+    assert escalated["usage"]["prompt_tokens"] == 4000
+    assert escalated["usage"]["output_tokens"] == 450
+    assert escalated["usage"]["llm_model"] == "grade-model"
+    stored = session.query(models.GradingResult).filter(models.GradingResult.student_id == "alice").one()
+    assert (stored.prompt_tokens, stored.output_tokens, stored.llm_model, stored.llm_retries) == (4000, 450, "grade-model", 0)
+    assert stored.llm_latency_ms is not None
+    assert stored.llm_wall_ms is not None
+    assert stored.llm_cost_usd == 0.0391
+
+    report = client.get("/usage", params={"assignment": assignment_name}).json()
+    assert report["totals"]["results"] == 2
+    assert report["totals"]["prompt_tokens"] == 5000
+    assert report["totals"]["output_tokens"] == 480
+    assert report["totals"]["avg_prompt_tokens"] == 2500
+    assert report["totals"]["cost_usd"] == 0.04016
+    assert report["totals"]["unpriced_results"] == 0
+    assert report["totals"]["avg_llm_wall_ms"] is not None
+    by_model = {group["llm_model"]: group for group in report["groups"]}
+    assert by_model["grade-model"]["prompt_tokens"] == 4000
+    assert by_model["screen-model"]["results"] == 1
+    assert all(group["criteria_version"] == 1 for group in report["groups"])
+
+    future = client.get("/usage", params={"assignment": assignment_name, "since": "2999-01-01T00:00:00Z"}).json()
+    assert future["totals"]["results"] == 0
+    assert client.get("/usage", params={"assignment": "No Such Assignment"}).status_code == 404
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import pytest
+from app.services.workflow import Stage, StageAbandoned, StageTimeout, Workflow
+
+
+def _run(flow: Workflow, inputs: dict):
+    timings = []
+    try:
+        values = asyncio.run(flow.run(inputs, timings))
+    except Exception as error:
+        return error, {t["stage"]: t for t in timings}
+    return values, {t["stage"]: t for t in timings}
+
+
+def test_independent_stages_run_concurrently():
+    async def load(source):
+        return {"files": [source]}
+
+    def slow(output):
+        async def stage(files):
+            await asyncio.sleep(0.2)
+            return {output: len(files)}
+        return stage
+
+    async def combine(regex, llm):
+        return {"grade": 100 - regex - llm}
+
+    flow = Workflow([
+        Stage("combine", combine, inputs=("regex", "llm"), outputs=("grade",)),
+        Stage("regex", slow("regex"), inputs=("files",), outputs=("regex",)),
+        Stage("llm", slow("llm"), inputs=("files",), outputs=("llm",)),
+        Stage("load", load, inputs=("source",), outputs=("files",)),
+    ])
+    begin = time.monotonic()
+    values, timings = _run(flow, {"source": "Main.java"})
+
+    assert values["grade"] == 98
+    assert time.monotonic() - begin < 0.35  # The two 0.2s stages overlapped
+    assert abs(timings["regex"]["start_ms"] - timings["llm"]["start_ms"]) < 50
+    assert timings["combine"]["start_ms"] >= timings["llm"]["start_ms"] + timings["llm"]["duration_ms"]
+
+
+def test_timeouts_are_retried_then_fall_back():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+        return {"value": "second try"}
+
+    async def hangs():
+        await asyncio.sleep(1)
+        return {"other": "never"}
+
+    flow = Workflow([
+        Stage("flaky", flaky, outputs=("value",), timeout=0.05, retries=1),
+        Stage("hangs", hangs, outputs=("other",), timeout=0.05, fallback=lambda error: {"other": "fallback"}),
+    ])
+    values, timings = _run(flow, {})
+
+    assert (values["value"], values["other"]) == ("second try", "fallback")
+    assert (timings["flaky"]["outcome"], timings["flaky"]["attempts"]) == ("ok", 2)
+    assert timings["hangs"]["outcome"] == "timeout_fallback"
+
+
+def test_a_failure_cancels_running_stages_and_is_raised():
+    async def broken():
+        raise ValueError("clone failed")
+
+    async def slow():
+        await asyncio.sleep(1)
+        return {"slow": True}
+
+    async def after(cloned):
+        return {"done": True}
+
+    flow = Workflow([
+        Stage("broken", broken, outputs=("cloned",)),
+        Stage("slow", slow, outputs=("slow",)),
+        Stage("after", after, inputs=("cloned",), outputs=("done",)),
+    ])
+    error, timings = _run(flow, {})
+
+    assert isinstance(error, ValueError)
+    assert timings["broken"]["outcome"] == "error" and timings["broken"]["error"] == "clone failed"
+    assert timings["slow"]["outcome"] == "cancelled"
+    assert timings["after"]["outcome"] == "skipped"
+
+
+def test_stage_is_abandoned_when_a_value_makes_it_pointless():
+    async def regex(total):
+        await asyncio.sleep(0.05)
+        return {"regex": total}
+
+    async def llm():
+        await asyncio.sleep(1)
+        return {"llm": "graded"}
+
+    def skipped(error):
+        assert isinstance(error, StageAbandoned) and error.value == "regex"
+        return {"llm": "skipped"}
+
+    flow = Workflow([
+        Stage("regex", regex, inputs=("total",), outputs=("regex",)),
+        Stage("llm", llm, outputs=("llm",), fallback=skipped, abandon_if=("regex", lambda total: total >= 100)),
+    ])
+    begin = time.monotonic()
+    values, timings = _run(flow, {"total": 100})
+    assert values["llm"] == "skipped"
+    assert timings["llm"]["outcome"] == "abandoned"
+    assert time.monotonic() - begin < 0.5
+
+    values, timings = _run(flow, {"total": 20})
+    assert values["llm"] == "graded"
+    assert timings["llm"]["outcome"] == "ok"
+
+
+def test_stage_timeout_without_fallback():
+    async def hangs():
+        await asyncio.sleep(1)
+
+    error, timings = _run(Workflow([Stage("llm", hangs, outputs=("llm",), timeout=0.01)]), {})
+    assert isinstance(error, StageTimeout) and error.stage == "llm"
+    assert timings["llm"]["outcome"] == "timeout"
+
+
+def test_invalid_workflows_are_rejected():
+    async def noop(**kwargs):
+        return {}
+
+    with pytest.raises(ValueError, match="cycle"):
+        Workflow([Stage("a", noop, inputs=("y",), outputs=("x",)), Stage("b", noop, inputs=("x",), outputs=("y",))])
+    with pytest.raises(ValueError, match="produced by both"):
+        Workflow([Stage("a", noop, outputs=("x",)), Stage("b", noop, outputs=("x",))])
+    with pytest.raises(ValueError, match="no fallback"):
+        Stage("a", noop, outputs=("x",), abandon_if=("y", bool))
+    with pytest.raises(ValueError, match="Missing workflow inputs: source"):
+        asyncio.run(Workflow([Stage("a", noop, inputs=("source",))]).run({}))